@@ -0,0 +1,76 @@
+# This Python file uses the following encoding: utf-8
+"""
+Benchmark del caricamento completo dell'albero (LocationTreeModel.load_all).
+
+Crea database sintetici di dimensione crescente (fino a 100k porte) e misura
+il tempo di caricamento: il tempo per porta deve restare circa costante,
+cioè il caricamento deve crescere in modo lineare col numero di porte.
+
+Uso:  python benchmark/bench_location_loader.py [--max-porte 100000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtSql import QSqlDatabase
+
+from benchmark.genera_dati import Scala, genera_database
+from widget.location_tree_model import LocationTreeModel
+
+PIANI_PER_EDIFICIO = 5
+LOCALI_PER_PIANO = 10
+PORTE_PER_LOCALE = 4
+
+
+def crea_db_sintetico(percorso: str, n_porte: int):
+    """Crea lo schema v3 e lo riempie con circa n_porte porte (senza dispositivi)."""
+    porte_per_edificio = PIANI_PER_EDIFICIO * LOCALI_PER_PIANO * PORTE_PER_LOCALE
+    genera_database(percorso, Scala(max(1, n_porte // porte_per_edificio), PIANI_PER_EDIFICIO,
+                                    LOCALI_PER_PIANO, PORTE_PER_LOCALE, 0, 0.0))
+
+
+def misura(percorso: str, ripetizioni: int = 3) -> float:
+    """Restituisce il tempo migliore (in secondi) di load_all sul DB indicato."""
+    db = QSqlDatabase.addDatabase("QSQLITE", "benchmark")
+    db.setDatabaseName(percorso)
+    db.open()
+    model = LocationTreeModel(db, {})
+    migliore = None
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        model.load_all()
+        durata = time.perf_counter() - inizio
+        migliore = durata if migliore is None else min(migliore, durata)
+    del model
+    db.close()
+    del db
+    QSqlDatabase.removeDatabase("benchmark")
+    return migliore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-porte", type=int, default=100_000)
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)  # Necessaria per i driver QtSql
+    scale = [n for n in (1_000, 10_000, 25_000, 50_000, 100_000) if n <= args.max_porte]
+
+    print(f"{'porte':>8} {'tempo (ms)':>12} {'us/porta':>10}")
+    with tempfile.TemporaryDirectory() as cartella:
+        for n_porte in scale:
+            percorso = os.path.join(cartella, f"bench_{n_porte}.db")
+            crea_db_sintetico(percorso, n_porte)
+            durata = misura(percorso)
+            print(f"{n_porte:>8} {durata * 1000:>12.1f} {durata / n_porte * 1e6:>10.2f}")
+    del app
+
+
+if __name__ == "__main__":
+    main()
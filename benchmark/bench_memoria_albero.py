@@ -0,0 +1,101 @@
+# This Python file uses the following encoding: utf-8
+"""
+Benchmark della memoria occupata dai nodi dell'albero.
+
+Confronta, a parità di nodi (porte raggruppate in locali da 50), la memoria
+residente (RSS) di un QStandardItemModel con icona e due ruoli per elemento
+e quella di LocationTreeModel con l'archivio compatto (widget/archivio_nodi.py).
+Ogni misura gira in un processo separato, così l'una non sporca l'altra.
+
+Uso:  python benchmark/bench_memoria_albero.py [--nodi 500000]
+"""
+import argparse
+import gc
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+PORTE_PER_LOCALE = 50
+MODI = ("standard", "compatto")
+
+
+def rss() -> int:
+    """Memoria residente del processo in byte (Linux)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def misura_standard(n_nodi: int) -> int:
+    from PySide6.QtCore import Qt
+    from PySide6.QtGui import QStandardItem, QStandardItemModel
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv)
+    stile = app.style()
+    icona = stile.standardIcon(stile.StandardPixmap.SP_FileIcon)
+
+    def elemento(tipo: str, item_id: int, nome: str) -> QStandardItem:
+        item = QStandardItem(nome)
+        item.setIcon(icona)
+        item.setData(item_id, Qt.UserRole)
+        item.setData(tipo, Qt.UserRole + 1)
+        return item
+
+    gc.collect()
+    prima = rss()
+    model = QStandardItemModel()
+    radice = model.invisibleRootItem()
+    locale = None
+    for i in range(n_nodi):
+        if i % PORTE_PER_LOCALE == 0:
+            locale = elemento("locale", i, f"Locale {i:07d}")
+            radice.appendRow(locale)
+        locale.appendRow(elemento("porta", i, f"Porta {i:07d}"))
+    gc.collect()
+    return rss() - prima
+
+
+def misura_compatto(n_nodi: int) -> int:
+    from PySide6.QtWidgets import QApplication
+    from widget.location_tree_model import LocationTreeModel
+    app = QApplication.instance() or QApplication(sys.argv)  # noqa: F841 (serve viva durante la misura)
+    model = LocationTreeModel(None, {})
+    gc.collect()
+    prima = rss()  # Include i nomi, che restano nel modello, e le tuple lette (che si liberano)
+    livelli = {
+        "edificio": [(1, "Edificio", None)],
+        "piano": [(1, "Piano", 1)],
+        "locale": ((i, f"Locale {i:07d}", 1) for i in range(n_nodi // PORTE_PER_LOCALE)),
+        "porta": ((i, f"Porta {i:07d}", i // PORTE_PER_LOCALE) for i in range(n_nodi)),
+    }
+    model._costruisci_albero(livelli)
+    del livelli
+    gc.collect()
+    return rss() - prima
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodi", type=int, default=500_000)
+    parser.add_argument("--modo", choices=MODI, help=argparse.SUPPRESS)  # Processo figlio
+    args = parser.parse_args()
+
+    if args.modo:
+        misura = misura_standard if args.modo == "standard" else misura_compatto
+        print(misura(args.nodi))
+        return
+
+    print(f"{'modello':>10} {'MiB':>8} {'byte/nodo':>10}")
+    byte = {}
+    for modo in MODI:
+        uscita = subprocess.run([sys.executable, os.path.abspath(__file__), "--nodi", str(args.nodi), "--modo", modo],
+                                capture_output=True, text=True, check=True).stdout
+        byte[modo] = int(uscita.split()[-1])
+        print(f"{modo:>10} {byte[modo] / 2**20:>8.1f} {byte[modo] / args.nodi:>10.0f}")
+    print(f"riduzione: {byte['standard'] / byte['compatto']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
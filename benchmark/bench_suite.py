@@ -0,0 +1,229 @@
+# This Python file uses the following encoding: utf-8
+"""
+Suite di benchmark dell'applicazione, senza finestra (QT_QPA_PLATFORM=offscreen).
+
+Genera un database sintetico (vedi genera_dati.py) oppure usa quello indicato,
+poi misura con gli stessi widget dell'applicazione:
+
+    avvio               setup del DB, connessione, MainWindow e primo livello dell'albero
+    load_location_tree  ricarica dell'albero (edifici + piani espansi)
+    populate_combos     elenco dei locali nel combo del dettaglio porta
+    load_porta_data     dettaglio di una porta (dispositivi, connessioni, posizione)
+    save_data           salvataggio della porta
+    statistiche         pagina delle statistiche di tutto l'inventario
+
+I tempi includono l'attesa dei caricamenti in background, fino ai dati
+mostrati. I risultati vengono scritti in JSON per confrontare commit diversi:
+
+    python benchmark/bench_suite.py --scala media --output prima.json
+    python benchmark/bench_suite.py --scala media --output dopo.json --confronta prima.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import PySide6
+from PySide6.QtCore import QCoreApplication, QEventLoop
+from PySide6.QtSql import QSqlDatabase
+from PySide6.QtWidgets import QApplication, QMessageBox
+
+from benchmark.genera_dati import aggiungi_argomenti_scala, genera_database, scala_da_argomenti
+from database import database_setup, diagnostica
+from database.sqlite_profile import imposta_profilo, nome_profilo, PROFILI
+from main_window import MainWindow
+
+
+def attendi(loader, condizione=lambda: True, timeout: float = 60.0):
+    """Elabora gli eventi finché il loader non ha più richieste e la condizione è vera."""
+    scadenza = time.perf_counter() + timeout
+    QCoreApplication.processEvents()
+    while loader.in_attesa() or not condizione():
+        if time.perf_counter() > scadenza:
+            raise TimeoutError("Caricamento non completato")
+        QCoreApplication.processEvents(QEventLoop.WaitForMoreEvents, 50)
+        QCoreApplication.processEvents()
+
+
+def riassumi(tempi: list) -> dict:
+    """Minimo, mediana, 95° percentile e massimo dei tempi (in millisecondi)."""
+    tempi = sorted(tempi)
+    return {
+        "ripetizioni": len(tempi),
+        "min_ms": round(tempi[0], 3),
+        "mediana_ms": round(statistics.median(tempi), 3),
+        "p95_ms": round(tempi[min(len(tempi) - 1, int(len(tempi) * 0.95))], 3),
+        "max_ms": round(tempi[-1], 3),
+    }
+
+
+def cronometra(funzione, ripetizioni: int) -> dict:
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione()
+        tempi.append((time.perf_counter() - inizio) * 1000)
+    return riassumi(tempi)
+
+
+def avvia(percorso: str):
+    """Replica l'avvio di main.py sul DB indicato e attende il primo livello dell'albero."""
+    database_setup.NOME_DATABASE = percorso
+    database_setup.setup_database()
+    db = database_setup.connect_db()
+    window = MainWindow(db=db)
+    window.show()
+    model = window.asset_tree.model
+    attendi(window.loader, lambda: model.rowCount() > 0)
+    return db, window
+
+
+def esegui_suite(percorso: str, ripetizioni: int, n_porte: int, seme: int) -> dict:
+    risultati = {}
+    inizio = time.perf_counter()
+    db, window = avvia(percorso)
+    # Una sola misura: un secondo avvio nello stesso processo troverebbe tutto già in cache
+    risultati["avvio"] = riassumi([(time.perf_counter() - inizio) * 1000])
+
+    loader = window.loader
+    albero = window.asset_tree
+    dettaglio = window.pagina_porta()
+
+    def load_location_tree():
+        albero.load_location_tree()
+        attendi(loader, lambda: albero.model.rowCount() > 0)
+    risultati["load_location_tree"] = cronometra(load_location_tree, ripetizioni)
+
+    def populate_combos():
+        dettaglio.populate_combos()
+        attendi(loader)
+    risultati["populate_combos"] = cronometra(populate_combos, ripetizioni)
+
+    # Porte diverse a ogni ripetizione: la cache di SQLite non deve falsare i tempi
+    rng = random.Random(seme)
+    porte = [rng.randrange(1, n_porte + 1) for _ in range(max(ripetizioni, 20))]
+    coda = iter(porte)
+
+    def load_porta_data():
+        dettaglio.load_porta_data(next(coda))
+        attendi(loader, dettaglio.isEnabled)
+    risultati["load_porta_data"] = cronometra(load_porta_data, len(porte))
+
+    # save_data mostra un QMessageBox modale: nel benchmark non deve bloccare
+    informazione = QMessageBox.information
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    try:
+        dettaglio.load_porta_data(porte[0])
+        attendi(loader, dettaglio.isEnabled)
+        risultati["save_data"] = cronometra(dettaglio.save_data, ripetizioni)
+    finally:
+        QMessageBox.information = informazione
+
+    statistiche = window.pagina_statistiche()
+
+    def mostra_statistiche():
+        statistiche.mostra(None)
+        attendi(loader)
+    risultati["statistiche"] = cronometra(mostra_statistiche, ripetizioni)
+
+    loader.shutdown()
+    window.close()
+    del window
+    db.close()
+    del db
+    QSqlDatabase.removeDatabase("qt_sql_default_connection")
+    return risultati
+
+
+def ambiente() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pyside6": PySide6.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "piattaforma": platform.platform(),
+        "profilo_db": nome_profilo(),
+    }
+
+
+def confronta(precedente: dict, attuale: dict):
+    """Stampa il rapporto tra le mediane (>1 = più lento di prima)."""
+    print(f"\n{'misura':<20} {'prima (ms)':>12} {'ora (ms)':>12} {'rapporto':>9}")
+    for nome, valori in attuale["risultati"].items():
+        prima = precedente.get("risultati", {}).get(nome)
+        if prima is None:
+            continue
+        rapporto = valori["mediana_ms"] / prima["mediana_ms"] if prima["mediana_ms"] else float("inf")
+        print(f"{nome:<20} {prima['mediana_ms']:>12.2f} {valori['mediana_ms']:>12.2f} {rapporto:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    aggiungi_argomenti_scala(parser)
+    parser.add_argument("--db", help="usa questo database invece di generarne uno (viene modificato!)")
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    parser.add_argument("--profilo-db", choices=sorted(PROFILI), default="prestazioni")
+    parser.add_argument("--output", help="file JSON dei risultati")
+    parser.add_argument("--confronta", help="JSON di una esecuzione precedente")
+    parser.add_argument("--diagnostica-json", help="scrive qui i contatori delle query (database.diagnostica)")
+    args = parser.parse_args()
+
+    imposta_profilo(args.profilo_db)
+    app = QApplication(sys.argv)
+
+    with tempfile.TemporaryDirectory() as cartella:
+        if args.db:
+            percorso = args.db
+            scala = None
+        else:
+            percorso = os.path.join(cartella, "bench_suite.db")
+            scala = scala_da_argomenti(args)
+            print(f"Genero il database sintetico ({args.scala})...")
+            conteggi = genera_database(percorso, scala, args.seme)
+        conn = sqlite3.connect(percorso)
+        n_porte = conn.execute("SELECT MAX(porta_id) FROM Porte").fetchone()[0] or 0
+        if scala is None:
+            conteggi = {tabella: conn.execute(f"SELECT COUNT(*) FROM {tabella}").fetchone()[0]
+                        for tabella in ("Edifici", "Piani", "Locali", "Porte", "Inventario_Dispositivi")}
+        conn.close()
+
+        risultati = esegui_suite(percorso, args.ripetizioni, n_porte, args.seme)
+
+    report = {"ambiente": ambiente(), "scala": args.scala if scala else args.db,
+              "conteggi": conteggi, "risultati": risultati}
+    print(f"\n{'misura':<20} {'min (ms)':>10} {'mediana':>10} {'p95':>10}")
+    for nome, valori in risultati.items():
+        print(f"{nome:<20} {valori['min_ms']:>10.2f} {valori['mediana_ms']:>10.2f} {valori['p95_ms']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRisultati scritti in {args.output}")
+    if args.confronta:
+        with open(args.confronta, encoding="utf-8") as f:
+            confronta(json.load(f), report)
+    if args.diagnostica_json:
+        diagnostica.salva_json(args.diagnostica_json)
+        print(f"Contatori delle query scritti in {args.diagnostica_json}")
+    del app
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# This Python file uses the following encoding: utf-8
+"""
+Generatore di database sintetici (schema v3) a scala configurabile.
+
+Crea edifici, piani, locali e porte, alberi di dispositivi collegati con
+parent_dispositivo_id (concentratore di locale -> controller di porta ->
+lettori, serrature, moduli...) e interconnessioni verso sistemi esterni.
+Con lo stesso seme il database generato è sempre identico.
+
+Uso:  python benchmark/genera_dati.py FILE [--scala media] [--edifici N] [--seme N]
+"""
+import argparse
+import os
+import random
+import sys
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import database_setup
+from database.sqlite_profile import connetti
+
+
+@dataclass(frozen=True)
+class Scala:
+    edifici: int
+    piani_per_edificio: int
+    locali_per_piano: int
+    porte_per_locale: int
+    dispositivi_per_porta: int      # Controller + periferiche (0 = nessun dispositivo)
+    quota_interconnessioni: float   # Frazione dei dispositivi collegata a un sistema esterno
+
+    @property
+    def porte(self) -> int:
+        return self.edifici * self.piani_per_edificio * self.locali_per_piano * self.porte_per_locale
+
+
+SCALE = {
+    "piccola": Scala(2, 3, 10, 4, 3, 0.05),         # 240 porte
+    "media": Scala(10, 5, 20, 5, 4, 0.05),          # 5.000 porte, ~21k dispositivi
+    "grande": Scala(50, 8, 50, 5, 4, 0.05),         # 100.000 porte, ~420k dispositivi
+}
+
+TIPI = [
+    (1, "Concentratore", "Concentratore di locale"),
+    (2, "Controller", "Controller di porta"),
+    (3, "Lettore Badge", "Lettore di prossimità"),
+    (4, "Serratura", "Serratura elettrica"),
+    (5, "Modulo I/O", "Ingressi/uscite digitali"),
+    (6, "Sensore Porta", "Contatto magnetico"),
+]
+MODELLI = {
+    1: ["CN-800", "CN-1600"],
+    2: ["CTRL-2D", "CTRL-4D", "AC-500"],
+    3: ["HID iCLASS SE", "LR-MIFARE", "LR-125K"],
+    4: ["EL-12V", "EL-24V", "MAG-300"],
+    5: ["IO-8", "IO-16"],
+    6: ["MC-1", "MC-2"],
+}
+SISTEMI = [
+    (1, "Impianto Antincendio", "Sicurezza", "Ufficio Tecnico"),
+    (2, "Videosorveglianza", "Sicurezza", "Vigilanza"),
+    (3, "BMS", "Gestione Edificio", "Facility"),
+    (4, "Allarme Intrusione", "Sicurezza", "Vigilanza"),
+    (5, "Controllo Presenze", "HR", "Personale"),
+]
+SEGNALI = ["Contatto pulito", "RS-485", "TCP/IP", "Wiegand"]
+STATI = ["Operativo"] * 17 + ["Guasto", "In manutenzione", "Dismesso"]
+
+
+def _dispositivi(scala: Scala, rng: random.Random):
+    """
+    Generatore di righe di Inventario_Dispositivi in ordine di id (i padri
+    prima dei figli). Sulla porta: il controller, figlio del concentratore
+    del locale, poi le periferiche disposte ad albero binario sotto di lui.
+    """
+    inizio = date(2015, 1, 1)
+    dispositivo_id = 0
+
+    def riga(tipo_id, parent_id, locale_id, porta_id):
+        nonlocal dispositivo_id
+        dispositivo_id += 1
+        return (dispositivo_id, rng.choice(MODELLI[tipo_id]), f"SN{dispositivo_id:09d}", None,
+                (inizio + timedelta(days=rng.randrange(3650))).isoformat(), rng.choice(STATI),
+                tipo_id, parent_id, locale_id, porta_id)
+
+    porta_id = 0
+    n_locali = scala.edifici * scala.piani_per_edificio * scala.locali_per_piano
+    for locale_id in range(1, n_locali + 1):
+        concentratore = None
+        if scala.dispositivi_per_porta:
+            yield riga(1, None, locale_id, None)
+            concentratore = dispositivo_id
+        for _ in range(scala.porte_per_locale):
+            porta_id += 1
+            ids = []
+            for j in range(scala.dispositivi_per_porta):
+                if j == 0:
+                    yield riga(2, concentratore, None, porta_id)
+                else:
+                    yield riga(rng.choice((3, 4, 5, 6)), ids[(j - 1) // 2], None, porta_id)
+                ids.append(dispositivo_id)
+
+
+def genera_database(percorso: str, scala: Scala, seme: int = 42) -> dict:
+    """
+    Crea 'percorso' (che non deve esistere) con lo schema v3 e i dati della
+    scala indicata. Gli indici e la ricerca FTS vengono costruiti dalle
+    migrazioni dopo l'inserimento, in blocco. Restituisce i conteggi.
+    """
+    if os.path.exists(percorso):
+        raise FileExistsError(percorso)
+    rng = random.Random(seme)
+    s = scala
+    n_piani = s.edifici * s.piani_per_edificio
+    n_locali = n_piani * s.locali_per_piano
+
+    conn = connetti(percorso)
+    # Lo schema sulla connessione: NOME_DATABASE del processo resta quello di prima
+    database_setup.crea_database_v3(conn)
+    with conn:
+        conn.executemany("INSERT INTO Tipi_Dispositivi (tipo_id, nome_tipo, descrizione) VALUES (?, ?, ?)", TIPI)
+        conn.executemany("""INSERT INTO SistemiEsterni (sistema_id, nome_sistema, tipo_sistema, referente_tecnico)
+                            VALUES (?, ?, ?, ?)""", SISTEMI)
+        conn.executemany("INSERT INTO Edifici (edificio_id, nome_edificio, indirizzo) VALUES (?, ?, ?)",
+                         ((e, f"Edificio {e:03d}", f"Via Sintetica {e}") for e in range(1, s.edifici + 1)))
+        conn.executemany("INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (?, ?, ?)",
+                         ((p, f"Piano {(p - 1) % s.piani_per_edificio}", (p - 1) // s.piani_per_edificio + 1)
+                          for p in range(1, n_piani + 1)))
+        conn.executemany("INSERT INTO Locali (locale_id, nome_locale, descrizione, piano_id) VALUES (?, ?, ?, ?)",
+                         ((l, f"Locale {l:07d}", f"Locale sintetico {l}", (l - 1) // s.locali_per_piano + 1)
+                          for l in range(1, n_locali + 1)))
+        conn.executemany("INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (?, ?, ?)",
+                         ((d, f"Porta {d:07d}", (d - 1) // s.porte_per_locale + 1)
+                          for d in range(1, s.porte + 1)))
+        conn.executemany("""
+            INSERT INTO Inventario_Dispositivi
+                (dispositivo_id, modello, matricola, descrizione, data_installazione, stato,
+                 tipo_id, parent_dispositivo_id, locale_id, porta_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", _dispositivi(s, rng))
+        n_dispositivi = conn.execute("SELECT COUNT(*) FROM Inventario_Dispositivi").fetchone()[0]
+        conn.executemany("""
+            INSERT INTO Interconnessioni (dispositivo_id, sistema_id, descrizione_connessione, tipo_segnale)
+            VALUES (?, ?, ?, ?)""",
+            ((d, rng.randrange(1, len(SISTEMI) + 1), "Collegamento sintetico", rng.choice(SEGNALI))
+             for d in range(1, n_dispositivi + 1) if rng.random() < s.quota_interconnessioni))
+        n_interconnessioni = conn.execute("SELECT COUNT(*) FROM Interconnessioni").fetchone()[0]
+    database_setup.aggiorna_schema_v3(conn)
+    conn.close()
+    return {"edifici": s.edifici, "piani": n_piani, "locali": n_locali, "porte": s.porte,
+            "dispositivi": n_dispositivi, "interconnessioni": n_interconnessioni}
+
+
+def aggiungi_argomenti_scala(parser: argparse.ArgumentParser):
+    """Opzioni comuni per scegliere la scala (usate anche dalla suite di benchmark)."""
+    parser.add_argument("--scala", choices=sorted(SCALE), default="media")
+    for campo in Scala.__dataclass_fields__:
+        parser.add_argument(f"--{campo.replace('_', '-')}", type=type(getattr(SCALE["media"], campo)),
+                            help="sostituisce il valore della scala scelta")
+    parser.add_argument("--seme", type=int, default=42)
+
+
+def scala_da_argomenti(args: argparse.Namespace) -> Scala:
+    modifiche = {campo: getattr(args, campo) for campo in Scala.__dataclass_fields__
+                 if getattr(args, campo) is not None}
+    return replace(SCALE[args.scala], **modifiche)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un database sintetico dell'inventario.")
+    parser.add_argument("file")
+    aggiungi_argomenti_scala(parser)
+    args = parser.parse_args()
+
+    try:
+        conteggi = genera_database(args.file, scala_da_argomenti(args), args.seme)
+    except FileExistsError:
+        print(f"Il file '{args.file}' esiste già.")
+        sys.exit(1)
+    print(", ".join(f"{n} {nome}" for nome, n in conteggi.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+# This Python file uses the following encoding: utf-8
+"""
+Caricamento dei dati fuori dal thread della GUI.
+
+Ogni richiesta è una funzione 'job(db) -> risultato' eseguita su un
+QThreadPool dedicato. Ogni thread del pool apre la propria connessione
+QSqlDatabase (una connessione Qt può essere usata solo dal thread che l'ha
+creata) e il risultato torna alla GUI tramite segnale, quindi nel thread
+principale. Le richieste sono raggruppate per 'canale': una nuova richiesta
+sullo stesso canale annulla la precedente, che se è ancora in coda non
+esegue la query e se è già in corso non consegna il risultato.
+
+Le letture in blocco (albero completo, percorsi di tutti i locali) passano
+invece per il ReadConnectionPool del loader, una connessione sqlite3 per
+thread: sqlite3 restituisce le righe in C e, con molte righe, è circa tre
+volte più veloce di QtSql, che le legge un valore alla volta.
+"""
+import itertools
+import sqlite3
+import threading
+import time
+from functools import partial
+
+from PySide6.QtCore import QObject, QThread, QThreadPool, Signal, Slot
+from PySide6.QtSql import QSqlDatabase, QSqlError, QSqlQuery
+
+from database import diagnostica
+from database.connection_pool import ReadConnectionPool
+from database.inventario import Inventario
+from database.sqlite_profile import pragma_profilo, profilo_attivo
+
+
+class ErroreQuery(Exception):
+    """Sollevata da un job quando una query fallisce; porta con sé il QSqlError."""
+
+    def __init__(self, errore: QSqlError):
+        super().__init__(errore.text())
+        self.errore = errore
+
+
+# Query preparate, una per connessione e testo SQL: un job che gira spesso
+# (es. il dettaglio porta a ogni click) non ricompila gli statement. Una
+# QSqlQuery appartiene al thread della sua connessione, quindi va usata solo
+# dal thread che possiede 'db', come fanno i job.
+_preparate = {}  # (nome connessione, sql) -> QSqlQuery
+_lock_preparate = threading.Lock()
+
+
+def query_preparata(db: QSqlDatabase, sql: str) -> QSqlQuery:
+    """QSqlQuery forward-only già preparata con 'sql' su 'db' (i parametri vanno ripassati)."""
+    chiave = (db.connectionName(), sql)
+    with _lock_preparate:
+        query = _preparate.get(chiave)
+    if query is not None:
+        query.finish()  # Chiude un eventuale risultato non letto fino in fondo
+        return query
+    query = QSqlQuery(db)
+    query.setForwardOnly(True)
+    if not query.prepare(sql):
+        raise ErroreQuery(query.lastError())
+    with _lock_preparate:
+        _preparate[chiave] = query
+    return query
+
+
+def esegui_preparata(db: QSqlDatabase, sql: str, *parametri) -> QSqlQuery:
+    """Esegue la query preparata con i parametri posizionali; restituisce la query pronta per next()."""
+    query = query_preparata(db, sql)
+    for i, valore in enumerate(parametri):
+        query.bindValue(i, valore)
+    if not query.exec():
+        raise ErroreQuery(query.lastError())
+    return query
+
+
+def _valori(query: QSqlQuery, colonne: int) -> tuple:
+    """Valori della riga corrente; NULL diventa None (QtSql può restituire '' o 0)."""
+    riga = []
+    for i in range(colonne):
+        valore = query.value(i)
+        if not valore and query.isNull(i):
+            valore = None
+        riga.append(valore)
+    return tuple(riga)
+
+
+def _registra(db, sql: str, parametri: tuple, inizio: float, righe: int, errore: str = None):
+    """Passa la query alla diagnostica; se è lenta ne cattura il piano per il log."""
+    durata_ms = (time.perf_counter() - inizio) * 1000
+    sito = diagnostica.sito_chiamata(3)  # Chi ha chiamato leggi_righe/esegui_scrittura/leggi_righe_sqlite3
+    if not diagnostica.registra(sql, durata_ms, righe, sito, errore):
+        return
+    piano = []
+    try:
+        if isinstance(db, sqlite3.Connection):
+            piano = [str(riga[3]) for riga in db.execute(f"EXPLAIN QUERY PLAN {sql}", parametri)]
+        else:
+            query = esegui_preparata(db, f"EXPLAIN QUERY PLAN {sql}", *parametri)
+            while query.next():
+                piano.append(str(query.value(3)))
+    except (ErroreQuery, sqlite3.Error) as e:
+        piano.append(f"(piano non disponibile: {e})")
+    diagnostica.registra_lenta(sql, parametri, durata_ms, righe, sito, piano)
+
+
+def leggi_righe(db: QSqlDatabase, sql: str, *parametri) -> list:
+    """
+    Esegue la SELECT preparata e restituisce tutte le righe come tuple.
+    Durata, righe e punto di chiamata finiscono nella diagnostica.
+    """
+    inizio = time.perf_counter()
+    try:
+        query = esegui_preparata(db, sql, *parametri)
+    except ErroreQuery as e:
+        _registra(db, sql, parametri, inizio, 0, str(e))
+        raise
+    colonne = query.record().count()
+    righe = []
+    while query.next():
+        righe.append(_valori(query, colonne))
+    _registra(db, sql, parametri, inizio, len(righe))
+    return righe
+
+
+def leggi_righe_sqlite3(conn: sqlite3.Connection, sql: str, *parametri) -> list:
+    """Come leggi_righe, su una connessione sqlite3 del pool (letture in blocco)."""
+    inizio = time.perf_counter()
+    try:
+        righe = conn.execute(sql, parametri).fetchall()
+    except sqlite3.Error as e:
+        _registra(conn, sql, parametri, inizio, 0, str(e))
+        raise
+    _registra(conn, sql, parametri, inizio, len(righe))
+    return righe
+
+
+def esegui_scrittura(db: QSqlDatabase, sql: str, *parametri) -> int:
+    """Esegue INSERT/UPDATE/DELETE preparato (strumentato); restituisce le righe modificate."""
+    inizio = time.perf_counter()
+    try:
+        query = esegui_preparata(db, sql, *parametri)
+    except ErroreQuery as e:
+        _registra(db, sql, parametri, inizio, 0, str(e))
+        raise
+    righe = query.numRowsAffected()
+    _registra(db, sql, parametri, inizio, righe)
+    return righe
+
+
+def inventario(db: QSqlDatabase | sqlite3.Connection) -> Inventario:
+    """
+    Le query di database.inventario eseguite su 'db' (preparate e strumentate).
+    Su una connessione sqlite3 del pool (vedi LetturaInBlocco) solo in lettura.
+    """
+    if isinstance(db, sqlite3.Connection):
+        return Inventario(partial(leggi_righe_sqlite3, db))
+    return Inventario(partial(leggi_righe, db), partial(esegui_scrittura, db))
+
+
+class LetturaInBlocco:
+    """
+    Job di sola lettura da eseguire su una connessione sqlite3 del pool del
+    loader invece che su quella QtSql del thread. 'job(db)' è un job come gli
+    altri: deve solo leggere tramite inventario(db). Senza loader (o con un
+    loader che scrive) gira sulla connessione QtSql.
+    """
+
+    def __init__(self, job):
+        self.job = job
+
+    def __call__(self, db):
+        return self.job(db)
+
+
+def rilascia_preparate(nome_connessione: str):
+    """Elimina le query preparate sulla connessione (prima di removeDatabase)."""
+    with _lock_preparate:
+        for chiave in [chiave for chiave in _preparate if chiave[0] == nome_connessione]:
+            del _preparate[chiave]
+
+
+def carica(loader, db: QSqlDatabase, canale: str, job, callback, on_error):
+    """
+    Esegue 'job' in background se c'è un loader, altrimenti subito sulla
+    connessione 'db' (utile per script e benchmark senza thread).
+    """
+    if loader is not None:
+        loader.submit(canale, job, callback, on_error)
+        return
+    try:
+        risultato = job(db)
+    except ErroreQuery as e:
+        on_error(e)
+        return
+    callback(risultato)
+
+
+class AsyncLoader(QObject):
+    """
+    Esegue query in background con una connessione SQLite per thread.
+    Con sola_lettura=False le connessioni possono scrivere (es. un loader a
+    un solo thread che applica le modifiche in una transazione).
+    """
+
+    _completata = Signal(int, object)
+    _fallita = Signal(int, object)
+
+    def __init__(self, db: QSqlDatabase, max_thread: int = None, sola_lettura: bool = True, parent=None):
+        super().__init__(parent)
+        self.nome_database = db.databaseName()
+        self.sola_lettura = sola_lettura
+        self.pool = QThreadPool(self)
+        # Un thread (e quindi una connessione di lettura) per ogni lettore del profilo
+        self.pool.setMaxThreadCount(max_thread or profilo_attivo()["lettori"])
+        # I thread non devono mai terminare: la loro connessione resterebbe orfana
+        self.pool.setExpiryTimeout(-1)
+
+        self._lock = threading.Lock()
+        self._contatore = itertools.count(1)
+        self._richieste = {}      # request_id -> (canale, callback, on_error)
+        self._ultima = {}         # canale -> request_id più recente
+        self._connessioni = set() # Nomi delle connessioni aperte dai worker
+        self._letture = None      # ReadConnectionPool delle LetturaInBlocco, aperto al primo uso
+        # Nome della proprietà del QThread che ricorda la sua connessione. Non
+        # usiamo l'id del thread (Qt può ricreare i thread del pool e il sistema
+        # riusarne gli id) né threading.local: PySide crea un nuovo stato Python
+        # a ogni chiamata da un thread Qt, quindi i dati locali andrebbero persi.
+        self._proprieta_connessione = f"connessione_loader_{id(self)}"
+
+        self._completata.connect(self._on_completata)
+        self._fallita.connect(self._on_fallita)
+
+    def submit(self, canale: str, job, callback, on_error=None) -> int:
+        """
+        Accoda 'job' sul canale indicato. 'callback(risultato)' e
+        'on_error(eccezione)' vengono chiamati nel thread della GUI, solo se
+        la richiesta non è stata superata nel frattempo.
+        """
+        self.cancel(canale)
+        request_id = next(self._contatore)
+        # Le query del job contano per l'azione della UI che l'ha chiesto
+        azione = diagnostica.azione_corrente() or diagnostica.apri_azione(f"job {canale.split(':')[0]}")
+        with self._lock:
+            self._richieste[request_id] = (canale, callback, on_error)
+            self._ultima[canale] = request_id
+        self.pool.start(partial(self._esegui, request_id, job, azione))
+        return request_id
+
+    def cancel(self, canale: str):
+        """Annulla la richiesta in corso sul canale (se ancora in coda non parte)."""
+        with self._lock:
+            request_id = self._ultima.pop(canale, None)
+            self._richieste.pop(request_id, None)
+
+    def in_attesa(self, prefisso: str = "") -> int:
+        """Numero di richieste non ancora consegnate (in coda o in esecuzione) sui canali 'prefisso...'."""
+        with self._lock:
+            if not prefisso:
+                return len(self._richieste)
+            return sum(1 for canale, _, _ in self._richieste.values() if canale.startswith(prefisso))
+
+    def shutdown(self):
+        """Annulla le richieste in coda, attende i worker e chiude le loro connessioni."""
+        with self._lock:
+            self._richieste.clear()
+            self._ultima.clear()
+        self.pool.clear()
+        self.pool.waitForDone()
+        for nome in self._connessioni:
+            rilascia_preparate(nome)
+            QSqlDatabase.removeDatabase(nome)
+        self._connessioni.clear()
+        if self._letture is not None:
+            self._letture.chiudi()
+            self._letture = None
+
+    def _esegui(self, request_id: int, job, azione):
+        """Eseguita in un thread del pool."""
+        with self._lock:
+            if request_id not in self._richieste:
+                return  # Superata da una richiesta più recente
+        try:
+            with diagnostica.in_azione(azione):
+                if isinstance(job, LetturaInBlocco) and self.sola_lettura:
+                    with self._pool_letture().connessione() as conn:
+                        risultato = job(conn)
+                else:
+                    risultato = job(self._connessione_thread())
+        except Exception as e:
+            self._fallita.emit(request_id, e)
+            return
+        self._completata.emit(request_id, risultato)
+
+    def _connessione_thread(self) -> QSqlDatabase:
+        """Restituisce (aprendola se serve) la connessione del thread corrente."""
+        thread = QThread.currentThread()
+        nome = thread.property(self._proprieta_connessione)
+        if nome:
+            return QSqlDatabase.database(nome)
+
+        nome = f"worker_{id(self)}_{next(self._contatore)}"
+        db = QSqlDatabase.addDatabase("QSQLITE", nome)
+        db.setDatabaseName(self.nome_database)
+        opzioni = f"QSQLITE_BUSY_TIMEOUT={profilo_attivo()['busy_timeout']}"
+        if self.sola_lettura:
+            opzioni = f"QSQLITE_OPEN_READONLY;{opzioni}"  # Di norma i worker leggono soltanto
+        db.setConnectOptions(opzioni)
+        if not db.open():
+            raise ErroreQuery(db.lastError())
+        pragma = pragma_profilo(sola_lettura=self.sola_lettura)
+        if not self.sola_lettura:
+            pragma.append("PRAGMA foreign_keys = ON")
+        for statement in pragma:
+            db.exec(statement)
+        thread.setProperty(self._proprieta_connessione, nome)
+        with self._lock:
+            self._connessioni.add(nome)
+        return db
+
+    def _pool_letture(self) -> ReadConnectionPool:
+        """Il pool sqlite3 delle letture in blocco: una connessione per thread, non si attende mai."""
+        with self._lock:
+            if self._letture is None:
+                self._letture = ReadConnectionPool(self.nome_database, self.pool.maxThreadCount())
+            return self._letture
+
+    def _prendi(self, request_id: int):
+        with self._lock:
+            voce = self._richieste.pop(request_id, None)
+            if voce is not None and self._ultima.get(voce[0]) == request_id:
+                del self._ultima[voce[0]]
+        return voce
+
+    @Slot(int, object)
+    def _on_completata(self, request_id: int, risultato):
+        voce = self._prendi(request_id)
+        if voce is not None:
+            voce[1](risultato)
+
+    @Slot(int, object)
+    def _on_fallita(self, request_id: int, errore):
+        voce = self._prendi(request_id)
+        if voce is None:
+            return
+        if voce[2] is not None:
+            voce[2](errore)
+        else:
+            print(f"Errore caricamento '{voce[0]}': {errore}") # Debug
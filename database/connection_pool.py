@@ -0,0 +1,48 @@
+# This Python file uses the following encoding: utf-8
+"""
+Piccolo pool di connessioni sqlite3 di sola lettura.
+
+Con il journal WAL più lettori possono leggere in parallelo tra loro e con
+lo scrittore: ogni thread prende una connessione dal pool, la usa e la
+restituisce. Il numero di connessioni è limitato (voce 'lettori' del profilo).
+"""
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+from database.sqlite_profile import connetti, profilo_attivo
+
+
+class ReadConnectionPool:
+    """Pool di connessioni sqlite3 in sola lettura, condivisibili tra thread."""
+
+    def __init__(self, percorso: str, dimensione: int = None):
+        self.percorso = percorso
+        self.dimensione = dimensione or profilo_attivo()["lettori"]
+        self._libere = queue.LifoQueue()  # LIFO: riusa la connessione con la cache più "calda"
+        self._aperte = []
+        for _ in range(self.dimensione):
+            # check_same_thread=False: la connessione passa da un thread all'altro,
+            # ma il pool garantisce che la usi un solo thread alla volta
+            conn = connetti(percorso, sola_lettura=True, check_same_thread=False)
+            self._aperte.append(conn)
+            self._libere.put(conn)
+
+    @contextmanager
+    def connessione(self, timeout: float = None):
+        """Presta una connessione (attende se sono tutte in uso)."""
+        try:
+            conn = self._libere.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Nessuna connessione di lettura disponibile") from None
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()  # Non lasciare snapshot WAL aperti
+            self._libere.put(conn)
+
+    def chiudi(self):
+        for conn in self._aperte:
+            conn.close()
+        self._aperte.clear()
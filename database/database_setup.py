@@ -4,181 +4,222 @@
 #     pass
 import sqlite3
 import os
+from contextlib import contextmanager
 from PySide6.QtSql import QSqlDatabase, QSqlError
 from PySide6.QtWidgets import QMessageBox
 
+from database.migrations import applica_migrazioni, versione_corrente, VERSIONE_SCHEMA
+from database.sqlite_profile import connetti, pragma_profilo, profilo_attivo, nome_profilo
+
 NOME_DATABASE = "inventario_hardware_v3.db" # Versione 3
 
-def crea_database_v3():
+@contextmanager
+def _connessione(conn: sqlite3.Connection = None):
+    """Usa la connessione ricevuta, oppure ne apre (e chiude) una sul database."""
+    if conn is not None:
+        yield conn
+        return
+    conn = connetti(NOME_DATABASE) # Profilo attivo + foreign_keys
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def _ha_schema(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Porte')"
+    ).fetchone()[0] == 1
+
+def _ha_dati(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT EXISTS (SELECT 1 FROM Porte)").fetchone()[0] == 1
+
+def crea_database_v3(conn: sqlite3.Connection = None):
     """
     Crea lo schema del database v3, aggiungendo Edifici e Piani
     e normalizzando la tabella Locali.
     """
-    if os.path.exists(NOME_DATABASE):
+    if conn is None and os.path.exists(NOME_DATABASE):
         return  # Esiste già
 
-    print(f"Creo il file database '{NOME_DATABASE}'...")
-    conn = None
     try:
-        conn = sqlite3.connect(NOME_DATABASE)
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA foreign_keys = ON;")
-
-        schema_sql = """
-
-        -- NUOVA TABELLA: Edifici
-        CREATE TABLE Edifici (
-            edificio_id INTEGER PRIMARY KEY,
-            nome_edificio TEXT NOT NULL UNIQUE,
-            indirizzo TEXT,
-            note TEXT
-        );
-
-        -- NUOVA TABELLA: Piani (collegata a Edifici)
-        CREATE TABLE Piani (
-            piano_id INTEGER PRIMARY KEY,
-            nome_piano TEXT NOT NULL, -- Es. "Piano 1", "PT", "Livello -1"
-            edificio_id INTEGER NOT NULL,
-            FOREIGN KEY (edificio_id) REFERENCES Edifici (edificio_id)
-                ON DELETE CASCADE, -- Se elimino un edificio, elimino i suoi piani
-            UNIQUE(nome_piano, edificio_id) -- Evita "Piano 1" duplicati nello stesso edificio
-        );
-
-        -- TABELLA MODIFICATA: Locali
-        CREATE TABLE Locali (
-            locale_id INTEGER PRIMARY KEY,
-            nome_locale TEXT NOT NULL UNIQUE,
-            descrizione TEXT,
-            -- I campi 'edificio' e 'piano' (testo) sono stati rimossi
-            -- Sostituiti da un link alla tabella Piani
-            piano_id INTEGER,
-            FOREIGN KEY (piano_id) REFERENCES Piani (piano_id)
-                ON DELETE SET NULL -- Se elimino un piano, il locale resta "flottante"
-        );
-
-        -- Il resto dello schema rimane invariato
-        CREATE TABLE Porte (
-            porta_id INTEGER PRIMARY KEY, nome_porta TEXT NOT NULL UNIQUE,
-            locale_id INTEGER, note TEXT,
-            FOREIGN KEY (locale_id) REFERENCES Locali (locale_id)
-        );
-        CREATE TABLE Tipi_Dispositivi (
-            tipo_id INTEGER PRIMARY KEY, nome_tipo TEXT NOT NULL UNIQUE,
-            descrizione TEXT
-        );
-        CREATE TABLE Inventario_Dispositivi (
-            dispositivo_id INTEGER PRIMARY KEY, modello TEXT NOT NULL,
-            matricola TEXT UNIQUE, descrizione TEXT, data_installazione DATE,
-            stato TEXT DEFAULT 'Operativo', tipo_id INTEGER NOT NULL,
-            parent_dispositivo_id INTEGER, locale_id INTEGER, porta_id INTEGER,
-            FOREIGN KEY (tipo_id) REFERENCES Tipi_Dispositivi (tipo_id),
-            FOREIGN KEY (parent_dispositivo_id) REFERENCES Inventario_Dispositivi (dispositivo_id),
-            FOREIGN KEY (locale_id) REFERENCES Locali (locale_id),
-            FOREIGN KEY (porta_id) REFERENCES Porte (porta_id)
-        );
-        CREATE TABLE SistemiEsterni (
-            sistema_id INTEGER PRIMARY KEY, nome_sistema TEXT NOT NULL UNIQUE,
-            tipo_sistema TEXT, referente_tecnico TEXT
-        );
-        CREATE TABLE Interconnessioni (
-            interconnessione_id INTEGER PRIMARY KEY,
-            dispositivo_id INTEGER NOT NULL, sistema_id INTEGER NOT NULL,
-            descrizione_connessione TEXT NOT NULL, tipo_segnale TEXT, note TEXT,
-            FOREIGN KEY (dispositivo_id) REFERENCES Inventario_Dispositivi (dispositivo_id),
-            FOREIGN KEY (sistema_id) REFERENCES SistemiEsterni (sistema_id)
-        );
-        """
-        cursor.executescript(schema_sql)
-        conn.commit()
-        print("Schema database v3 creato.")
+        with _connessione(conn) as conn:
+            if _ha_schema(conn):
+                return
+            nome_file = conn.execute("PRAGMA database_list").fetchone()[2]
+            print(f"Creo lo schema nel database '{nome_file or NOME_DATABASE}'...")
+            _crea_schema(conn)
     except sqlite3.Error as e:
         print(f"Errore creazione database: {e}")
-    finally:
-        if conn:
-            conn.close()
 
-def popola_dati_esempio_v3():
+def _crea_schema(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+
+    schema_sql = """
+
+    -- NUOVA TABELLA: Edifici
+    CREATE TABLE Edifici (
+        edificio_id INTEGER PRIMARY KEY,
+        nome_edificio TEXT NOT NULL UNIQUE,
+        indirizzo TEXT,
+        note TEXT
+    );
+
+    -- NUOVA TABELLA: Piani (collegata a Edifici)
+    CREATE TABLE Piani (
+        piano_id INTEGER PRIMARY KEY,
+        nome_piano TEXT NOT NULL, -- Es. "Piano 1", "PT", "Livello -1"
+        edificio_id INTEGER NOT NULL,
+        FOREIGN KEY (edificio_id) REFERENCES Edifici (edificio_id)
+            ON DELETE CASCADE, -- Se elimino un edificio, elimino i suoi piani
+        UNIQUE(nome_piano, edificio_id) -- Evita "Piano 1" duplicati nello stesso edificio
+    );
+
+    -- TABELLA MODIFICATA: Locali
+    CREATE TABLE Locali (
+        locale_id INTEGER PRIMARY KEY,
+        nome_locale TEXT NOT NULL UNIQUE,
+        descrizione TEXT,
+        -- I campi 'edificio' e 'piano' (testo) sono stati rimossi
+        -- Sostituiti da un link alla tabella Piani
+        piano_id INTEGER,
+        FOREIGN KEY (piano_id) REFERENCES Piani (piano_id)
+            ON DELETE SET NULL -- Se elimino un piano, il locale resta "flottante"
+    );
+
+    -- Il resto dello schema rimane invariato
+    CREATE TABLE Porte (
+        porta_id INTEGER PRIMARY KEY, nome_porta TEXT NOT NULL UNIQUE,
+        locale_id INTEGER, note TEXT,
+        FOREIGN KEY (locale_id) REFERENCES Locali (locale_id)
+    );
+    CREATE TABLE Tipi_Dispositivi (
+        tipo_id INTEGER PRIMARY KEY, nome_tipo TEXT NOT NULL UNIQUE,
+        descrizione TEXT
+    );
+    CREATE TABLE Inventario_Dispositivi (
+        dispositivo_id INTEGER PRIMARY KEY, modello TEXT NOT NULL,
+        matricola TEXT UNIQUE, descrizione TEXT, data_installazione DATE,
+        stato TEXT DEFAULT 'Operativo', tipo_id INTEGER NOT NULL,
+        parent_dispositivo_id INTEGER, locale_id INTEGER, porta_id INTEGER,
+        FOREIGN KEY (tipo_id) REFERENCES Tipi_Dispositivi (tipo_id),
+        FOREIGN KEY (parent_dispositivo_id) REFERENCES Inventario_Dispositivi (dispositivo_id),
+        FOREIGN KEY (locale_id) REFERENCES Locali (locale_id),
+        FOREIGN KEY (porta_id) REFERENCES Porte (porta_id)
+    );
+    CREATE TABLE SistemiEsterni (
+        sistema_id INTEGER PRIMARY KEY, nome_sistema TEXT NOT NULL UNIQUE,
+        tipo_sistema TEXT, referente_tecnico TEXT
+    );
+    CREATE TABLE Interconnessioni (
+        interconnessione_id INTEGER PRIMARY KEY,
+        dispositivo_id INTEGER NOT NULL, sistema_id INTEGER NOT NULL,
+        descrizione_connessione TEXT NOT NULL, tipo_segnale TEXT, note TEXT,
+        FOREIGN KEY (dispositivo_id) REFERENCES Inventario_Dispositivi (dispositivo_id),
+        FOREIGN KEY (sistema_id) REFERENCES SistemiEsterni (sistema_id)
+    );
+    """
+    cursor.executescript(schema_sql)
+    conn.commit()
+    print("Schema database v3 creato.")
+
+def aggiorna_schema_v3(conn: sqlite3.Connection = None):
+    """
+    Applica le migrazioni mancanti (indici, nuove tabelle...), anche a un
+    database v3 già esistente. Vedi database/migrations.py.
+    """
+    try:
+        with _connessione(conn) as conn:
+            applica_migrazioni(conn)
+    except sqlite3.Error as e:
+        print(f"Errore migrazione database: {e}")
+
+def popola_dati_esempio_v3(conn: sqlite3.Connection = None):
     """
     Popola il database v3 con dati di esempio SE è vuoto.
     """
     print("Controllo popolamento dati v3...")
     try:
-        conn = sqlite3.connect(NOME_DATABASE)
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA foreign_keys = ON;")
-
-        cursor.execute("SELECT COUNT(*) FROM Porte")
-        if cursor.fetchone()[0] > 0:
-            print("Database già popolato.")
-            conn.close()
-            return
-
-        print("Database vuoto, inserisco dati di esempio v3...")
-
-        # 1. Popola le nuove tabelle
-        cursor.execute("""
-            INSERT INTO Edifici (edificio_id, nome_edificio, indirizzo)
-            VALUES (1, 'Edificio A', 'Via Roma 1, Milano');
-        """)
-        cursor.execute("""
-            INSERT INTO Edifici (edificio_id, nome_edificio, indirizzo)
-            VALUES (2, 'Edificio B - Magazzino', 'Via Po 10, Milano');
-        """)
-
-        cursor.execute("INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (1, 'Piano 1', 1);")
-        cursor.execute("INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (2, 'Piano Terra', 1);")
-        cursor.execute("INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (3, 'Piano Terra', 2);")
-
-        # 2. Modifica l'inserimento dei Locali
-        # Ora 'Locale CED' è collegato al 'Piano 1' (piano_id=1)
-        cursor.execute("""
-            INSERT INTO Locali (locale_id, nome_locale, descrizione, piano_id)
-            VALUES (1, 'Locale CED', 'Rack Principale Controllo Accessi', 1);
-        """)
-        # Aggiungiamo un altro locale
-        cursor.execute("""
-            INSERT INTO Locali (locale_id, nome_locale, descrizione, piano_id)
-            VALUES (2, 'Reception', 'Guardia all ingresso', 2);
-        """)
-
-        # 3. Il resto (Porte, Tipi, etc.) rimane quasi uguale
-        cursor.execute("INSERT INTO Tipi_Dispositivi (nome_tipo) VALUES ('Centralina'), ('Lettore'), ('Serratura'), ('Scatola Interfaccia');")
-
-        # La porta "Ingresso Principale" è nel locale "Reception" (locale_id=2)
-        cursor.execute("INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (1, 'Ingresso Principale', 2);")
-        # La porta "Sala Server" è nel locale "Locale CED" (locale_id=1)
-        cursor.execute("INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (2, 'Porta Sala Server', 1);")
-
-        cursor.execute("INSERT INTO SistemiEsterni (nome_sistema, tipo_sistema) VALUES ('Impianto Antincendio', 'Sicurezza');")
-
-        # La Centralina (dispositivo_id=1) è nel Locale CED (locale_id=1)
-        cursor.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, locale_id) VALUES ('Axis A1001', 1, 1);")
-
-        # Dispositivi su 'Ingresso Principale' (porta_id=1), collegati alla Centralina (parent=1)
-        cursor.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, parent_dispositivo_id, porta_id) VALUES ('HID R10', 2, 1, 1);")
-        cursor.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, parent_dispositivo_id, porta_id, descrizione) VALUES ('Modulo I/O', 4, 1, 1, 'Scatola sopra porta');") # id=3
-
-        # Dispositivi su 'Porta Sala Server' (porta_id=2), collegati alla Centralina (parent=1)
-        cursor.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, parent_dispositivo_id, porta_id) VALUES ('BioLite N2', 2, 1, 2);")
-
-        cursor.execute("INSERT INTO Interconnessioni (dispositivo_id, sistema_id, descrizione_connessione) VALUES (3, 1, 'Input Sblocco Emergenza');")
-
-        conn.commit()
-        print("Dati di esempio v3 inseriti.")
+        with _connessione(conn) as conn:
+            if _ha_dati(conn):
+                print("Database già popolato.")
+                return
+            print("Database vuoto, inserisco dati di esempio v3...")
+            _inserisci_dati_esempio(conn)
     except sqlite3.Error as e:
         print(f"Errore popolamento: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-def setup_database():
-    """Funzione unica per creare e popolare il DB."""
-    # Aggiorniamo il nome del file DB
-    global NOME_DATABASE
-    NOME_DATABASE = "inventario_hardware_v3.db"
 
-    crea_database_v3()
-    popola_dati_esempio_v3()
+def _inserisci_dati_esempio(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+
+    # 1. Popola le nuove tabelle
+    cursor.execute("""
+        INSERT INTO Edifici (edificio_id, nome_edificio, indirizzo)
+        VALUES (1, 'Edificio A', 'Via Roma 1, Milano');
+    """)
+    cursor.execute("""
+        INSERT INTO Edifici (edificio_id, nome_edificio, indirizzo)
+        VALUES (2, 'Edificio B - Magazzino', 'Via Po 10, Milano');
+    """)
+
+    cursor.execute("INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (1, 'Piano 1', 1);")
+    cursor.execute("INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (2, 'Piano Terra', 1);")
+    cursor.execute("INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (3, 'Piano Terra', 2);")
+
+    # 2. Modifica l'inserimento dei Locali
+    # Ora 'Locale CED' è collegato al 'Piano 1' (piano_id=1)
+    cursor.execute("""
+        INSERT INTO Locali (locale_id, nome_locale, descrizione, piano_id)
+        VALUES (1, 'Locale CED', 'Rack Principale Controllo Accessi', 1);
+    """)
+    # Aggiungiamo un altro locale
+    cursor.execute("""
+        INSERT INTO Locali (locale_id, nome_locale, descrizione, piano_id)
+        VALUES (2, 'Reception', 'Guardia all ingresso', 2);
+    """)
+
+    # 3. Il resto (Porte, Tipi, etc.) rimane quasi uguale
+    cursor.execute("INSERT INTO Tipi_Dispositivi (nome_tipo) VALUES ('Centralina'), ('Lettore'), ('Serratura'), ('Scatola Interfaccia');")
+
+    # La porta "Ingresso Principale" è nel locale "Reception" (locale_id=2)
+    cursor.execute("INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (1, 'Ingresso Principale', 2);")
+    # La porta "Sala Server" è nel locale "Locale CED" (locale_id=1)
+    cursor.execute("INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (2, 'Porta Sala Server', 1);")
+
+    cursor.execute("INSERT INTO SistemiEsterni (nome_sistema, tipo_sistema) VALUES ('Impianto Antincendio', 'Sicurezza');")
+
+    # La Centralina (dispositivo_id=1) è nel Locale CED (locale_id=1)
+    cursor.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, locale_id) VALUES ('Axis A1001', 1, 1);")
+
+    # Dispositivi su 'Ingresso Principale' (porta_id=1), collegati alla Centralina (parent=1)
+    cursor.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, parent_dispositivo_id, porta_id) VALUES ('HID R10', 2, 1, 1);")
+    cursor.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, parent_dispositivo_id, porta_id, descrizione) VALUES ('Modulo I/O', 4, 1, 1, 'Scatola sopra porta');") # id=3
+
+    # Dispositivi su 'Porta Sala Server' (porta_id=2), collegati alla Centralina (parent=1)
+    cursor.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, parent_dispositivo_id, porta_id) VALUES ('BioLite N2', 2, 1, 2);")
+
+    cursor.execute("INSERT INTO Interconnessioni (dispositivo_id, sistema_id, descrizione_connessione) VALUES (3, 1, 'Input Sblocco Emergenza');")
+
+    conn.commit()
+    print("Dati di esempio v3 inseriti.")
+
+def setup_database() -> bool:
+    """
+    Funzione unica per creare, aggiornare e popolare il DB, con una sola
+    connessione sqlite3. Se lo schema è già all'ultima versione e ci sono
+    dati non fa altro (è il caso di ogni avvio dopo il primo).
+    Restituisce True se è stato necessario intervenire sul database.
+    """
+    try:
+        with _connessione() as conn:
+            if (_ha_schema(conn) and versione_corrente(conn) == VERSIONE_SCHEMA
+                    and _ha_dati(conn)):
+                return False
+            crea_database_v3(conn)
+            aggiorna_schema_v3(conn)
+            popola_dati_esempio_v3(conn)
+    except sqlite3.Error as e:
+        print(f"Errore apertura database: {e}")
+    return True
 
 def connect_db() -> QSqlDatabase | None:
     """
@@ -190,6 +231,7 @@ def connect_db() -> QSqlDatabase | None:
 
     db = QSqlDatabase.addDatabase("QSQLITE", "qt_sql_default_connection")
     db.setDatabaseName(NOME_DATABASE)
+    db.setConnectOptions(f"QSQLITE_BUSY_TIMEOUT={profilo_attivo()['busy_timeout']}")
 
     if not db.open():
         QMessageBox.critical(None, "Errore Database",
@@ -201,4 +243,11 @@ def connect_db() -> QSqlDatabase | None:
     if not query.isActive():
          print(f"Errore abilitazione Foreign Keys: {query.lastError().text()}")
 
+    # Stesso profilo (WAL, cache, mmap...) usato dal setup con sqlite3
+    for pragma in pragma_profilo():
+        query = db.exec(pragma)
+        if query.lastError().isValid():
+            print(f"Errore '{pragma}': {query.lastError().text()}")
+    print(f"Profilo database: {nome_profilo()}")
+
     return db
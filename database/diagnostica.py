@@ -0,0 +1,262 @@
+# This Python file uses the following encoding: utf-8
+"""
+Strumentazione delle query dell'applicazione.
+
+Ogni query passata da database.async_loader (leggi_righe, esegui_scrittura)
+viene registrata qui con durata, righe, punto di chiamata e azione della UI
+in corso. Si raccolgono:
+
+- contatori per testo SQL (chiamate, tempo totale e massimo, righe, errori);
+- contatori per azione della UI (esecuzioni, query per esecuzione, tempo);
+- sospetti N+1: la stessa query ripetuta molte volte in una sola azione;
+- un log delle query lente (sopra la soglia) con il loro EXPLAIN QUERY PLAN.
+
+Le azioni si dichiarano nel thread della GUI con 'with azione("nome"):';
+AsyncLoader la ricorda al momento della richiesta e la riattiva nel worker.
+La configurazione si legge da 'inventario.ini' (o da riga di comando):
+
+    [diagnostica]
+    soglia_query_lente_ms = 50
+    log_query_lente = query_lente.log
+    json = diagnostica.json        ; scritto all'uscita (facoltativo)
+
+Questo modulo non usa Qt: il pannello è in widget/diagnostica_widget.py.
+"""
+import argparse
+import configparser
+import itertools
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+FILE_CONFIG = "inventario.ini"
+
+SOGLIA_LENTE_PREDEFINITA_MS = 50.0
+SOGLIA_N_PIU_1 = 10         # Ripetizioni della stessa query in un'azione
+MAX_MESSAGGI = 100          # Errori e avvisi conservati
+
+_config = {
+    "soglia_query_lente_ms": SOGLIA_LENTE_PREDEFINITA_MS,
+    "log_query_lente": None,  # None = le query lente sono solo contate
+    "json": None,
+}
+
+_lock = threading.Lock()
+_locale = threading.local()   # Azione attiva nel thread corrente
+_contatore_azioni = itertools.count(1)
+
+
+class Azione:
+    """Un'esecuzione di un'azione della UI (es. un click su una porta)."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.numero = next(_contatore_azioni)
+        self.query = Counter()  # sql -> chiamate in questa esecuzione
+        self.totale = 0
+
+
+def _nuove_statistiche() -> dict:
+    return {"query": {}, "azioni": {}, "n_piu_1": [], "errori": [], "avvisi": [],
+            "query_lente": 0, "inizio": datetime.now().isoformat(timespec="seconds")}
+
+
+_statistiche = _nuove_statistiche()
+
+
+# --- Configurazione ---
+
+def configura(argv: list = None, file_config: str = FILE_CONFIG) -> dict:
+    """Legge la sezione [diagnostica] e le opzioni --soglia-query-lente / --log-query-lente."""
+    if os.path.exists(file_config):
+        config = configparser.ConfigParser()
+        config.read(file_config, encoding="utf-8")
+        if config.has_section("diagnostica"):
+            sezione = config["diagnostica"]
+            _config["soglia_query_lente_ms"] = sezione.getfloat(
+                "soglia_query_lente_ms", _config["soglia_query_lente_ms"])
+            _config["log_query_lente"] = sezione.get("log_query_lente", _config["log_query_lente"])
+            _config["json"] = sezione.get("json", _config["json"])
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--soglia-query-lente", type=float)
+    parser.add_argument("--log-query-lente")
+    parser.add_argument("--diagnostica-json")
+    args, _ = parser.parse_known_args((argv or [])[1:])
+    if args.soglia_query_lente is not None:
+        _config["soglia_query_lente_ms"] = args.soglia_query_lente
+    if args.log_query_lente:
+        _config["log_query_lente"] = args.log_query_lente
+    if args.diagnostica_json:
+        _config["json"] = args.diagnostica_json
+    return dict(_config)
+
+
+def soglia_lente_ms() -> float:
+    return _config["soglia_query_lente_ms"]
+
+
+def percorso_json() -> str | None:
+    return _config["json"]
+
+
+# --- Azioni ---
+
+def apri_azione(nome: str) -> Azione:
+    """Nuova esecuzione dell'azione 'nome' (senza attivarla)."""
+    with _lock:
+        voce = _statistiche["azioni"].setdefault(nome, _nuova_voce_azione())
+        voce["esecuzioni"] += 1
+    return Azione(nome)
+
+
+@contextmanager
+def azione(nome: str):
+    """Attribuisce a 'nome' le query eseguite o richieste (anche in background) nel blocco."""
+    precedente = getattr(_locale, "azione", None)
+    _locale.azione = apri_azione(nome)
+    try:
+        yield _locale.azione
+    finally:
+        _locale.azione = precedente
+
+
+def azione_corrente() -> Azione | None:
+    return getattr(_locale, "azione", None)
+
+
+@contextmanager
+def in_azione(azione_attiva: Azione | None):
+    """Riattiva nel thread corrente un'azione nata altrove (usato dai worker)."""
+    precedente = getattr(_locale, "azione", None)
+    _locale.azione = azione_attiva
+    try:
+        yield
+    finally:
+        _locale.azione = precedente
+
+
+def _nuova_voce_azione() -> dict:
+    return {"esecuzioni": 0, "query": 0, "max_query_per_esecuzione": 0, "tempo_ms": 0.0}
+
+
+# --- Registrazione ---
+
+def sito_chiamata(profondita: int) -> str:
+    """'file.py:riga funzione' della funzione 'profondita' livelli sopra questa nello stack."""
+    frame = sys._getframe(profondita)
+    percorso = os.path.relpath(frame.f_code.co_filename)
+    return f"{percorso}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def registra(sql: str, durata_ms: float, righe: int, sito: str, errore: str = None) -> bool:
+    """
+    Registra una query eseguita. Restituisce True se è lenta e c'è un log
+    delle query lente: in quel caso il chiamante passa il piano a registra_lenta().
+    """
+    azione_attiva = azione_corrente()
+    with _lock:
+        voce = _statistiche["query"].get(sql)
+        if voce is None:
+            voce = _statistiche["query"][sql] = {
+                "chiamate": 0, "tempo_ms": 0.0, "max_ms": 0.0, "righe": 0, "errori": 0, "siti": Counter()}
+        voce["chiamate"] += 1
+        voce["tempo_ms"] += durata_ms
+        voce["max_ms"] = max(voce["max_ms"], durata_ms)
+        voce["righe"] += righe
+        voce["siti"][sito] += 1
+        if errore is not None:
+            voce["errori"] += 1
+            _aggiungi_messaggio("errori", f"{sito}: {errore}")
+
+        if azione_attiva is not None:
+            per_azione = _statistiche["azioni"].setdefault(azione_attiva.nome, _nuova_voce_azione())
+            per_azione["query"] += 1
+            per_azione["tempo_ms"] += durata_ms
+            azione_attiva.query[sql] += 1
+            azione_attiva.totale += 1
+            per_azione["max_query_per_esecuzione"] = max(per_azione["max_query_per_esecuzione"],
+                                                         azione_attiva.totale)
+            if azione_attiva.query[sql] == SOGLIA_N_PIU_1:
+                _statistiche["n_piu_1"].append({"azione": azione_attiva.nome, "sql": _compatta(sql),
+                                                "sito": sito, "ripetizioni_minime": SOGLIA_N_PIU_1})
+
+        lenta = errore is None and durata_ms >= _config["soglia_query_lente_ms"]
+        if lenta:
+            _statistiche["query_lente"] += 1
+    return lenta and bool(_config["log_query_lente"])
+
+
+def registra_lenta(sql: str, parametri: tuple, durata_ms: float, righe: int, sito: str, piano: list):
+    """Scrive la query lenta con il suo piano nel log configurato (se c'è)."""
+    percorso = _config["log_query_lente"]
+    if not percorso:
+        return
+    azione_attiva = azione_corrente()
+    righe_log = [
+        f"--- {datetime.now().isoformat(timespec='milliseconds')}  {durata_ms:.1f} ms  {righe} righe",
+        f"sito: {sito}",
+        f"azione: {azione_attiva.nome if azione_attiva else '-'}",
+        f"parametri: {list(parametri)!r}",
+        _compatta(sql),
+        "piano:",
+    ] + [f"  {passo}" for passo in piano]
+    with _lock:
+        with open(percorso, "a", encoding="utf-8") as f:
+            f.write("\n".join(righe_log) + "\n\n")
+
+
+def avviso(messaggio: str):
+    """Registra un avviso (es. i warning di QtSql, che non vengono più stampati)."""
+    with _lock:
+        _aggiungi_messaggio("avvisi", messaggio)
+
+
+def _aggiungi_messaggio(tipo: str, testo: str):
+    messaggi = _statistiche[tipo]
+    messaggi.append(f"{datetime.now().isoformat(timespec='seconds')} {testo}")
+    del messaggi[:-MAX_MESSAGGI]
+
+
+def _compatta(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+# --- Lettura dei contatori ---
+
+def istantanea() -> dict:
+    """Copia serializzabile in JSON dei contatori, query ordinate per tempo totale."""
+    with _lock:
+        query = [
+            {"sql": _compatta(sql), "chiamate": v["chiamate"], "tempo_ms": round(v["tempo_ms"], 3),
+             "media_ms": round(v["tempo_ms"] / v["chiamate"], 3), "max_ms": round(v["max_ms"], 3),
+             "righe": v["righe"], "errori": v["errori"], "siti": dict(v["siti"])}
+            for sql, v in _statistiche["query"].items()
+        ]
+        return {
+            "inizio": _statistiche["inizio"],
+            "soglia_query_lente_ms": _config["soglia_query_lente_ms"],
+            "query_lente": _statistiche["query_lente"],
+            "query": sorted(query, key=lambda voce: voce["tempo_ms"], reverse=True),
+            "azioni": {nome: dict(v, tempo_ms=round(v["tempo_ms"], 3))
+                       for nome, v in _statistiche["azioni"].items()},
+            "n_piu_1": list(_statistiche["n_piu_1"]),
+            "errori": list(_statistiche["errori"]),
+            "avvisi": list(_statistiche["avvisi"]),
+        }
+
+
+def salva_json(percorso: str):
+    with open(percorso, "w", encoding="utf-8") as f:
+        json.dump(istantanea(), f, ensure_ascii=False, indent=2)
+
+
+def azzera():
+    global _statistiche
+    with _lock:
+        _statistiche = _nuove_statistiche()
+
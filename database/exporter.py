@@ -0,0 +1,154 @@
+# This Python file uses the following encoding: utf-8
+"""
+Esportazione dell'inventario in CSV o JSONL (report per i revisori).
+
+Per ogni tipo di entità c'è una sola query con tutte le JOIN necessarie;
+le righe vengono lette dal cursore e scritte su disco una alla volta, senza
+mai costruire il risultato in memoria. I dispositivi vengono esportati con
+le stesse colonne lette da database.importer, più l'id e il percorso completo
+'Edificio  >  Piano  >  Locale  >  Porta'.
+
+Uso:  python -m database.exporter CARTELLA [--db FILE] [--formato csv|jsonl] [--entita ...]
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from database.importer import COLONNE
+from database.percorsi import formatta_percorso
+from database.sqlite_profile import connetti
+
+# Colonne del percorso, nell'ordine in cui compaiono nella riga
+COLONNE_PERCORSO = ("edificio", "piano", "locale", "porta")
+
+# Tipo di entità -> (colonne, query). Le colonne del percorso sono sempre le prime dopo l'id.
+ESPORTAZIONI = {
+    "dispositivi": (("dispositivo_id",) + COLONNE, """
+        SELECT d.dispositivo_id, e.nome_edificio, p.nome_piano, l.nome_locale, po.nome_porta,
+               t.nome_tipo, d.modello, d.matricola, d.descrizione, d.stato,
+               d.data_installazione, padre.matricola
+        FROM Inventario_Dispositivi d
+        JOIN Tipi_Dispositivi t ON t.tipo_id = d.tipo_id
+        LEFT JOIN Porte po ON po.porta_id = d.porta_id
+        -- Un dispositivo su una porta si trova nel locale della porta
+        LEFT JOIN Locali l ON l.locale_id = COALESCE(po.locale_id, d.locale_id)
+        LEFT JOIN Piani p ON p.piano_id = l.piano_id
+        LEFT JOIN Edifici e ON e.edificio_id = p.edificio_id
+        LEFT JOIN Inventario_Dispositivi padre ON padre.dispositivo_id = d.parent_dispositivo_id
+        ORDER BY d.dispositivo_id"""),
+    "porte": (("porta_id", "edificio", "piano", "locale", "porta", "note", "dispositivi"), """
+        SELECT po.porta_id, e.nome_edificio, p.nome_piano, l.nome_locale, po.nome_porta, po.note,
+               (SELECT COUNT(*) FROM Inventario_Dispositivi d WHERE d.porta_id = po.porta_id)
+        FROM Porte po
+        LEFT JOIN Locali l ON l.locale_id = po.locale_id
+        LEFT JOIN Piani p ON p.piano_id = l.piano_id
+        LEFT JOIN Edifici e ON e.edificio_id = p.edificio_id
+        ORDER BY po.porta_id"""),
+    "locali": (("locale_id", "edificio", "piano", "locale", "descrizione"), """
+        SELECT l.locale_id, e.nome_edificio, p.nome_piano, l.nome_locale, l.descrizione
+        FROM Locali l
+        LEFT JOIN Piani p ON p.piano_id = l.piano_id
+        LEFT JOIN Edifici e ON e.edificio_id = p.edificio_id
+        ORDER BY l.locale_id"""),
+    "interconnessioni": (("interconnessione_id", "matricola", "modello", "sistema", "tipo_sistema",
+                          "descrizione_connessione", "tipo_segnale", "note"), """
+        SELECT i.interconnessione_id, d.matricola, d.modello, s.nome_sistema, s.tipo_sistema,
+               i.descrizione_connessione, i.tipo_segnale, i.note
+        FROM Interconnessioni i
+        JOIN Inventario_Dispositivi d ON d.dispositivo_id = i.dispositivo_id
+        JOIN SistemiEsterni s ON s.sistema_id = i.sistema_id
+        ORDER BY i.interconnessione_id"""),
+}
+
+
+def righe_esportazione(conn: sqlite3.Connection, entita: str):
+    """
+    Generatore di (colonne, riga): la prima tupla prodotta sono le intestazioni
+    (con 'posizione' se l'entità ha un percorso), poi una tupla per riga.
+    """
+    colonne, sql = ESPORTAZIONI[entita]
+    percorso = [i for i, colonna in enumerate(colonne) if colonna in COLONNE_PERCORSO]
+    yield colonne + ("posizione",) if percorso else colonne
+    cursore = conn.execute(sql)
+    cursore.arraysize = 1000
+    while True:
+        blocco = cursore.fetchmany()
+        if not blocco:
+            break
+        for riga in blocco:
+            if percorso:
+                posizione = formatta_percorso(*(riga[i] for i in percorso))
+                riga = riga + (posizione,)
+            yield riga
+
+
+def scrivi_csv(righe, percorso: str) -> int:
+    with open(percorso, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(next(righe))
+        n = 0
+        for riga in righe:
+            writer.writerow(riga)
+            n += 1
+    return n
+
+
+def scrivi_jsonl(righe, percorso: str) -> int:
+    with open(percorso, "w", encoding="utf-8") as f:
+        colonne = next(righe)
+        n = 0
+        for riga in righe:
+            f.write(json.dumps(dict(zip(colonne, riga)), ensure_ascii=False))
+            f.write("\n")
+            n += 1
+    return n
+
+
+def esporta(conn: sqlite3.Connection, cartella: str, formato: str = "csv", entita=None) -> dict:
+    """
+    Esporta le entità richieste (tutte se None) in 'cartella/<entita>.<formato>'.
+    Tutte le query leggono dalla stessa istantanea del database.
+    Restituisce {entita: righe scritte}.
+    """
+    scrivi = scrivi_jsonl if formato == "jsonl" else scrivi_csv
+    os.makedirs(cartella, exist_ok=True)
+    risultati = {}
+    conn.execute("BEGIN")  # Una sola transazione di lettura: export coerente tra i file
+    try:
+        for nome in entita or ESPORTAZIONI:
+            risultati[nome] = scrivi(righe_esportazione(conn, nome), os.path.join(cartella, f"{nome}.{formato}"))
+    finally:
+        conn.rollback()
+    return risultati
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Esporta l'inventario in CSV/JSONL.")
+    parser.add_argument("cartella", help="cartella di destinazione")
+    parser.add_argument("--db", default="inventario_hardware_v3.db")
+    parser.add_argument("--formato", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--entita", nargs="+", choices=sorted(ESPORTAZIONI), help="predefinito: tutte")
+    args = parser.parse_args()
+
+    inizio = time.perf_counter()
+    try:
+        conn = connetti(args.db, sola_lettura=True)
+        try:
+            risultati = esporta(conn, args.cartella, args.formato, args.entita)
+        finally:
+            conn.close()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Errore esportazione: {e}")
+        sys.exit(1)
+
+    for nome, n in risultati.items():
+        print(f"{nome}: {n} righe")
+    print(f"Esportazione completata in {time.perf_counter() - inizio:.1f} s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# This Python file uses the following encoding: utf-8
+"""
+Giornale delle modifiche (migrazione 4): chi ha cambiato cosa e quando su
+porte, locali, dispositivi e interconnessioni.
+
+I trigger scrivono in Giornale_Modifiche, che accetta solo aggiunte, una voce
+per riga inserita, modificata o eliminata con le sole colonne coinvolte.
+L'autore è quello impostato con imposta_autore() nella stessa transazione.
+
+- storia(): le voci dalla più recente, a pagine con cursore sulla chiave
+  (giornale_id): ogni pagina è una ricerca sull'indice, anche con milioni
+  di righe.
+- riepiloga(): le voci successive a un cursore raggruppate per entità, per
+  chi segue le modifiche fatte da altre istanze (vedi OsservatoreModifiche).
+- stato_a(): lo stato di un'entità a un istante, ricostruito partendo dalla
+  riga attuale e annullando all'indietro le voci successive. Funziona anche
+  per le entità create prima del giornale, e costa quanto le modifiche
+  avvenute dopo quell'istante.
+
+Questo modulo usa solo sqlite3 (niente Qt):
+    python -m database.giornale --db FILE [--tipo porta --id 5] [--prima-di ID]
+    python -m database.giornale --db FILE --tipo porta --id 5 --istante 2026-10-01T12:00
+"""
+import argparse
+import getpass
+import json
+import sqlite3
+from datetime import datetime
+
+from database.migrations import ENTITA_GIORNALE
+from database.sqlite_profile import connetti
+
+DIMENSIONE_PAGINA = 100
+
+# tipo -> (codice, tabella, chiave, colonne)
+ENTITA = {tipo: (codice, tabella, chiave, colonne) for tabella, codice, tipo, chiave, colonne in ENTITA_GIORNALE}
+TIPO_DA_CODICE = {codice: tipo for tipo, (codice, _, _, _) in ENTITA.items()}
+
+OPERAZIONI = {"I": "inserimento", "U": "modifica", "D": "eliminazione"}
+
+# Da eseguire all'inizio di ogni transazione di scrittura (anche via QtSql)
+SQL_IMPOSTA_AUTORE = "UPDATE Giornale_Autore SET autore = ? WHERE id = 1"
+
+
+def autore_predefinito() -> str:
+    """Utente del sistema operativo."""
+    try:
+        return getpass.getuser()
+    except Exception:  # Nessuna variabile d'ambiente né voce in passwd
+        return "sconosciuto"
+
+
+def imposta_autore(conn: sqlite3.Connection, autore: str = None):
+    """Autore delle modifiche successive (va chiamata dentro la transazione)."""
+    conn.execute(SQL_IMPOSTA_AUTORE, (autore or autore_predefinito(),))
+
+
+def istante_ms(valore) -> int:
+    """datetime, testo ISO 8601 (ora locale se senza fuso) o ms -> millisecondi dal 1970."""
+    if isinstance(valore, (int, float)):
+        return int(valore)
+    if isinstance(valore, str):
+        valore = datetime.fromisoformat(valore)
+    return int(valore.timestamp() * 1000)
+
+
+def _voce(riga: tuple) -> dict:
+    giornale_id, istante, codice, entita_id, operazione, autore, campi = riga
+    return {
+        "giornale_id": giornale_id,
+        "istante": datetime.fromtimestamp(istante / 1000).isoformat(timespec="milliseconds"),
+        "tipo": TIPO_DA_CODICE.get(codice, codice),
+        "entita_id": entita_id,
+        "operazione": OPERAZIONI.get(operazione, operazione),
+        "autore": autore,
+        "campi": json.loads(campi),
+    }
+
+
+def storia(conn: sqlite3.Connection, tipo: str = None, entita_id: int = None,
+           prima_di: int = None, limite: int = DIMENSIONE_PAGINA) -> list:
+    """
+    Voci del giornale dalla più recente, eventualmente di un solo tipo o di
+    una sola entità. La pagina successiva si chiede con prima_di = il
+    giornale_id dell'ultima voce ricevuta.
+    """
+    condizioni, parametri = [], []
+    if tipo is not None:
+        condizioni.append("tipo = ?")
+        parametri.append(ENTITA[tipo][0])
+        if entita_id is not None:
+            condizioni.append("entita_id = ?")
+            parametri.append(entita_id)
+    if prima_di is not None:
+        condizioni.append("giornale_id < ?")
+        parametri.append(prima_di)
+    where = f"WHERE {' AND '.join(condizioni)}" if condizioni else ""
+    righe = conn.execute(f"""
+        SELECT giornale_id, istante, tipo, entita_id, operazione, autore, campi
+        FROM Giornale_Modifiche {where}
+        ORDER BY giornale_id DESC LIMIT ?""", (*parametri, limite))
+    return [_voce(riga) for riga in righe]
+
+
+def stato_a(conn: sqlite3.Connection, tipo: str, entita_id: int, istante) -> dict | None:
+    """
+    Colonne registrate dell'entità com'erano all'istante indicato
+    (None se in quel momento non esisteva).
+    """
+    codice, tabella, chiave, colonne = ENTITA[tipo]
+    riga = conn.execute(f"SELECT {', '.join(colonne)} FROM {tabella} WHERE {chiave} = ?",
+                        (entita_id,)).fetchone()
+    stato = dict(zip(colonne, riga)) if riga is not None else None
+    successive = conn.execute("""
+        SELECT operazione, campi FROM Giornale_Modifiche
+        WHERE tipo = ? AND entita_id = ? AND istante > ?
+        ORDER BY giornale_id DESC""", (codice, entita_id, istante_ms(istante)))
+    for operazione, campi in successive:
+        campi = json.loads(campi)
+        if operazione == "I":
+            stato = None  # Prima dell'inserimento non esisteva
+        elif operazione == "U":
+            stato = stato if stato is not None else dict.fromkeys(colonne)
+            for colonna, (prima, _) in campi.items():
+                stato[colonna] = prima
+        else:
+            # La voce di eliminazione contiene tutta la riga (colonne non nulle)
+            stato = dict.fromkeys(colonne)
+            stato.update(campi)
+    return stato
+
+
+# --- Voci successive a un cursore, per chi segue le modifiche ---
+
+QUERY_ULTIMA_VOCE = "SELECT IFNULL(MAX(giornale_id), 0) FROM Giornale_Modifiche"
+QUERY_VOCI_DOPO = """
+    SELECT giornale_id, tipo, entita_id, campi FROM Giornale_Modifiche
+    WHERE giornale_id > ? ORDER BY giornale_id LIMIT ?"""
+
+
+def riepiloga(righe: list) -> dict:
+    """
+    Righe (giornale_id, tipo, entita_id, campi) di QUERY_VOCI_DOPO ->
+    {tipo: {entita_id: {colonna: {valori}}}}: per ogni entità toccata i valori
+    (prima e dopo) delle colonne registrate nelle voci. Una colonna rimasta
+    uguale non compare: di una porta solo rinominata non si sa il locale.
+    """
+    modificate = {}
+    for _, codice, entita_id, campi in righe:
+        tipo = TIPO_DA_CODICE.get(codice)
+        if tipo is None:
+            continue
+        valori = modificate.setdefault(tipo, {}).setdefault(entita_id, {})
+        for colonna, valore in json.loads(campi).items():
+            # Modifica: [prima, dopo]; inserimento ed eliminazione: il valore
+            valori.setdefault(colonna, set()).update(valore if isinstance(valore, list) else (valore,))
+    return modificate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta il giornale delle modifiche.")
+    parser.add_argument("--db", default="inventario_hardware_v3.db")
+    parser.add_argument("--tipo", choices=sorted(ENTITA))
+    parser.add_argument("--id", type=int, help="id dell'entità (con --tipo)")
+    parser.add_argument("--prima-di", type=int, help="cursore: voci con giornale_id minore")
+    parser.add_argument("--limite", type=int, default=DIMENSIONE_PAGINA)
+    parser.add_argument("--istante", help="mostra lo stato dell'entità a questo istante (ISO 8601)")
+    args = parser.parse_args()
+
+    conn = connetti(args.db, sola_lettura=True)
+    try:
+        if args.istante is not None:
+            if args.tipo is None or args.id is None:
+                parser.error("--istante richiede --tipo e --id")
+            print(json.dumps(stato_a(conn, args.tipo, args.id, args.istante), ensure_ascii=False, indent=2))
+            return
+        voci = storia(conn, args.tipo, args.id, args.prima_di, args.limite)
+        for voce in voci:
+            print(f"{voce['giornale_id']:>10} {voce['istante']} {voce['autore'] or '-':<12} "
+                  f"{voce['operazione']:<12} {voce['tipo']} {voce['entita_id']}: "
+                  f"{json.dumps(voce['campi'], ensure_ascii=False)}")
+        if len(voci) == args.limite:
+            print(f"Pagina successiva: --prima-di {voci[-1]['giornale_id']}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
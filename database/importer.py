@@ -0,0 +1,284 @@
+# This Python file uses the following encoding: utf-8
+"""
+Importazione massiva di dispositivi da file CSV o JSONL.
+
+Ogni riga descrive un dispositivo e la sua posizione per nome:
+
+    edificio, piano, locale, porta, tipo, modello, matricola, descrizione,
+    stato, data_installazione, matricola_padre
+
+Edifici, piani, locali, porte e tipi vengono risolti in id tramite tabelle
+di lookup in memoria (e creati se mancano). Le righe vengono lette in
+streaming e inserite a blocchi con executemany: la memoria usata dipende
+dalla dimensione del blocco, non da quella del file. Il dispositivo padre
+(matricola_padre) viene collegato alla fine con un solo UPDATE.
+
+Uso:  python -m database.importer FILE [FILE...] [--db FILE] [--batch N]
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+
+from database.giornale import imposta_autore, autore_predefinito
+from database.migrations import (sql_conta_dispositivi, sql_giornale_inserimenti, sql_indicizza_ricerca,
+                                 sql_porte_occupate)
+from database.sqlite_profile import connetti
+from database.topology import sql_radici_topologia
+
+COLONNE = ("edificio", "piano", "locale", "porta", "tipo", "modello", "matricola",
+           "descrizione", "stato", "data_installazione", "matricola_padre")
+
+DIMENSIONE_BATCH = 50_000
+
+# Trigger AFTER INSERT per riga che durante l'importazione vengono sospesi e
+# sostituiti da un INSERT ... SELECT per blocco, molto più veloce su milioni di
+# righe. Nome -> SQL che fa lo stesso lavoro per le righe che soddisfano 'filtro'.
+TRIGGER_SOSPESI = {
+    "trg_ricerca_dispositivo_ins": lambda filtro: sql_indicizza_ricerca("dispositivo", filtro),
+    # I dispositivi vengono inseriti senza padre (collegato alla fine): nella
+    # tabella di chiusura basta la riga del dispositivo stesso
+    "trg_topologia_ins": sql_radici_topologia,
+    "trg_giornale_dispositivo_ins": lambda filtro: sql_giornale_inserimenti("dispositivo", filtro),
+    "trg_statistiche_dispositivo_ins": lambda filtro: sql_conta_dispositivi("1", "Inventario_Dispositivi d", filtro),
+    "trg_statistiche_porta_occupata_ins": sql_porte_occupate,
+}
+
+AUTORE = f"importazione ({autore_predefinito()})"  # Autore nel giornale delle modifiche
+
+
+class ErroreImportazione(Exception):
+    """Riga non importabile (es. campi obbligatori mancanti)."""
+
+
+def leggi_csv(percorso: str):
+    """Generatore di righe (dict) da un file CSV con intestazione."""
+    with open(percorso, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def leggi_jsonl(percorso: str):
+    """Generatore di righe (dict) da un file JSON Lines (un oggetto per riga)."""
+    with open(percorso, encoding="utf-8") as f:
+        for riga in f:
+            if riga.strip():
+                yield json.loads(riga)
+
+
+def leggi_file(percorso: str):
+    if percorso.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return leggi_jsonl(percorso)
+    return leggi_csv(percorso)
+
+
+def _testo(riga: dict, colonna: str):
+    """Valore ripulito: stringa senza spazi ai lati, None se vuoto o assente."""
+    valore = riga.get(colonna)
+    if valore is None:
+        return None
+    valore = str(valore).strip()
+    return valore or None
+
+
+class ImportatoreInventario:
+    """
+    Importa righe di dispositivi in un database v3 aperto con sqlite3.
+    Le lookup (nome -> id) vengono caricate una volta all'inizio.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, dimensione_batch: int = DIMENSIONE_BATCH, progresso=None):
+        self.conn = conn
+        self.dimensione_batch = dimensione_batch
+        self.progresso = progresso  # progresso(righe_lette, dispositivi_inseriti)
+        self.lette = 0
+        self.inserite = 0
+        self.scartate = 0
+        self.errori = []  # (numero riga, messaggio), solo i primi 100
+        self._carica_lookup()
+
+    def _carica_lookup(self):
+        c = self.conn
+        self.edifici = dict(c.execute("SELECT nome_edificio, edificio_id FROM Edifici"))
+        self.piani = {(e, n): i for i, n, e in c.execute("SELECT piano_id, nome_piano, edificio_id FROM Piani")}
+        self.locali = dict(c.execute("SELECT nome_locale, locale_id FROM Locali"))
+        self.porte = dict(c.execute("SELECT nome_porta, porta_id FROM Porte"))
+        self.tipi = dict(c.execute("SELECT nome_tipo, tipo_id FROM Tipi_Dispositivi"))
+
+    # --- Risoluzione nome -> id (con creazione se manca) ---
+
+    def _id_edificio(self, nome):
+        if nome not in self.edifici:
+            cur = self.conn.execute("INSERT INTO Edifici (nome_edificio) VALUES (?)", (nome,))
+            self.edifici[nome] = cur.lastrowid
+        return self.edifici[nome]
+
+    def _id_piano(self, edificio_id, nome):
+        chiave = (edificio_id, nome)
+        if chiave not in self.piani:
+            cur = self.conn.execute("INSERT INTO Piani (nome_piano, edificio_id) VALUES (?, ?)", (nome, edificio_id))
+            self.piani[chiave] = cur.lastrowid
+        return self.piani[chiave]
+
+    def _id_locale(self, nome, piano_id):
+        if nome not in self.locali:
+            cur = self.conn.execute("INSERT INTO Locali (nome_locale, piano_id) VALUES (?, ?)", (nome, piano_id))
+            self.locali[nome] = cur.lastrowid
+        return self.locali[nome]
+
+    def _id_porta(self, nome, locale_id):
+        if nome not in self.porte:
+            cur = self.conn.execute("INSERT INTO Porte (nome_porta, locale_id) VALUES (?, ?)", (nome, locale_id))
+            self.porte[nome] = cur.lastrowid
+        return self.porte[nome]
+
+    def _id_tipo(self, nome):
+        if nome not in self.tipi:
+            cur = self.conn.execute("INSERT INTO Tipi_Dispositivi (nome_tipo) VALUES (?)", (nome,))
+            self.tipi[nome] = cur.lastrowid
+        return self.tipi[nome]
+
+    def _converti(self, riga: dict):
+        """Riga del file -> (tupla per Inventario_Dispositivi, (matricola, matricola_padre) o None)."""
+        edificio, piano = _testo(riga, "edificio"), _testo(riga, "piano")
+        locale, porta = _testo(riga, "locale"), _testo(riga, "porta")
+        modello, tipo = _testo(riga, "modello"), _testo(riga, "tipo")
+        if modello is None or tipo is None:
+            raise ErroreImportazione("'modello' e 'tipo' sono obbligatori")
+        if piano is not None and edificio is None:
+            raise ErroreImportazione("'piano' richiede 'edificio'")
+
+        piano_id = self._id_piano(self._id_edificio(edificio), piano) if piano else None
+        locale_id = self._id_locale(locale, piano_id) if locale else None
+        porta_id = self._id_porta(porta, locale_id) if porta else None
+        matricola = _testo(riga, "matricola")
+        dispositivo = (
+            modello, matricola, _testo(riga, "descrizione"), _testo(riga, "data_installazione"),
+            _testo(riga, "stato") or "Operativo", self._id_tipo(tipo),
+            # Un dispositivo su una porta eredita il locale dalla porta
+            None if porta_id else locale_id, porta_id,
+        )
+        padre = _testo(riga, "matricola_padre")
+        if padre and matricola is None:
+            # Senza matricola il dispositivo non si ritrova per collegarlo al padre
+            raise ErroreImportazione("'matricola_padre' richiede 'matricola'")
+        return dispositivo, ((matricola, padre) if padre else None)
+
+    def importa(self, righe) -> dict:
+        """Importa un iterabile di righe (dict). Ogni blocco è una transazione."""
+        self.conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS Import_Genitori (
+                matricola TEXT PRIMARY KEY, matricola_padre TEXT NOT NULL
+            )""")
+        imposta_autore(self.conn, AUTORE)  # Nel giornale delle modifiche
+        dispositivi, genitori = [], []
+        for numero, riga in enumerate(righe, start=1):
+            self.lette += 1
+            try:
+                dispositivo, padre = self._converti(riga)
+            except ErroreImportazione as e:
+                self._scarta(numero, str(e))
+                continue
+            dispositivi.append(dispositivo)
+            if padre:
+                genitori.append(padre)
+            if len(dispositivi) >= self.dimensione_batch:
+                self._scrivi_blocco(dispositivi, genitori)
+                dispositivi, genitori = [], []
+        self._scrivi_blocco(dispositivi, genitori)
+        self._collega_genitori()
+        return {"lette": self.lette, "inserite": self.inserite, "scartate": self.scartate}
+
+    def _scarta(self, numero: int, messaggio: str):
+        self.scartate += 1
+        if len(self.errori) < 100:
+            self.errori.append((numero, messaggio))
+
+    def _scrivi_blocco(self, dispositivi: list, genitori: list):
+        with self.conn:  # Una transazione per blocco (anche per Edifici/Porte creati)
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")  # Il DROP TRIGGER deve stare nella transazione
+            sospesi = self._sospendi_trigger()
+            ultimo_id = self.conn.execute("SELECT MAX(dispositivo_id) FROM Inventario_Dispositivi").fetchone()[0]
+            # OR IGNORE: una matricola già presente scarta la riga, non il blocco
+            cur = self.conn.executemany("""
+                INSERT OR IGNORE INTO Inventario_Dispositivi
+                    (modello, matricola, descrizione, data_installazione, stato,
+                     tipo_id, locale_id, porta_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", dispositivi)
+            inserite = cur.rowcount
+            for nome, create in sospesi:
+                self.conn.execute(TRIGGER_SOSPESI[nome](f"dispositivo_id > {ultimo_id or 0}"))
+                self.conn.execute(create)
+            # Solo le righe inserite ora: una matricola già presente (riga scartata)
+            # non deve spostare sotto un altro padre il dispositivo esistente.
+            # A parità di matricola nel file vale la prima riga, l'unica inserita.
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO Import_Genitori
+                SELECT ?1, ?2 WHERE EXISTS (
+                    SELECT 1 FROM Inventario_Dispositivi WHERE matricola = ?1 AND dispositivo_id > ?3)""",
+                ((matricola, padre, ultimo_id or 0) for matricola, padre in genitori))
+        # Apre la transazione del blocco successivo, in cui finiscono anche
+        # edifici, piani, locali e porte creati da _converti
+        imposta_autore(self.conn, AUTORE)
+        self.inserite += inserite
+        self.scartate += len(dispositivi) - inserite
+        if self.progresso is not None:
+            self.progresso(self.lette, self.inserite)
+
+    def _sospendi_trigger(self) -> list:
+        """Elimina i trigger di TRIGGER_SOSPESI presenti e restituisce (nome, CREATE) di ciascuno."""
+        sospesi = self.conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+            f"AND name IN ({', '.join('?' * len(TRIGGER_SOSPESI))})", tuple(TRIGGER_SOSPESI)).fetchall()
+        for nome, _ in sospesi:
+            self.conn.execute(f"DROP TRIGGER {nome}")
+        return sospesi
+
+    def _collega_genitori(self):
+        """Risolve matricola_padre -> parent_dispositivo_id con un solo UPDATE indicizzato."""
+        with self.conn:
+            imposta_autore(self.conn, AUTORE)
+            self.conn.execute("""
+                UPDATE Inventario_Dispositivi AS d
+                SET parent_dispositivo_id = p.dispositivo_id
+                FROM Import_Genitori g
+                JOIN Inventario_Dispositivi p ON p.matricola = g.matricola_padre
+                WHERE d.matricola = g.matricola""")
+            self.conn.execute("DELETE FROM Import_Genitori")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa dispositivi da CSV/JSONL nel database inventario.")
+    parser.add_argument("file", nargs="+", help="file .csv o .jsonl")
+    parser.add_argument("--db", default="inventario_hardware_v3.db")
+    parser.add_argument("--batch", type=int, default=DIMENSIONE_BATCH, help="righe per transazione")
+    args = parser.parse_args()
+
+    inizio = time.perf_counter()
+
+    def progresso(lette, inserite):
+        durata = time.perf_counter() - inizio
+        print(f"\r{lette:>10} righe lette, {inserite:>10} inserite ({lette / max(durata, 1e-9):,.0f} righe/s)",
+              end="", flush=True)
+
+    conn = connetti(args.db)
+    try:
+        importatore = ImportatoreInventario(conn, args.batch, progresso)
+        for percorso in args.file:
+            importatore.importa(leggi_file(percorso))
+    except (OSError, sqlite3.Error, ValueError) as e:
+        print(f"\nErrore importazione: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    print(f"\nImportazione completata in {time.perf_counter() - inizio:.1f} s: "
+          f"{importatore.inserite} inseriti, {importatore.scartate} scartati.")
+    for numero, messaggio in importatore.errori:
+        print(f"  riga {numero}: {messaggio}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,507 @@
+# This Python file uses the following encoding: utf-8
+"""
+Accesso ai dati dell'inventario senza Qt: edifici, piani, locali, porte,
+dispositivi e interconnessioni.
+
+Inventario contiene tutte le query di lettura dei widget e restituisce solo
+dati Python. Le query le esegue una funzione 'leggi(sql, *parametri) ->
+list[tuple]', quindi lo stesso codice gira:
+
+- negli script: Inventario.apri(FILE) su una connessione sqlite3;
+- nei widget: database.async_loader.inventario(db) su QtSql, nei thread
+  dell'AsyncLoader e con la strumentazione delle query.
+
+Da riga di comando (report notturni, senza QApplication):
+
+    python -m database.inventario --db FILE conteggi
+    python -m database.inventario --db FILE statistiche [--edificio ID] [--json]
+    python -m database.inventario --db FILE figli [--tipo piano --id 3] [--json]
+    python -m database.inventario --db FILE porta 42 [--json]
+    python -m database.inventario --db FILE cerca "testo" [--json]
+    python -m database.inventario --db FILE esporta CARTELLA [--formato csv|jsonl]
+"""
+import re
+import sqlite3
+import unicodedata
+
+from database.giornale import (QUERY_ULTIMA_VOCE, QUERY_VOCI_DOPO, SQL_IMPOSTA_AUTORE, autore_predefinito,
+                               riepiloga)
+from database.percorsi import QUERY_PERCORSI, formatta_percorso
+from database.sqlite_profile import connetti
+from database.statistiche import QUERY_EDIFICI_STATI, QUERY_PIANI_STATI, QUERY_SISTEMI, QUERY_STATI, QUERY_TOTALI
+from database.topology import (COLONNE_NODO, QUERY_ANTENATI, QUERY_DISCENDENTI, QUERY_DISCENDENTI_PORTA,
+                               in_ordine_albero)
+
+# Per ogni tipo di nodo dell'albero: tipo dei figli e query che li legge
+QUERY_FIGLI = {
+    "root": ("edificio", "SELECT edificio_id, nome_edificio FROM Edifici ORDER BY nome_edificio"),
+    "edificio": ("piano", "SELECT piano_id, nome_piano FROM Piani WHERE edificio_id = ? ORDER BY nome_piano"),
+    "piano": ("locale", "SELECT locale_id, nome_locale FROM Locali WHERE piano_id = ? ORDER BY nome_locale"),
+    "locale": ("porta", "SELECT porta_id, nome_porta FROM Porte WHERE locale_id = ? ORDER BY nome_porta"),
+}
+
+# Caricamento completo: una query per livello (tipo, tipo del padre, query),
+# indipendente dal numero di nodi.
+# L'ordinamento per nome sfrutta gli indici UNIQUE sui nomi, quindi i figli
+# arrivano già ordinati e basta accodarli al padre trovato per id.
+QUERY_LIVELLI = (
+    ("edificio", "root", "SELECT edificio_id, nome_edificio, NULL FROM Edifici ORDER BY nome_edificio"),
+    ("piano", "edificio", "SELECT piano_id, nome_piano, edificio_id FROM Piani ORDER BY nome_piano"),
+    ("locale", "piano", "SELECT locale_id, nome_locale, piano_id FROM Locali ORDER BY nome_locale"),
+    ("porta", "locale", "SELECT porta_id, nome_porta, locale_id FROM Porte ORDER BY nome_porta"),
+)
+
+# Colonna che collega un nodo al padre (gli edifici stanno sotto la radice)
+COLONNA_PADRE = {"piano": "edificio_id", "locale": "piano_id", "porta": "locale_id"}
+
+# Per ogni tipo: query che restituisce gli id degli antenati (dall'edificio) e del nodo
+QUERY_PERCORSO = {
+    "porta": """
+        SELECT pi.edificio_id, l.piano_id, p.locale_id, p.porta_id
+        FROM Porte p
+        JOIN Locali l ON p.locale_id = l.locale_id
+        JOIN Piani pi ON l.piano_id = pi.piano_id
+        WHERE p.porta_id = ?""",
+    "locale": """
+        SELECT pi.edificio_id, l.piano_id, l.locale_id
+        FROM Locali l
+        JOIN Piani pi ON l.piano_id = pi.piano_id
+        WHERE l.locale_id = ?""",
+}
+TIPI_PERCORSO = ("edificio", "piano", "locale", "porta")
+
+# Filtro dell'albero per nome: porte e locali trovati con l'indice FTS (a
+# prefisso, come la ricerca globale), poi i loro antenati livello per livello.
+# Gli id passano come lista JSON, letta da json_each: le righe arrivano per
+# chiave primaria, in ordine di nome come in QUERY_LIVELLI.
+MAX_TROVATI_FILTRO = 2000  # Oltre, il testo è troppo generico per un albero leggibile
+QUERY_FILTRO_TROVATI = ("SELECT tipo, entita_id FROM Ricerca_FTS "
+                        "WHERE Ricerca_FTS MATCH ? AND tipo IN ('locale', 'porta') LIMIT ?")
+QUERY_FILTRO_LIVELLO = {
+    "edificio": "SELECT edificio_id, nome_edificio, NULL FROM Edifici "
+                "WHERE edificio_id IN (SELECT value FROM json_each(?)) ORDER BY nome_edificio",
+    "piano": "SELECT piano_id, nome_piano, edificio_id FROM Piani "
+             "WHERE piano_id IN (SELECT value FROM json_each(?)) ORDER BY nome_piano",
+    "locale": "SELECT locale_id, nome_locale, piano_id FROM Locali "
+              "WHERE locale_id IN (SELECT value FROM json_each(?)) ORDER BY nome_locale",
+    "porta": "SELECT porta_id, nome_porta, locale_id FROM Porte "
+             "WHERE porta_id IN (SELECT value FROM json_each(?)) ORDER BY nome_porta",
+}
+
+# Collocazione nell'albero di un dispositivo e di un sistema esterno
+# (il primo dispositivo collocato che vi è collegato)
+QUERY_COLLOCAZIONE = {
+    "dispositivo": "SELECT porta_id, locale_id FROM Inventario_Dispositivi WHERE dispositivo_id = ?",
+    "sistema": """
+        SELECT d.porta_id, d.locale_id
+        FROM Interconnessioni i
+        JOIN Inventario_Dispositivi d ON i.dispositivo_id = d.dispositivo_id
+        WHERE i.sistema_id = ? AND (d.porta_id IS NOT NULL OR d.locale_id IS NOT NULL)
+        LIMIT 1""",
+}
+
+# Le query del dettaglio porta restano preparate sulla connessione del worker
+QUERY_PORTA = """
+    SELECT p.nome_porta, p.locale_id, p.note, l.nome_locale
+    FROM Porte p LEFT JOIN Locali l ON l.locale_id = p.locale_id
+    WHERE p.porta_id = ?"""
+
+QUERY_CONNESSIONI_PORTA = """
+    SELECT s.nome_sistema, i.descrizione_connessione, d.modello
+    FROM Inventario_Dispositivi d
+    JOIN Interconnessioni i ON i.dispositivo_id = d.dispositivo_id
+    JOIN SistemiEsterni s ON i.sistema_id = s.sistema_id
+    WHERE d.porta_id = ?
+    ORDER BY s.nome_sistema"""
+
+QUERY_SALVA_PORTA = """
+    UPDATE Porte SET nome_porta = ?, locale_id = ?, note = ?
+    WHERE porta_id = ?"""
+
+# Locali a pagine per nome (paginazione per chiave sull'indice UNIQUE di nome_locale)
+DIMENSIONE_PAGINA_LOCALI = 500
+QUERY_PRIMA_PAGINA_LOCALI = "SELECT locale_id, nome_locale FROM Locali ORDER BY nome_locale LIMIT ?"
+QUERY_PAGINA_LOCALI = ("SELECT locale_id, nome_locale FROM Locali WHERE nome_locale > ? "
+                       "ORDER BY nome_locale LIMIT ?")
+
+MAX_RISULTATI = 50
+MAX_SUGGERIMENTI_LOCALI = 50
+
+# Token del tokenizer unicode61: sequenze di lettere e cifre ('_' separa)
+_RE_TOKEN = re.compile(r"[^\W_]+")
+_INIZIO_TOKEN = r"(?<![^\W_])"
+_SEPARATORE = r"[\W_]+"
+
+TABELLE_CONTEGGI = ("Edifici", "Piani", "Locali", "Porte", "Inventario_Dispositivi",
+                    "Interconnessioni", "SistemiEsterni")
+
+
+def query_fts(testo: str) -> str | None:
+    """
+    Converte il testo digitato in una query FTS5 a prefisso: ogni parola
+    diventa '"parola"*' (le virgolette neutralizzano la sintassi FTS).
+    """
+    parole = [parola.replace('"', '""') for parola in testo.split()]
+    if not parole:
+        return None
+    return " ".join(f'"{parola}"*' for parola in parole)
+
+
+def _normalizza(testo: str) -> str:
+    """Minuscole e senza diacritici, come il tokenizer FTS (unicode61, remove_diacritics 2)."""
+    if not testo.isascii():
+        testo = "".join(c for c in unicodedata.normalize("NFD", testo) if not unicodedata.combining(c))
+    return testo.lower()
+
+
+def _frasi(testo: str) -> list:
+    """
+    Un'espressione regolare per parola digitata: i suoi token consecutivi nel
+    nome, interi tranne l'ultimo (a prefisso), come la frase '"parola"*' FTS.
+    """
+    frasi = []
+    for parola in testo.split():
+        token = _RE_TOKEN.findall(_normalizza(parola))
+        if token:
+            frasi.append(re.compile(_INIZIO_TOKEN + _SEPARATORE.join(map(re.escape, token))))
+    return frasi
+
+
+def restringe(precedente: str, testo: str) -> bool:
+    """
+    True se tutto ciò che corrisponde a 'testo' corrisponde anche a
+    'precedente' (es. "serv" -> "server 1"): ogni parola di 'precedente' è
+    l'inizio di una parola di 'testo'.
+    """
+    parole = testo.lower().split()
+    return all(any(parola.startswith(vecchia) for parola in parole) for vecchia in precedente.lower().split())
+
+
+def _con_antenati(trovati, righe_livello) -> dict:
+    """
+    Livelli {tipo: [(id, nome, id_padre)]} con i nodi 'trovati' {(tipo, id)}
+    e i loro antenati. righe_livello(tipo, ids) restituisce le righe di quegli
+    id in ordine di nome.
+    """
+    livelli = {}
+    da_leggere = set()
+    for tipo, tipo_padre, _sql in reversed(QUERY_LIVELLI):  # Dalle porte agli edifici
+        da_leggere |= {item_id for tipo_trovato, item_id in trovati if tipo_trovato == tipo}
+        livelli[tipo] = righe_livello(tipo, da_leggere) if da_leggere else []
+        da_leggere = {id_padre for _, _, id_padre in livelli[tipo] if id_padre is not None}
+    return livelli
+
+
+def restringi_filtro(filtro: dict, testo: str) -> dict:
+    """
+    Risultato di Inventario.filtra_albero per 'testo' ricavato, senza query,
+    da quello di un testo più corto (vedi restringe): i nodi trovati sono un
+    sottoinsieme dei precedenti.
+    """
+    frasi = _frasi(testo)
+    trovati = set()
+    for tipo in ("locale", "porta"):
+        for item_id, nome, _ in filtro["livelli"][tipo]:
+            if (tipo, item_id) in filtro["trovati"]:
+                nome = _normalizza(nome)
+                if all(frase.search(nome) for frase in frasi):
+                    trovati.add((tipo, item_id))
+
+    def righe_livello(tipo, ids):
+        return [riga for riga in filtro["livelli"][tipo] if riga[0] in ids]
+    return {"livelli": _con_antenati(trovati, righe_livello), "trovati": trovati}
+
+
+class Inventario:
+    """Letture (e i salvataggi dei widget) sull'inventario, indipendenti dal driver."""
+
+    def __init__(self, leggi, scrivi=None):
+        self.leggi = leggi    # leggi(sql, *parametri) -> list[tuple]
+        self.scrivi = scrivi  # scrivi(sql, *parametri) -> righe modificate (None = sola lettura)
+
+    @classmethod
+    def apri(cls, percorso: str, sola_lettura: bool = True) -> "Inventario":
+        """Inventario su una nuova connessione sqlite3 (chiuderla con chiudi())."""
+        conn = connetti(percorso, sola_lettura=sola_lettura)
+        inventario = cls.da_connessione(conn, sola_lettura)
+        inventario.conn = conn
+        return inventario
+
+    @classmethod
+    def da_connessione(cls, conn: sqlite3.Connection, sola_lettura: bool = True) -> "Inventario":
+        def leggi(sql, *parametri):
+            return conn.execute(sql, parametri).fetchall()
+
+        def scrivi(sql, *parametri):
+            return conn.execute(sql, parametri).rowcount
+        return cls(leggi, None if sola_lettura else scrivi)
+
+    def chiudi(self):
+        conn = getattr(self, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.conn = None
+
+    # --- Albero Edifici > Piani > Locali > Porte ---
+
+    def figli(self, tipo: str, item_id=None) -> list:
+        """Righe (id, nome) dei figli di un nodo di tipo 'tipo' ('root' = edifici, senza id)."""
+        sql = QUERY_FIGLI[tipo][1]
+        if tipo == "root":
+            return self.leggi(sql)
+        if item_id is None:
+            raise ValueError(f"I figli di un nodo '{tipo}' richiedono il suo id")
+        return self.leggi(sql, item_id)
+
+    def livelli(self, tipi) -> dict:
+        """Per ogni livello in 'tipi', le righe (id, nome, id_padre) in ordine di nome."""
+        return {tipo: self.leggi(sql) for tipo, _tipo_padre, sql in QUERY_LIVELLI if tipo in tipi}
+
+    def percorso(self, tipo: str, item_id: int) -> list:
+        """
+        Percorso [(tipo, id), ...] dalla radice al nodo dell'albero che
+        rappresenta l'entità: un dispositivo si trova sulla sua porta (o nel suo
+        locale), un sistema esterno sul primo dispositivo che vi è collegato.
+        Lista vuota se l'entità non è collocata nell'albero.
+        """
+        if tipo in QUERY_COLLOCAZIONE:
+            righe = self.leggi(QUERY_COLLOCAZIONE[tipo], item_id)
+            if not righe:
+                return []
+            porta_id, locale_id = righe[0]
+            if porta_id is not None:
+                tipo, item_id = "porta", porta_id
+            elif locale_id is not None:
+                tipo, item_id = "locale", locale_id
+            else:
+                return []
+
+        if tipo not in QUERY_PERCORSO:
+            return []
+        righe = self.leggi(QUERY_PERCORSO[tipo], item_id)
+        if not righe:
+            return []
+        return list(zip(TIPI_PERCORSO, righe[0]))
+
+    def percorsi(self) -> dict:
+        """{locale_id: 'Edificio  >  Piano  >  Locale'} di tutti i locali collegati a un piano."""
+        return {locale_id: formatta_percorso(edificio, piano, locale)
+                for locale_id, edificio, piano, locale in self.leggi(QUERY_PERCORSI)}
+
+    def filtra_albero(self, query_testo: str, limite: int = MAX_TROVATI_FILTRO) -> dict | None:
+        """
+        Sottoalbero delle porte e dei locali il cui nome corrisponde alla query
+        FTS5, con i loro antenati: {"livelli": {tipo: [(id, nome, id_padre)]}
+        come livelli(), "trovati": {(tipo, id)}}. None con più di 'limite' nodi trovati.
+        """
+        trovati = self.leggi(QUERY_FILTRO_TROVATI, f"nome : ({query_testo})", limite + 1)
+        if len(trovati) > limite:
+            return None
+
+        def righe_livello(tipo, ids):
+            return self.leggi(QUERY_FILTRO_LIVELLO[tipo], f"[{','.join(map(str, ids))}]")
+        trovati = set(trovati)
+        return {"livelli": _con_antenati(trovati, righe_livello), "trovati": trovati}
+
+    # --- Porte ---
+
+    def porta(self, porta_id: int) -> dict | None:
+        """Dati della porta con i suoi dispositivi e interconnessioni (None se non esiste)."""
+        righe = self.leggi(QUERY_PORTA, porta_id)
+        if not righe:
+            return None
+        nome, locale_id, note, nome_locale = righe[0]
+        return {
+            "nome": nome,
+            "locale_id": locale_id,
+            "nome_locale": nome_locale,
+            "note": note or "",
+            # Dispositivi sulla porta e quelli collegati a valle (tabella di chiusura),
+            # righe con le colonne di COLONNE_NODO in ordine di albero
+            "dispositivi": in_ordine_albero(self.leggi(QUERY_DISCENDENTI_PORTA, porta_id)),
+            "connessioni": [f"{sistema} <- {descrizione} (su {modello})" for sistema, descrizione, modello
+                            in self.leggi(QUERY_CONNESSIONI_PORTA, porta_id)],
+        }
+
+    def salva_porta(self, porta_id: int, nome: str, locale_id, note: str, autore: str = None) -> int:
+        """
+        Aggiorna la porta e ne registra l'autore nel giornale delle modifiche.
+        La transazione la apre (e conferma) il chiamante.
+        """
+        if self.scrivi is None:
+            raise sqlite3.OperationalError("Inventario aperto in sola lettura")
+        self.scrivi(SQL_IMPOSTA_AUTORE, autore or autore_predefinito())
+        return self.scrivi(QUERY_SALVA_PORTA, nome, locale_id, note, porta_id)
+
+    # --- Dispositivi ---
+
+    def topologia(self, dispositivo_id: int) -> dict | None:
+        """
+        Antenati (dalla radice) e discendenti in ordine di albero del
+        dispositivo, come dizionari con le chiavi di COLONNE_NODO.
+        None se il dispositivo non esiste.
+        """
+        antenati = self.leggi(QUERY_ANTENATI, dispositivo_id)
+        if not antenati:
+            return None
+        discendenti = in_ordine_albero(self.leggi(QUERY_DISCENDENTI, dispositivo_id))
+        return {
+            "dispositivo": dict(zip(COLONNE_NODO, antenati[-1])),
+            "antenati": [dict(zip(COLONNE_NODO, riga)) for riga in antenati[:-1]],
+            "discendenti": [dict(zip(COLONNE_NODO, riga)) for riga in discendenti[1:]],
+        }
+
+    # --- Locali ---
+
+    def pagina_locali(self, dopo_nome: str | None = None, limite: int = DIMENSIONE_PAGINA_LOCALI) -> list:
+        """Righe (locale_id, nome_locale) successive a 'dopo_nome' in ordine di nome."""
+        if dopo_nome is None:
+            return self.leggi(QUERY_PRIMA_PAGINA_LOCALI, limite)
+        return self.leggi(QUERY_PAGINA_LOCALI, dopo_nome, limite)
+
+    def cerca_locali(self, query_testo: str, limite: int = MAX_SUGGERIMENTI_LOCALI) -> list:
+        """Righe (locale_id, nome_locale) dei locali che corrispondono alla query FTS5."""
+        righe = self.leggi("SELECT entita_id, nome FROM Ricerca_FTS "
+                           "WHERE Ricerca_FTS MATCH ? AND tipo = 'locale' LIMIT ?", query_testo, limite)
+        return sorted(righe, key=lambda riga: riga[1])
+
+    # --- Modifiche (giornale) ---
+
+    def ultima_modifica(self) -> int:
+        """giornale_id dell'ultima voce del giornale (0 se vuoto): il cursore di partenza."""
+        return self.leggi(QUERY_ULTIMA_VOCE)[0][0]
+
+    def modifiche_dopo(self, dopo: int, limite: int) -> tuple:
+        """
+        (ultimo giornale_id, entità modificate dopo 'dopo' come da giornale.riepiloga).
+        Con più di 'limite' voci, o un cursore oltre la fine del giornale, le
+        entità sono None: conviene rileggere tutto.
+        """
+        righe = self.leggi(QUERY_VOCI_DOPO, dopo, limite + 1)
+        if len(righe) > limite:
+            return self.ultima_modifica(), None
+        if not righe:
+            ultima = self.ultima_modifica()
+            if ultima < dopo:
+                return ultima, None  # Giornale più corto del cursore: il DB è stato sostituito
+        return (righe[-1][0] if righe else dopo), riepiloga(righe)
+
+    # --- Ricerca e riepiloghi ---
+
+    def cerca(self, query_testo: str, limite: int = MAX_RISULTATI) -> list:
+        """Righe (tipo, id, nome) che corrispondono alla query FTS5."""
+        # Niente ORDER BY rank: con prefissi molto comuni calcolarlo per tutte
+        # le corrispondenze costerebbe più della ricerca stessa
+        return self.leggi("SELECT tipo, entita_id, nome FROM Ricerca_FTS WHERE Ricerca_FTS MATCH ? LIMIT ?",
+                          query_testo, limite)
+
+    def conteggi(self) -> dict:
+        """Numero di righe delle tabelle principali."""
+        return {tabella: self.leggi(f"SELECT COUNT(*) FROM {tabella}")[0][0] for tabella in TABELLE_CONTEGGI}
+
+    def statistiche(self, edificio_id: int | None = None) -> dict:
+        """
+        Cifre della dashboard dalle tabelle Statistiche_*: dispositivi per stato
+        di tutto l'inventario e righe (id, nome, {stato: dispositivi}) per
+        edificio, oppure dell'edificio 'edificio_id' e dei suoi piani; porte,
+        porte senza dispositivi e righe (id, nome, interconnessioni) per sistema.
+        """
+        if edificio_id is None:
+            edificio = None
+            stati, righe = self.leggi(QUERY_STATI, "totale", 0), self.leggi(QUERY_EDIFICI_STATI)
+        else:
+            edificio = self.leggi("SELECT nome_edificio FROM Edifici WHERE edificio_id = ?", edificio_id)
+            edificio = edificio[0][0] if edificio else None
+            stati, righe = self.leggi(QUERY_STATI, "edificio", edificio_id), self.leggi(QUERY_PIANI_STATI, edificio_id)
+        per_entita = {}
+        for entita_id, nome, stato, dispositivi in righe:
+            conteggi = per_entita.setdefault((entita_id, nome), {})
+            if stato is not None:  # Senza dispositivi: la riga della LEFT JOIN
+                conteggi[stato] = dispositivi
+        totali = dict(self.leggi(QUERY_TOTALI))
+        return {
+            "edificio": edificio,
+            "stati": dict(stati),
+            "righe": [(entita_id, nome, conteggi) for (entita_id, nome), conteggi in per_entita.items()],
+            "porte": totali.get("porte", 0),
+            "porte_senza_dispositivi": totali.get("porte_senza_dispositivi", 0),
+            "sistemi": self.leggi(QUERY_SISTEMI),
+        }
+
+
+def main():
+    # Import qui: chi usa solo Inventario non paga argparse, json ed exporter
+    import argparse
+    import json
+
+    comuni = argparse.ArgumentParser(add_help=False)
+    comuni.add_argument("--db", default="inventario_hardware_v3.db")
+    comuni.add_argument("--json", action="store_true", help="risultato in JSON")
+    parser = argparse.ArgumentParser(description="Interroga l'inventario senza interfaccia grafica.",
+                                     parents=[comuni])
+    comandi = parser.add_subparsers(dest="comando", required=True)
+    # --db e --json valgono anche dopo il comando (argparse.SUPPRESS: non azzerano quelli dati prima)
+    comuni_comando = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
+    comuni_comando.add_argument("--db")
+    comuni_comando.add_argument("--json", action="store_true")
+    comandi.add_parser("conteggi", help="righe per tabella", parents=[comuni_comando])
+    statistiche = comandi.add_parser("statistiche", help="cifre della dashboard (per edificio o per piano)",
+                                     parents=[comuni_comando])
+    statistiche.add_argument("--edificio", type=int, help="i piani di un edificio")
+    figli = comandi.add_parser("figli", help="figli di un nodo dell'albero (predefinito: gli edifici)",
+                               parents=[comuni_comando])
+    figli.add_argument("--tipo", choices=sorted(QUERY_FIGLI), default="root")
+    figli.add_argument("--id", type=int)
+    porta = comandi.add_parser("porta", help="dettaglio di una porta", parents=[comuni_comando])
+    porta.add_argument("porta_id", type=int)
+    cerca = comandi.add_parser("cerca", help="ricerca globale (porte, locali, dispositivi, sistemi)",
+                               parents=[comuni_comando])
+    cerca.add_argument("testo")
+    cerca.add_argument("--limite", type=int, default=MAX_RISULTATI)
+    esporta = comandi.add_parser("esporta", help="esporta in CSV/JSONL (vedi database.exporter)",
+                                 parents=[comuni_comando])
+    esporta.add_argument("cartella")
+    esporta.add_argument("--formato", choices=("csv", "jsonl"), default="csv")
+    args = parser.parse_args()
+    if args.comando == "figli" and args.tipo != "root" and args.id is None:
+        parser.error(f"figli --tipo {args.tipo} richiede --id")
+
+    inventario = Inventario.apri(args.db)
+    try:
+        if args.comando == "conteggi":
+            risultato = inventario.conteggi()
+        elif args.comando == "statistiche":
+            risultato = inventario.statistiche(args.edificio)
+        elif args.comando == "figli":
+            risultato = inventario.figli(args.tipo, args.id)
+        elif args.comando == "porta":
+            risultato = inventario.porta(args.porta_id)
+        elif args.comando == "cerca":
+            query_testo = query_fts(args.testo)
+            risultato = inventario.cerca(query_testo, args.limite) if query_testo else []
+        else:
+            from database.exporter import esporta as esporta_inventario
+            risultato = esporta_inventario(inventario.conn, args.cartella, args.formato)
+    finally:
+        inventario.chiudi()
+
+    if args.json:
+        print(json.dumps(risultato, ensure_ascii=False, indent=2))
+    elif isinstance(risultato, dict):
+        for chiave, valore in risultato.items():
+            if isinstance(valore, list):
+                print(f"{chiave}:")
+                for elemento in valore:
+                    print("\t" + ("\t".join("" if v is None else str(v) for v in elemento)
+                                   if isinstance(elemento, tuple) else str(elemento)))
+            else:
+                print(f"{chiave}: {valore}")
+    elif risultato is None:
+        print("Non trovato.")
+    else:
+        for riga in risultato:
+            print("\t".join("" if valore is None else str(valore) for valore in riga))
+
+
+if __name__ == "__main__":
+    main()
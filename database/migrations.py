@@ -0,0 +1,571 @@
+# This Python file uses the following encoding: utf-8
+"""
+Migrazioni dello schema v3, versionate con PRAGMA user_version.
+
+Ogni migrazione porta il database dalla versione N-1 alla N in una sola
+transazione: se uno statement fallisce il database resta alla versione
+precedente. Un database creato da crea_database_v3 parte dalla versione 0.
+
+Questo modulo usa solo sqlite3 (niente Qt), così può girare anche da script:
+    python -m database.migrations [--db FILE] [--verifica]
+"""
+import argparse
+import sqlite3
+
+# Entità indicizzate per la ricerca globale:
+# (tabella, codice, tipo, chiave, colonne indicizzate, espressione nome, espressione dettagli)
+# Nelle espressioni '{r}' è la riga (NEW/OLD nei trigger, la tabella altrove).
+# Il rowid FTS è chiave * 8 + codice, così i trigger trovano la riga senza indici.
+ENTITA_RICERCA = [
+    ("Porte", 1, "porta", "porta_id", "nome_porta, note", "{r}.nome_porta", "COALESCE({r}.note, '')"),
+    ("Locali", 2, "locale", "locale_id", "nome_locale, descrizione", "{r}.nome_locale", "COALESCE({r}.descrizione, '')"),
+    ("Inventario_Dispositivi", 3, "dispositivo", "dispositivo_id", "modello, matricola, descrizione", "{r}.modello",
+     "COALESCE({r}.matricola, '') || ' ' || COALESCE({r}.descrizione, '')"),
+    ("SistemiEsterni", 4, "sistema", "sistema_id", "nome_sistema", "{r}.nome_sistema", "''"),
+]
+
+
+def _valori_ricerca(r: str, codice: int, tipo: str, chiave: str, nome: str, dettagli: str) -> str:
+    return (f"{r}.{chiave} * 8 + {codice}, {nome.format(r=r)}, "
+            f"{dettagli.format(r=r)}, '{tipo}', {r}.{chiave}")
+
+
+def sql_indicizza_ricerca(tipo: str, filtro: str = "1") -> str:
+    """INSERT che indicizza in blocco le righe dell'entità 'tipo' che soddisfano 'filtro'."""
+    for tabella, codice, tipo_entita, chiave, _, nome, dettagli in ENTITA_RICERCA:
+        if tipo_entita == tipo:
+            return (f"INSERT INTO Ricerca_FTS (rowid, nome, dettagli, tipo, entita_id) "
+                    f"SELECT {_valori_ricerca(tabella, codice, tipo, chiave, nome, dettagli)} "
+                    f"FROM {tabella} WHERE {filtro}")
+    raise ValueError(f"Entità di ricerca sconosciuta: '{tipo}'")
+
+
+def _sql_ricerca() -> str:
+    """Tabella FTS5, popolamento iniziale e trigger che la tengono allineata."""
+    sql = ["""
+        CREATE VIRTUAL TABLE Ricerca_FTS USING fts5(
+            nome, dettagli, tipo UNINDEXED, entita_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'  -- Indici dedicati ai prefissi corti digitati nella casella
+        );"""]
+    for tabella, codice, tipo, chiave, colonne, nome, dettagli in ENTITA_RICERCA:
+        def valori(r):
+            return _valori_ricerca(r, codice, tipo, chiave, nome, dettagli)
+        sql.append(f"""
+        {sql_indicizza_ricerca(tipo)};
+        CREATE TRIGGER trg_ricerca_{tipo}_ins AFTER INSERT ON {tabella} BEGIN
+            INSERT INTO Ricerca_FTS (rowid, nome, dettagli, tipo, entita_id) VALUES ({valori('NEW')});
+        END;
+        CREATE TRIGGER trg_ricerca_{tipo}_upd AFTER UPDATE OF {colonne} ON {tabella} BEGIN
+            DELETE FROM Ricerca_FTS WHERE rowid = OLD.{chiave} * 8 + {codice};
+            INSERT INTO Ricerca_FTS (rowid, nome, dettagli, tipo, entita_id) VALUES ({valori('NEW')});
+        END;
+        CREATE TRIGGER trg_ricerca_{tipo}_del AFTER DELETE ON {tabella} BEGIN
+            DELETE FROM Ricerca_FTS WHERE rowid = OLD.{chiave} * 8 + {codice};
+        END;""")
+    return "\n".join(sql)
+
+
+# Entità registrate nel giornale delle modifiche (migrazione 4):
+# (tabella, codice, tipo, chiave, colonne registrate)
+ENTITA_GIORNALE_V4 = [
+    ("Porte", 1, "porta", "porta_id", ("nome_porta", "locale_id", "note")),
+    ("Locali", 2, "locale", "locale_id", ("nome_locale", "descrizione", "piano_id")),
+    ("Inventario_Dispositivi", 3, "dispositivo", "dispositivo_id",
+     ("modello", "matricola", "descrizione", "data_installazione", "stato", "tipo_id",
+      "parent_dispositivo_id", "locale_id", "porta_id")),
+    ("Interconnessioni", 5, "interconnessione", "interconnessione_id",
+     ("dispositivo_id", "sistema_id", "descrizione_connessione", "tipo_segnale", "note")),
+]
+# ...e aggiunte con la migrazione 5, per seguire tutto l'albero
+ENTITA_GIORNALE_V5 = [
+    ("Edifici", 6, "edificio", "edificio_id", ("nome_edificio", "indirizzo", "note")),
+    ("Piani", 7, "piano", "piano_id", ("nome_piano", "edificio_id")),
+]
+ENTITA_GIORNALE = ENTITA_GIORNALE_V4 + ENTITA_GIORNALE_V5
+
+# Millisecondi dal 1970 (UTC); 'now' è costante per tutto lo statement
+SQL_ISTANTE_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+
+def _sql_campi(colonne: tuple, valori) -> str:
+    """
+    Oggetto JSON {colonna: valore} delle sole colonne con 'valori(colonna)'
+    non nullo (NULL = la colonna non va registrata). Il testo viene
+    concatenato direttamente: niente sottoquery né aggregazioni nei trigger.
+    """
+    parti = " || ".join(f"""COALESCE(',"{colonna}":' || {valori(colonna)}, '')""" for colonna in colonne)
+    return f"'{{' || substr({parti}, 2) || '}}'"
+
+
+def _json_non_nullo(espressione: str) -> str:
+    return f"CASE WHEN {espressione} IS NOT NULL THEN json_quote({espressione}) END"
+
+
+def _sql_voce_giornale(codice: int, chiave: str, operazione: str, campi: str, r: str) -> str:
+    return (f"INSERT INTO Giornale_Modifiche (istante, tipo, entita_id, operazione, autore, campi) "
+            f"SELECT {SQL_ISTANTE_MS}, {codice}, {r}.{chiave}, '{operazione}', "
+            f"(SELECT autore FROM Giornale_Autore), {campi}")
+
+
+def sql_giornale_inserimenti(tipo: str, filtro: str = "1") -> str:
+    """INSERT che registra in blocco come inserite le righe dell'entità 'tipo' che soddisfano 'filtro'."""
+    for tabella, codice, tipo_entita, chiave, colonne in ENTITA_GIORNALE:
+        if tipo_entita == tipo:
+            campi = _sql_campi(colonne, lambda colonna: _json_non_nullo(f"{tabella}.{colonna}"))
+            return (_sql_voce_giornale(codice, chiave, "I", campi, tabella)
+                    + f" FROM {tabella} WHERE {filtro}")
+    raise ValueError(f"Entità del giornale sconosciuta: '{tipo}'")
+
+
+def _sql_giornale() -> str:
+    """Tabella del giornale, autore corrente e trigger che registrano le differenze."""
+    sql = ["""
+        -- Solo aggiunte (vedi i trigger trg_giornale_solo_aggiunta_*). 'campi' è
+        -- JSON compatto: inserimento {colonna: valore} (solo i non nulli),
+        -- modifica {colonna: [prima, dopo]} (solo le colonne cambiate),
+        -- eliminazione {colonna: valore} (la riga eliminata, solo i non nulli)
+        CREATE TABLE Giornale_Modifiche (
+            giornale_id INTEGER PRIMARY KEY,  -- Ordine di scrittura, cursore della paginazione
+            istante INTEGER NOT NULL,         -- Millisecondi dal 1970 (UTC)
+            tipo INTEGER NOT NULL,            -- Codice dell'entità (ENTITA_GIORNALE)
+            entita_id INTEGER NOT NULL,
+            operazione TEXT NOT NULL,         -- 'I', 'U', 'D'
+            autore TEXT,
+            campi TEXT NOT NULL
+        );
+        -- Storia di un'entità: un solo indice oltre alla chiave, per non pesare sulle scritture
+        CREATE INDEX idx_giornale_entita ON Giornale_Modifiche (tipo, entita_id, giornale_id);
+
+        CREATE TRIGGER trg_giornale_solo_aggiunta_upd BEFORE UPDATE ON Giornale_Modifiche BEGIN
+            SELECT RAISE(ABORT, 'Giornale_Modifiche accetta solo aggiunte');
+        END;
+        CREATE TRIGGER trg_giornale_solo_aggiunta_del BEFORE DELETE ON Giornale_Modifiche BEGIN
+            SELECT RAISE(ABORT, 'Giornale_Modifiche accetta solo aggiunte');
+        END;
+
+        -- Chi scrive: ogni transazione di scrittura lo imposta prima delle modifiche
+        -- (le transazioni di scrittura SQLite non si sovrappongono)
+        CREATE TABLE Giornale_Autore (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            autore TEXT
+        );
+        INSERT INTO Giornale_Autore (id, autore) VALUES (1, NULL);"""]
+    sql.append(_sql_trigger_giornale(ENTITA_GIORNALE_V4))
+    return "\n".join(sql)
+
+
+def _sql_trigger_giornale(entita: list) -> str:
+    """Trigger che registrano inserimenti, modifiche ed eliminazioni delle entità."""
+    sql = []
+    for tabella, codice, tipo, chiave, colonne in entita:
+        inserite = _sql_campi(colonne, lambda colonna: _json_non_nullo(f"NEW.{colonna}"))
+        eliminate = _sql_campi(colonne, lambda colonna: _json_non_nullo(f"OLD.{colonna}"))
+        cambiate = _sql_campi(colonne, lambda colonna: (
+            f"CASE WHEN OLD.{colonna} IS NOT NEW.{colonna} "
+            f"THEN json_array(OLD.{colonna}, NEW.{colonna}) END"))
+        cambio = " OR ".join(f"OLD.{colonna} IS NOT NEW.{colonna}" for colonna in colonne)
+        sql.append(f"""
+        CREATE TRIGGER trg_giornale_{tipo}_ins AFTER INSERT ON {tabella} BEGIN
+            {_sql_voce_giornale(codice, chiave, 'I', inserite, 'NEW')};
+        END;
+        CREATE TRIGGER trg_giornale_{tipo}_upd AFTER UPDATE ON {tabella}
+        WHEN {cambio}
+        BEGIN
+            {_sql_voce_giornale(codice, chiave, 'U', cambiate, 'NEW')};
+        END;
+        CREATE TRIGGER trg_giornale_{tipo}_del AFTER DELETE ON {tabella} BEGIN
+            {_sql_voce_giornale(codice, chiave, 'D', eliminate, 'OLD')};
+        END;""")
+    return "\n".join(sql)
+
+
+# Statistiche della dashboard (migrazione 6). Un dispositivo sta nel locale
+# della sua porta, se ne ha una collocata, altrimenti nel suo locale_id; il
+# piano è quello del locale. I conteggi per stato esistono a tre livelli
+# (l'intero inventario con entita_id 0, gli edifici e i piani): ogni cifra
+# della dashboard è una ricerca sulla chiave.
+SQL_PIANO_DISPOSITIVO = """(SELECT l.piano_id FROM Locali l WHERE l.locale_id = COALESCE(
+    (SELECT po.locale_id FROM Porte po WHERE po.porta_id = d.porta_id), d.locale_id))"""
+LIVELLI_STATISTICHE = ("totale", "edificio", "piano")
+
+
+def sql_conta_dispositivi(segno: str, origine: str, filtro: str = "1", piano: str = SQL_PIANO_DISPOSITIVO,
+                          livelli: tuple = LIVELLI_STATISTICHE) -> str:
+    """
+    Somma 'segno' ai conteggi per stato dei dispositivi 'd' di 'origine' (la
+    clausola FROM) che soddisfano 'filtro', nei 'livelli' indicati. 'piano' è
+    l'espressione del piano di ciascun dispositivo.
+    """
+    valori = " UNION ALL ".join(f"SELECT '{livello}' AS livello" for livello in livelli)
+    return f"""INSERT INTO Statistiche_Dispositivi (livello, entita_id, stato, dispositivi)
+            SELECT v.livello,
+                   CASE v.livello WHEN 'piano' THEN p.piano_id WHEN 'edificio' THEN p.edificio_id ELSE 0 END,
+                   COALESCE(d.stato, ''), {segno} * COUNT(*)
+            FROM {origine}
+            LEFT JOIN Piani p ON p.piano_id = {piano}
+            JOIN ({valori}) v ON v.livello = 'totale' OR p.piano_id IS NOT NULL
+            WHERE {filtro}
+            GROUP BY 1, 2, 3
+            ON CONFLICT (livello, entita_id, stato) DO UPDATE SET dispositivi = dispositivi + excluded.dispositivi"""
+
+
+def sql_porte_occupate(filtro: str) -> str:
+    """
+    UPDATE che toglie dalle porte senza dispositivi quelle occupate dai
+    dispositivi che soddisfano 'filtro', se prima non ne avevano altri.
+    """
+    return f"""UPDATE Statistiche_Totali SET valore = valore - (
+                SELECT COUNT(DISTINCT d.porta_id) FROM Inventario_Dispositivi d
+                JOIN Porte po ON po.porta_id = d.porta_id
+                WHERE {filtro} AND NOT EXISTS (SELECT 1 FROM Inventario_Dispositivi x
+                                               WHERE x.porta_id = d.porta_id AND NOT ({filtro})))
+            WHERE voce = 'porte_senza_dispositivi'"""
+
+
+def _sql_porta_senza_altri(segno: str, r: str) -> str:
+    """
+    Somma 'segno' alle porte senza dispositivi se sulla porta di {r} non c'è
+    nessun altro dispositivo: {r} l'ha appena occupata (-1) o lasciata (+1).
+    """
+    return f"""UPDATE Statistiche_Totali SET valore = valore + ({segno})
+            WHERE voce = 'porte_senza_dispositivi'
+              AND EXISTS (SELECT 1 FROM Porte WHERE porta_id = {r}.porta_id)
+              AND NOT EXISTS (SELECT 1 FROM Inventario_Dispositivi
+                              WHERE porta_id = {r}.porta_id AND dispositivo_id <> {r}.dispositivo_id)"""
+
+
+def _sql_sposta_locale(segno: str, locale: str, piano: str) -> str:
+    """Conteggi dei dispositivi del locale 'locale' (per porta o per locale_id) sul piano 'piano'."""
+    livelli = ("edificio", "piano")
+    return f"""{sql_conta_dispositivi(segno, "Porte po JOIN Inventario_Dispositivi d ON d.porta_id = po.porta_id",
+                                      f"po.locale_id = {locale}", piano, livelli)};
+            {sql_conta_dispositivi(segno, "Inventario_Dispositivi d",
+                                   f"d.locale_id = {locale} AND NOT EXISTS (SELECT 1 FROM Porte po "
+                                   f"WHERE po.porta_id = d.porta_id AND po.locale_id IS NOT NULL)",
+                                   piano, livelli)}"""
+
+
+# Popolamento da zero (tabelle vuote): migrazione e database.statistiche.ricalcola
+SQL_POPOLA_STATISTICHE = (
+    sql_conta_dispositivi("1", "Inventario_Dispositivi d"),
+    """INSERT INTO Statistiche_Totali (voce, valore) VALUES
+            ('porte', (SELECT COUNT(*) FROM Porte)),
+            ('porte_senza_dispositivi', (SELECT COUNT(*) FROM Porte p WHERE NOT EXISTS (
+                SELECT 1 FROM Inventario_Dispositivi d WHERE d.porta_id = p.porta_id)))""",
+    """INSERT INTO Statistiche_Sistemi (sistema_id, interconnessioni)
+            SELECT sistema_id, COUNT(*) FROM Interconnessioni GROUP BY sistema_id""",
+)
+
+
+def _sql_statistiche() -> str:
+    """Tabelle delle statistiche, popolamento iniziale e trigger che le tengono aggiornate."""
+    riga_nuova = "(SELECT NEW.stato AS stato, NEW.porta_id AS porta_id, NEW.locale_id AS locale_id) d"
+    riga_vecchia = "(SELECT OLD.stato AS stato, OLD.porta_id AS porta_id, OLD.locale_id AS locale_id) d"
+    piano_porta = "(SELECT piano_id FROM Locali WHERE locale_id = COALESCE({r}.locale_id, d.locale_id))"
+    return f"""
+        -- livello 'totale' (entita_id 0), 'edificio' o 'piano'; stato '' se NULL.
+        -- Le righe a zero restano: chi legge salta i conteggi nulli
+        CREATE TABLE Statistiche_Dispositivi (
+            livello TEXT NOT NULL,
+            entita_id INTEGER NOT NULL,
+            stato TEXT NOT NULL,
+            dispositivi INTEGER NOT NULL,
+            PRIMARY KEY (livello, entita_id, stato)
+        ) WITHOUT ROWID;
+        -- 'porte', 'porte_senza_dispositivi'
+        CREATE TABLE Statistiche_Totali (
+            voce TEXT PRIMARY KEY,
+            valore INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE Statistiche_Sistemi (
+            sistema_id INTEGER PRIMARY KEY,
+            interconnessioni INTEGER NOT NULL
+        );
+
+        {";".join(SQL_POPOLA_STATISTICHE)};
+
+        -- Dispositivi: conteggi e porte occupate (trigger separati, così
+        -- l'importazione può sospenderli e rifarli per blocco)
+        CREATE TRIGGER trg_statistiche_dispositivo_ins AFTER INSERT ON Inventario_Dispositivi BEGIN
+            {sql_conta_dispositivi("1", riga_nuova)};
+        END;
+        CREATE TRIGGER trg_statistiche_porta_occupata_ins AFTER INSERT ON Inventario_Dispositivi
+        WHEN NEW.porta_id IS NOT NULL
+        BEGIN
+            {_sql_porta_senza_altri("-1", "NEW")};
+        END;
+        CREATE TRIGGER trg_statistiche_dispositivo_upd AFTER UPDATE OF stato, porta_id, locale_id
+        ON Inventario_Dispositivi
+        WHEN OLD.stato IS NOT NEW.stato OR OLD.porta_id IS NOT NEW.porta_id OR OLD.locale_id IS NOT NEW.locale_id
+        BEGIN
+            {sql_conta_dispositivi("-1", riga_vecchia)};
+            {sql_conta_dispositivi("1", riga_nuova)};
+        END;
+        CREATE TRIGGER trg_statistiche_porta_cambiata_upd AFTER UPDATE OF porta_id ON Inventario_Dispositivi
+        WHEN OLD.porta_id IS NOT NEW.porta_id
+        BEGIN
+            {_sql_porta_senza_altri("1", "OLD")};
+            {_sql_porta_senza_altri("-1", "NEW")};
+        END;
+        CREATE TRIGGER trg_statistiche_dispositivo_del AFTER DELETE ON Inventario_Dispositivi BEGIN
+            {sql_conta_dispositivi("-1", riga_vecchia)};
+            {_sql_porta_senza_altri("1", "OLD")};
+        END;
+
+        -- Porte: totali e dispositivi che cambiano locale con la porta
+        CREATE TRIGGER trg_statistiche_porta_ins AFTER INSERT ON Porte BEGIN
+            UPDATE Statistiche_Totali SET valore = valore + 1 WHERE voce = 'porte';
+            UPDATE Statistiche_Totali SET valore = valore + 1 WHERE voce = 'porte_senza_dispositivi'
+              AND NOT EXISTS (SELECT 1 FROM Inventario_Dispositivi WHERE porta_id = NEW.porta_id);
+        END;
+        CREATE TRIGGER trg_statistiche_porta_upd AFTER UPDATE OF locale_id ON Porte
+        WHEN OLD.locale_id IS NOT NEW.locale_id
+        BEGIN
+            {sql_conta_dispositivi("-1", "Inventario_Dispositivi d", "d.porta_id = OLD.porta_id",
+                                   piano_porta.format(r="OLD"), ("edificio", "piano"))};
+            {sql_conta_dispositivi("1", "Inventario_Dispositivi d", "d.porta_id = NEW.porta_id",
+                                   piano_porta.format(r="NEW"), ("edificio", "piano"))};
+        END;
+        CREATE TRIGGER trg_statistiche_porta_del AFTER DELETE ON Porte BEGIN
+            UPDATE Statistiche_Totali SET valore = valore - 1 WHERE voce = 'porte';
+            UPDATE Statistiche_Totali SET valore = valore - 1 WHERE voce = 'porte_senza_dispositivi'
+              AND NOT EXISTS (SELECT 1 FROM Inventario_Dispositivi WHERE porta_id = OLD.porta_id);
+        END;
+
+        -- Locali, piani ed edifici: spostamenti nell'albero ed eliminazioni
+        CREATE TRIGGER trg_statistiche_locale_upd AFTER UPDATE OF piano_id ON Locali
+        WHEN OLD.piano_id IS NOT NEW.piano_id
+        BEGIN
+            {_sql_sposta_locale("-1", "OLD.locale_id", "OLD.piano_id")};
+            {_sql_sposta_locale("1", "NEW.locale_id", "NEW.piano_id")};
+        END;
+        CREATE TRIGGER trg_statistiche_piano_upd AFTER UPDATE OF edificio_id ON Piani
+        WHEN OLD.edificio_id IS NOT NEW.edificio_id
+        BEGIN
+            INSERT INTO Statistiche_Dispositivi (livello, entita_id, stato, dispositivi)
+                SELECT 'edificio', e.edificio_id, s.stato, e.segno * s.dispositivi
+                FROM Statistiche_Dispositivi s,
+                     (SELECT OLD.edificio_id AS edificio_id, -1 AS segno
+                      UNION ALL SELECT NEW.edificio_id, 1) e
+                WHERE s.livello = 'piano' AND s.entita_id = OLD.piano_id
+                ON CONFLICT (livello, entita_id, stato) DO UPDATE SET dispositivi = dispositivi + excluded.dispositivi;
+        END;
+        -- Quando i locali passano a NULL il piano è già eliminato (e non conta
+        -- più nulla): i suoi conteggi si tolgono all'edificio qui
+        CREATE TRIGGER trg_statistiche_piano_del AFTER DELETE ON Piani BEGIN
+            INSERT INTO Statistiche_Dispositivi (livello, entita_id, stato, dispositivi)
+                SELECT 'edificio', OLD.edificio_id, stato, -dispositivi FROM Statistiche_Dispositivi
+                WHERE livello = 'piano' AND entita_id = OLD.piano_id
+                ON CONFLICT (livello, entita_id, stato) DO UPDATE SET dispositivi = dispositivi + excluded.dispositivi;
+            DELETE FROM Statistiche_Dispositivi WHERE livello = 'piano' AND entita_id = OLD.piano_id;
+        END;
+        CREATE TRIGGER trg_statistiche_edificio_del AFTER DELETE ON Edifici BEGIN
+            DELETE FROM Statistiche_Dispositivi WHERE livello = 'edificio' AND entita_id = OLD.edificio_id;
+        END;
+
+        -- Interconnessioni per sistema esterno
+        CREATE TRIGGER trg_statistiche_interconnessione_ins AFTER INSERT ON Interconnessioni BEGIN
+            INSERT INTO Statistiche_Sistemi (sistema_id, interconnessioni) VALUES (NEW.sistema_id, 1)
+                ON CONFLICT (sistema_id) DO UPDATE SET interconnessioni = interconnessioni + 1;
+        END;
+        CREATE TRIGGER trg_statistiche_interconnessione_upd AFTER UPDATE OF sistema_id ON Interconnessioni
+        WHEN OLD.sistema_id IS NOT NEW.sistema_id
+        BEGIN
+            UPDATE Statistiche_Sistemi SET interconnessioni = interconnessioni - 1 WHERE sistema_id = OLD.sistema_id;
+            INSERT INTO Statistiche_Sistemi (sistema_id, interconnessioni) VALUES (NEW.sistema_id, 1)
+                ON CONFLICT (sistema_id) DO UPDATE SET interconnessioni = interconnessioni + 1;
+        END;
+        CREATE TRIGGER trg_statistiche_interconnessione_del AFTER DELETE ON Interconnessioni BEGIN
+            UPDATE Statistiche_Sistemi SET interconnessioni = interconnessioni - 1 WHERE sistema_id = OLD.sistema_id;
+        END;
+        CREATE TRIGGER trg_statistiche_sistema_del AFTER DELETE ON SistemiEsterni BEGIN
+            DELETE FROM Statistiche_Sistemi WHERE sistema_id = OLD.sistema_id;
+        END;"""
+
+
+# (versione, descrizione, script SQL). Le versioni vanno solo aggiunte in coda.
+MIGRAZIONI = [
+    (1, "Indici sulle chiavi esterne usate dai filtri dei widget", """
+        -- Albero: figli di un nodo già ordinati per nome
+        CREATE INDEX IF NOT EXISTS idx_piani_edificio ON Piani (edificio_id, nome_piano);
+        CREATE INDEX IF NOT EXISTS idx_locali_piano ON Locali (piano_id, nome_locale);
+        CREATE INDEX IF NOT EXISTS idx_porte_locale ON Porte (locale_id, nome_porta);
+        -- Dispositivi per porta, per locale e per dispositivo padre
+        CREATE INDEX IF NOT EXISTS idx_dispositivi_porta ON Inventario_Dispositivi (porta_id);
+        CREATE INDEX IF NOT EXISTS idx_dispositivi_parent ON Inventario_Dispositivi (parent_dispositivo_id);
+        CREATE INDEX IF NOT EXISTS idx_dispositivi_locale ON Inventario_Dispositivi (locale_id);
+        CREATE INDEX IF NOT EXISTS idx_interconnessioni_dispositivo ON Interconnessioni (dispositivo_id);
+    """),
+    (2, "Indice FTS5 per la ricerca globale (porte, locali, dispositivi, sistemi)", _sql_ricerca()),
+    (3, "Tabella di chiusura della topologia dei dispositivi (parent_dispositivo_id)", """
+        -- Una riga per ogni coppia (antenato, discendente), compreso il dispositivo
+        -- stesso a profondità 0: "tutto ciò che dipende da X" è una sola ricerca sulla chiave
+        CREATE TABLE Topologia_Dispositivi (
+            antenato_id INTEGER NOT NULL,
+            discendente_id INTEGER NOT NULL,
+            profondita INTEGER NOT NULL,
+            PRIMARY KEY (antenato_id, discendente_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX idx_topologia_discendente ON Topologia_Dispositivi (discendente_id, profondita, antenato_id);
+
+        -- Popolamento iniziale. Un ciclo nei dati esistenti produce una coppia
+        -- ripetuta: la chiave primaria la rifiuta e la migrazione viene annullata
+        INSERT INTO Topologia_Dispositivi (antenato_id, discendente_id, profondita)
+            WITH RECURSIVE chiusura (antenato_id, discendente_id, profondita) AS (
+                SELECT dispositivo_id, dispositivo_id, 0 FROM Inventario_Dispositivi
+                UNION ALL
+                SELECT c.antenato_id, d.dispositivo_id, c.profondita + 1
+                FROM chiusura c
+                JOIN Inventario_Dispositivi d ON d.parent_dispositivo_id = c.discendente_id
+            )
+            SELECT antenato_id, discendente_id, profondita FROM chiusura;
+
+        CREATE TRIGGER trg_topologia_ins AFTER INSERT ON Inventario_Dispositivi BEGIN
+            INSERT INTO Topologia_Dispositivi VALUES (NEW.dispositivo_id, NEW.dispositivo_id, 0);
+            INSERT INTO Topologia_Dispositivi
+                SELECT antenato_id, NEW.dispositivo_id, profondita + 1
+                FROM Topologia_Dispositivi WHERE discendente_id = NEW.parent_dispositivo_id;
+        END;
+        CREATE TRIGGER trg_topologia_ciclo BEFORE UPDATE OF parent_dispositivo_id ON Inventario_Dispositivi
+        WHEN EXISTS (SELECT 1 FROM Topologia_Dispositivi
+                     WHERE antenato_id = NEW.dispositivo_id AND discendente_id = NEW.parent_dispositivo_id)
+        BEGIN
+            SELECT RAISE(ABORT, 'Un dispositivo non può dipendere da sé stesso o da un suo discendente');
+        END;
+        -- Spostamento: il sottoalbero si stacca dai vecchi antenati (prima dell'UPDATE,
+        -- solo se aveva un padre) e si attacca ai nuovi (dopo)
+        CREATE TRIGGER trg_topologia_stacca BEFORE UPDATE OF parent_dispositivo_id ON Inventario_Dispositivi
+        WHEN OLD.parent_dispositivo_id IS NOT NULL
+             AND NEW.parent_dispositivo_id IS NOT OLD.parent_dispositivo_id
+        BEGIN
+            DELETE FROM Topologia_Dispositivi
+            WHERE discendente_id IN (SELECT discendente_id FROM Topologia_Dispositivi
+                                     WHERE antenato_id = OLD.dispositivo_id)
+              AND antenato_id IN (SELECT antenato_id FROM Topologia_Dispositivi
+                                  WHERE discendente_id = OLD.dispositivo_id AND profondita > 0);
+        END;
+        CREATE TRIGGER trg_topologia_attacca AFTER UPDATE OF parent_dispositivo_id ON Inventario_Dispositivi
+        WHEN NEW.parent_dispositivo_id IS NOT NULL
+             AND NEW.parent_dispositivo_id IS NOT OLD.parent_dispositivo_id
+        BEGIN
+            INSERT INTO Topologia_Dispositivi
+                SELECT sopra.antenato_id, sotto.discendente_id, sopra.profondita + sotto.profondita + 1
+                FROM Topologia_Dispositivi sopra, Topologia_Dispositivi sotto
+                WHERE sopra.discendente_id = NEW.parent_dispositivo_id
+                  AND sotto.antenato_id = NEW.dispositivo_id;
+        END;
+        CREATE TRIGGER trg_topologia_del AFTER DELETE ON Inventario_Dispositivi BEGIN
+            DELETE FROM Topologia_Dispositivi WHERE discendente_id = OLD.dispositivo_id;
+            DELETE FROM Topologia_Dispositivi WHERE antenato_id = OLD.dispositivo_id;
+        END;
+    """),
+    (4, "Giornale delle modifiche (porte, locali, dispositivi, interconnessioni)", _sql_giornale()),
+    (5, "Giornale delle modifiche anche per edifici e piani", _sql_trigger_giornale(ENTITA_GIORNALE_V5)),
+    (6, "Statistiche della dashboard aggiornate dai trigger", _sql_statistiche()),
+]
+
+VERSIONE_SCHEMA = MIGRAZIONI[-1][0]
+
+# Query dei widget e indici che devono usare (controllati con EXPLAIN QUERY PLAN)
+QUERY_DA_VERIFICARE = [
+    ("SELECT piano_id, nome_piano FROM Piani WHERE edificio_id = ? ORDER BY nome_piano",
+     ("idx_piani_edificio",)),
+    ("SELECT locale_id, nome_locale FROM Locali WHERE piano_id = ? ORDER BY nome_locale",
+     ("idx_locali_piano",)),
+    ("SELECT porta_id, nome_porta FROM Porte WHERE locale_id = ? ORDER BY nome_porta",
+     ("idx_porte_locale",)),
+    ("""SELECT d.modello, t.nome_tipo, d.matricola
+        FROM Inventario_Dispositivi d
+        JOIN Tipi_Dispositivi t ON d.tipo_id = t.tipo_id
+        WHERE d.porta_id = ?""",
+     ("idx_dispositivi_porta",)),
+    ("""SELECT s.nome_sistema, i.descrizione_connessione, d.modello
+        FROM Interconnessioni i
+        JOIN Inventario_Dispositivi d ON i.dispositivo_id = d.dispositivo_id
+        JOIN SistemiEsterni s ON i.sistema_id = s.sistema_id
+        WHERE d.porta_id = ?""",
+     ("idx_dispositivi_porta", "idx_interconnessioni_dispositivo")),
+    ("SELECT dispositivo_id FROM Inventario_Dispositivi WHERE parent_dispositivo_id = ?",
+     ("idx_dispositivi_parent",)),
+    ("SELECT dispositivo_id FROM Inventario_Dispositivi WHERE locale_id = ?",
+     ("idx_dispositivi_locale",)),
+    ("SELECT antenato_id, profondita FROM Topologia_Dispositivi WHERE discendente_id = ? ORDER BY profondita DESC",
+     ("idx_topologia_discendente",)),
+    ("SELECT operazione, campi FROM Giornale_Modifiche WHERE tipo = ? AND entita_id = ? AND istante > ? "
+     "ORDER BY giornale_id DESC",
+     ("idx_giornale_entita",)),
+]
+
+
+def versione_corrente(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def applica_migrazioni(conn: sqlite3.Connection) -> list:
+    """
+    Applica in ordine le migrazioni non ancora eseguite.
+    Restituisce le versioni applicate; solleva sqlite3.Error se una fallisce
+    (la migrazione fallita viene annullata per intero).
+    """
+    applicate = []
+    for versione, descrizione, script in MIGRAZIONI:
+        if versione <= versione_corrente(conn):
+            continue
+        try:
+            # executescript esegue prima un COMMIT implicito: la transazione
+            # la apriamo noi, e anche user_version viene scritto al suo interno
+            conn.executescript(f"BEGIN IMMEDIATE;\n{script}\nPRAGMA user_version = {versione};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        print(f"Migrazione {versione} applicata: {descrizione}")
+        applicate.append(versione)
+    return applicate
+
+
+def piano_query(conn: sqlite3.Connection, sql: str) -> list:
+    """Righe 'detail' di EXPLAIN QUERY PLAN (i parametri '?' valgono NULL)."""
+    parametri = (None,) * sql.count("?")
+    return [riga[3] for riga in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametri)]
+
+
+def verifica_indici(conn: sqlite3.Connection) -> list:
+    """
+    Controlla che le query dei widget usino gli indici attesi.
+    Restituisce (sql, indici mancanti, piano) per ogni query che non li usa.
+    """
+    problemi = []
+    for sql, indici in QUERY_DA_VERIFICARE:
+        piano = piano_query(conn, sql)
+        testo = "\n".join(piano)
+        mancanti = [indice for indice in indici if f"INDEX {indice}" not in testo]
+        if mancanti:
+            problemi.append((sql, mancanti, piano))
+    return problemi
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggiorna lo schema del database inventario.")
+    parser.add_argument("--db", default="inventario_hardware_v3.db")
+    parser.add_argument("--verifica", action="store_true",
+                        help="controlla con EXPLAIN QUERY PLAN che le query usino gli indici")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        applica_migrazioni(conn)
+        print(f"Schema alla versione {versione_corrente(conn)} (ultima: {VERSIONE_SCHEMA}).")
+        if args.verifica:
+            problemi = verifica_indici(conn)
+            for sql, mancanti, piano in problemi:
+                print(f"\nIndici non usati {mancanti} in:\n{sql}\nPiano: {piano}")
+            if not problemi:
+                print("Tutte le query usano gli indici attesi.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# This Python file uses the following encoding: utf-8
+"""
+Percorsi 'Edificio  >  Piano  >  Locale' dei locali.
+
+formatta_percorso() è l'unico punto in cui si compone il testo del percorso:
+lo usano l'esportazione e la cache dei widget (widget/cache_percorsi.py), che
+legge QUERY_PERCORSI una volta sola. Nessuna dipendenza da Qt.
+"""
+SEPARATORE_PERCORSO = "  >  "
+
+# Solo i locali collegati a un piano (e quindi a un edificio) hanno un percorso
+QUERY_PERCORSI = """
+    SELECT l.locale_id, e.nome_edificio, p.nome_piano, l.nome_locale
+    FROM Locali l
+    JOIN Piani p ON l.piano_id = p.piano_id
+    JOIN Edifici e ON p.edificio_id = e.edificio_id"""
+
+
+def formatta_percorso(*nomi) -> str:
+    """Unisce i nomi non nulli con il separatore dei percorsi."""
+    return SEPARATORE_PERCORSO.join(nome for nome in nomi if nome is not None)
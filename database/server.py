@@ -0,0 +1,347 @@
+# This Python file uses the following encoding: utf-8
+"""
+Server HTTP/JSON di sola lettura sull'inventario, per le postazioni che non
+hanno bisogno dell'applicazione completa (solo libreria standard e sqlite3):
+
+    python -m database.server --db FILE [--host 127.0.0.1] [--porta 8765] [--lettori N]
+
+    GET /albero                       edifici (id, nome)
+    GET /albero/{tipo}/{id}           figli di un nodo (tipo: edificio, piano, locale)
+    GET /percorso/{tipo}/{id}         percorso dalla radice (porta, locale, dispositivo, sistema)
+    GET /porte/{id}                   dettaglio porta con dispositivi e connessioni
+    GET /dispositivi/{id}/topologia   antenati e discendenti di un dispositivo
+    GET /locali?dopo=NOME&limite=N    locali in ordine di nome, a pagine
+    GET /cerca?q=TESTO&limite=N       ricerca globale (FTS5 a prefisso)
+    GET /conteggi                     righe per tabella
+    GET /statistiche[/edificio/{id}]  cifre della dashboard (per edificio o per piano)
+    GET /stato                        contatori del server (mai in cache)
+
+Le query sono quelle di database.inventario ed eseguono su un
+ReadConnectionPool, in un pool di thread grande quanto il pool di
+connessioni; il ciclo asyncio gestisce solo le connessioni HTTP.
+
+Cache: le risposte restano in memoria finché il database non cambia. Una
+connessione sentinella legge PRAGMA data_version a ogni richiesta (pochi
+microsecondi): il valore cambia solo quando un'altra connessione conferma
+una scrittura, e in quel caso la cache si svuota e si passa a una nuova
+generazione. L'ETag di una risposta è (avvio del server, generazione,
+hash della destinazione) e If-None-Match si confronta solo dopo aver trovato
+la risorsa: una risposta in cache risponde 304 senza toccare il database
+finché nessuno scrive. Più richieste uguali in contemporanea condividono la stessa query.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from database.connection_pool import ReadConnectionPool
+from database.inventario import (MAX_RISULTATI, DIMENSIONE_PAGINA_LOCALI, QUERY_COLLOCAZIONE, QUERY_PERCORSO,
+                                 Inventario, query_fts)
+from database.sqlite_profile import PROFILI, connetti, imposta_profilo
+
+PORTA_PREDEFINITA = 8765
+MAX_VOCI_CACHE = 4096     # Risposte in cache (le meno usate escono per prime)
+MAX_LIMITE = 1000         # Tetto per il parametro 'limite'
+ATTESA_CONNESSIONE = 30   # s di attesa per una connessione del pool prima di rispondere 503
+# Tipi di /percorso/{tipo}/{id}: nodi dell'albero ed entità collocate su un nodo
+TIPI_ROTTA_PERCORSO = tuple(QUERY_PERCORSO) + tuple(QUERY_COLLOCAZIONE)
+
+MOTIVI = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+          405: "Method Not Allowed", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class RichiestaNonValida(Exception):
+    """Parametri mancanti o non validi (risposta 400)."""
+
+
+def _intero(valore: str) -> int:
+    try:
+        return int(valore)
+    except ValueError:
+        raise RichiestaNonValida(f"Atteso un numero intero: '{valore}'") from None
+
+
+def _limite(parametri: dict, predefinito: int) -> int:
+    limite = _intero(parametri.get("limite", [str(predefinito)])[0])
+    if not 0 < limite <= MAX_LIMITE:
+        raise RichiestaNonValida(f"'limite' deve essere tra 1 e {MAX_LIMITE}")
+    return limite
+
+
+# --- Rotte: (segmenti del percorso, parametri) -> (funzione, argomenti) ---
+# La funzione gira in un thread del pool: funzione(inventario, *argomenti) -> dati JSON
+
+def _rotta_albero(segmenti: list, parametri: dict):
+    if not segmenti:
+        return Inventario.figli, ("root",)
+    if len(segmenti) == 2 and segmenti[0] in ("edificio", "piano", "locale"):
+        return Inventario.figli, (segmenti[0], _intero(segmenti[1]))
+    return None
+
+
+def _percorso(inventario: Inventario, tipo: str, item_id: int) -> list | None:
+    # Lista vuota: entità inesistente (o non collocata nell'albero) -> 404
+    return inventario.percorso(tipo, item_id) or None
+
+
+def _rotta_percorso(segmenti: list, parametri: dict):
+    if len(segmenti) != 2:
+        return None
+    if segmenti[0] not in TIPI_ROTTA_PERCORSO:
+        raise RichiestaNonValida(f"Tipo non valido: '{segmenti[0]}' (attesi: {', '.join(TIPI_ROTTA_PERCORSO)})")
+    return _percorso, (segmenti[0], _intero(segmenti[1]))
+
+
+def _rotta_porte(segmenti: list, parametri: dict):
+    if len(segmenti) == 1:
+        return Inventario.porta, (_intero(segmenti[0]),)
+    return None
+
+
+def _rotta_dispositivi(segmenti: list, parametri: dict):
+    if len(segmenti) == 2 and segmenti[1] == "topologia":
+        return Inventario.topologia, (_intero(segmenti[0]),)
+    return None
+
+
+def _rotta_locali(segmenti: list, parametri: dict):
+    if segmenti:
+        return None
+    return Inventario.pagina_locali, (parametri.get("dopo", [None])[0],
+                                      _limite(parametri, DIMENSIONE_PAGINA_LOCALI))
+
+
+def _rotta_cerca(segmenti: list, parametri: dict):
+    if segmenti:
+        return None
+    query_testo = query_fts(parametri.get("q", [""])[0])
+    if query_testo is None:
+        raise RichiestaNonValida("Parametro 'q' mancante")
+    return Inventario.cerca, (query_testo, _limite(parametri, MAX_RISULTATI))
+
+
+def _rotta_conteggi(segmenti: list, parametri: dict):
+    return None if segmenti else (Inventario.conteggi, ())
+
+
+def _statistiche_edificio(inventario: Inventario, edificio_id: int) -> dict | None:
+    dati = inventario.statistiche(edificio_id)
+    return dati if dati["edificio"] is not None else None  # Edificio inesistente -> 404
+
+
+def _rotta_statistiche(segmenti: list, parametri: dict):
+    if not segmenti:
+        return Inventario.statistiche, ()
+    if len(segmenti) == 2 and segmenti[0] == "edificio":
+        return _statistiche_edificio, (_intero(segmenti[1]),)
+    return None
+
+
+ROTTE = {
+    "albero": _rotta_albero,
+    "percorso": _rotta_percorso,
+    "porte": _rotta_porte,
+    "dispositivi": _rotta_dispositivi,
+    "locali": _rotta_locali,
+    "cerca": _rotta_cerca,
+    "conteggi": _rotta_conteggi,
+    "statistiche": _rotta_statistiche,
+}
+
+
+def _corpo_json(dati) -> bytes:
+    return json.dumps(dati, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ServerInventario:
+    """Server asyncio con cache delle risposte invalidata da PRAGMA data_version."""
+
+    def __init__(self, percorso: str, lettori: int = None):
+        self.pool = ReadConnectionPool(percorso, lettori)
+        self._esecutore = ThreadPoolExecutor(max_workers=self.pool.dimensione, thread_name_prefix="lettore")
+        # Usata solo dal thread del ciclo asyncio
+        self._sentinella = connetti(percorso, sola_lettura=True)
+        self._data_version = self._leggi_data_version()
+        self._avvio = format(int(time.time() * 1000), "x")
+        self._generazione = 0
+        self._cache = OrderedDict()   # destinazione -> corpo JSON
+        self._in_corso = {}           # (generazione, destinazione) -> Future del corpo (query condivisa)
+        self.contatori = dict.fromkeys(("richieste", "dalla_cache", "non_modificate", "query", "errori"), 0)
+
+    def _leggi_data_version(self) -> int:
+        return self._sentinella.execute("PRAGMA data_version").fetchone()[0]
+
+    def _controlla_generazione(self) -> int:
+        """Passa a una nuova generazione (e svuota la cache) se qualcuno ha scritto."""
+        data_version = self._leggi_data_version()
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self._generazione += 1
+            self._cache.clear()
+        return self._generazione
+
+    def etag(self, destinazione: str, generazione: int = None) -> str:
+        generazione = self._generazione if generazione is None else generazione
+        risorsa = hashlib.blake2s(destinazione.encode("utf-8"), digest_size=8).hexdigest()
+        return f'"{self._avvio}-{generazione}-{risorsa}"'
+
+    def _esegui(self, funzione, argomenti: tuple) -> bytes:
+        """Nel thread del pool: esegue la rotta su una connessione prestata e serializza."""
+        with self.pool.connessione(timeout=ATTESA_CONNESSIONE) as conn:
+            dati = funzione(Inventario.da_connessione(conn), *argomenti)
+        if dati is None:
+            raise LookupError("Non trovato")
+        return _corpo_json(dati)
+
+    async def _corpo(self, destinazione: str, funzione, argomenti: tuple) -> bytes:
+        corpo = self._cache.get(destinazione)
+        if corpo is not None:
+            self._cache.move_to_end(destinazione)
+            self.contatori["dalla_cache"] += 1
+            return corpo
+        generazione = self._generazione
+        chiave = (generazione, destinazione)
+        futuro = self._in_corso.get(chiave)
+        if futuro is None:
+            futuro = asyncio.get_running_loop().run_in_executor(self._esecutore, self._esegui, funzione, argomenti)
+            self._in_corso[chiave] = futuro
+            self.contatori["query"] += 1
+            try:
+                corpo = await futuro
+            finally:
+                del self._in_corso[chiave]
+            # In cache solo se nessuno ha scritto durante la query (la risposta è della generazione)
+            if self._controlla_generazione() == generazione:
+                self._cache[destinazione] = corpo
+                if len(self._cache) > MAX_VOCI_CACHE:
+                    self._cache.popitem(last=False)
+            return corpo
+        return await asyncio.shield(futuro)
+
+    async def rispondi(self, metodo: str, destinazione: str, intestazioni: dict) -> tuple:
+        """(stato, corpo, etag) per una richiesta."""
+        self.contatori["richieste"] += 1
+        if metodo not in ("GET", "HEAD"):
+            return 405, _corpo_json({"errore": "Solo GET e HEAD"}), None
+        url = urlsplit(destinazione)
+        segmenti = [segmento for segmento in url.path.split("/") if segmento]
+        if segmenti == ["stato"]:
+            return 200, _corpo_json(self.stato()), None
+        rotta = ROTTE.get(segmenti[0]) if segmenti else None
+        try:
+            risolta = rotta(segmenti[1:], parse_qs(url.query)) if rotta is not None else None
+        except RichiestaNonValida as e:
+            return 400, _corpo_json({"errore": str(e)}), None
+        if risolta is None:
+            return 404, _corpo_json({"errore": f"Risorsa sconosciuta: {url.path}"}), None
+
+        etag = self.etag(destinazione, self._controlla_generazione())
+        try:
+            # Dalla cache (senza query) se la risposta è della generazione corrente
+            corpo = await self._corpo(destinazione, *risolta)
+        except LookupError:
+            return 404, _corpo_json({"errore": "Non trovato"}), None
+        except sqlite3.OperationalError as e:
+            self.contatori["errori"] += 1
+            return 503, _corpo_json({"errore": str(e)}), None
+        except sqlite3.Error as e:
+            self.contatori["errori"] += 1
+            return 500, _corpo_json({"errore": str(e)}), None
+        if intestazioni.get("if-none-match") == etag:
+            self.contatori["non_modificate"] += 1
+            return 304, b"", etag
+        return 200, corpo, etag
+
+    def stato(self) -> dict:
+        return {"generazione": self._generazione, "voci_cache": len(self._cache),
+                "lettori": self.pool.dimensione, **self.contatori}
+
+    async def _gestisci_connessione(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """HTTP/1.1 con keep-alive: una richiesta alla volta per connessione."""
+        try:
+            while True:
+                riga = await reader.readline()
+                if not riga:
+                    break
+                try:
+                    metodo, destinazione, versione = riga.decode("latin-1").split()
+                except ValueError:
+                    await self._scrivi(writer, "GET", 400, _corpo_json({"errore": "Richiesta non valida"}),
+                                       None, False)
+                    break
+                intestazioni = {}
+                while True:
+                    riga = await reader.readline()
+                    if riga in (b"\r\n", b"\n", b""):
+                        break
+                    nome, _, valore = riga.decode("latin-1").partition(":")
+                    intestazioni[nome.strip().lower()] = valore.strip()
+                if int(intestazioni.get("content-length", 0) or 0):
+                    await reader.readexactly(int(intestazioni["content-length"]))  # Ignorato
+                connessione = intestazioni.get("connection", "").lower()
+                mantieni = connessione == "keep-alive" or (versione == "HTTP/1.1" and connessione != "close")
+
+                stato, corpo, etag = await self.rispondi(metodo, destinazione, intestazioni)
+                await self._scrivi(writer, metodo, stato, corpo, etag, mantieni)
+                if not mantieni:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass  # Client disconnesso o richiesta malformata: si chiude la connessione
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _scrivi(writer: asyncio.StreamWriter, metodo: str, stato: int, corpo: bytes, etag, mantieni: bool):
+        intestazioni = [f"HTTP/1.1 {stato} {MOTIVI[stato]}",
+                        "Content-Type: application/json; charset=utf-8",
+                        f"Content-Length: {len(corpo)}",
+                        # I client devono rivalidare con If-None-Match a ogni uso
+                        "Cache-Control: no-cache",
+                        f"Connection: {'keep-alive' if mantieni else 'close'}"]
+        if etag is not None:
+            intestazioni.append(f"ETag: {etag}")
+        writer.write(("\r\n".join(intestazioni) + "\r\n\r\n").encode("latin-1"))
+        if metodo != "HEAD" and stato != 304:
+            writer.write(corpo)
+        await writer.drain()
+
+    async def servi(self, host: str, porta: int):
+        server = await asyncio.start_server(self._gestisci_connessione, host, porta, backlog=1024)
+        indirizzi = ", ".join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+        print(f"Inventario in lettura su http://{indirizzi} ({self.pool.dimensione} lettori)")
+        async with server:
+            await server.serve_forever()
+
+    def chiudi(self):
+        self._esecutore.shutdown(wait=True)
+        self._sentinella.close()
+        self.pool.chiudi()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Server HTTP/JSON di sola lettura sull'inventario.")
+    parser.add_argument("--db", default="inventario_hardware_v3.db")
+    parser.add_argument("--host", default="127.0.0.1", help="predefinito: solo connessioni locali")
+    parser.add_argument("--porta", type=int, default=PORTA_PREDEFINITA)
+    parser.add_argument("--lettori", type=int, help="connessioni di lettura (predefinito: dal profilo)")
+    parser.add_argument("--profilo-db", choices=sorted(PROFILI), default="prestazioni")
+    args = parser.parse_args()
+    imposta_profilo(args.profilo_db)
+
+    server = ServerInventario(args.db, args.lettori)
+    try:
+        asyncio.run(server.servi(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.chiudi()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# This Python file uses the following encoding: utf-8
+"""
+Profili di configurazione SQLite (journal, sincronizzazione, cache, mmap...).
+
+Lo stesso profilo viene applicato alle connessioni sqlite3 del setup e a
+quelle QtSql (principale e worker). Il profilo si sceglie, in ordine di
+priorità, con l'opzione '--profilo-db NOME' da riga di comando oppure nel
+file 'inventario.ini':
+
+    [database]
+    profilo = prestazioni
+"""
+import argparse
+import configparser
+import os
+import sqlite3
+from pathlib import Path
+
+PROFILI = {
+    # Impostazioni di fabbrica di SQLite: journal di rollback, nessun mmap
+    "compatibile": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -2000,        # KiB (valore negativo) = 2 MB
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,       # ms
+        "lettori": 2,               # Connessioni di sola lettura in parallelo
+    },
+    # WAL: i lettori non bloccano lo scrittore e viceversa
+    "prestazioni": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",    # Con WAL resta consistente anche dopo un crash
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "lettori": 4,
+    },
+    # WAL con fsync a ogni commit (nessun commit perso per mancanza di corrente)
+    "sicuro": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+        "lettori": 2,
+    },
+}
+
+PROFILO_PREDEFINITO = "prestazioni"
+FILE_CONFIG = "inventario.ini"
+
+_profilo_attivo = PROFILO_PREDEFINITO
+
+
+def imposta_profilo(nome: str):
+    global _profilo_attivo
+    if nome not in PROFILI:
+        raise ValueError(f"Profilo database sconosciuto: '{nome}' (disponibili: {', '.join(PROFILI)})")
+    _profilo_attivo = nome
+
+
+def nome_profilo() -> str:
+    return _profilo_attivo
+
+
+def profilo_attivo() -> dict:
+    return PROFILI[_profilo_attivo]
+
+
+def scegli_profilo(argv: list, file_config: str = FILE_CONFIG) -> str:
+    """Sceglie il profilo da riga di comando o da file di configurazione e lo attiva."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profilo-db", choices=sorted(PROFILI))
+    args, _ = parser.parse_known_args(argv[1:])
+
+    nome = args.profilo_db
+    if nome is None and os.path.exists(file_config):
+        config = configparser.ConfigParser()
+        config.read(file_config, encoding="utf-8")
+        nome = config.get("database", "profilo", fallback=None)
+    imposta_profilo(nome or PROFILO_PREDEFINITO)
+    return _profilo_attivo
+
+
+def pragma_profilo(profilo: dict = None, sola_lettura: bool = False) -> list:
+    """
+    Gli statement PRAGMA del profilo. Il journal_mode è una proprietà del
+    file e non si può cambiare da una connessione di sola lettura.
+    """
+    profilo = profilo or profilo_attivo()
+    pragma = []
+    if not sola_lettura:
+        pragma.append(f"PRAGMA journal_mode = {profilo['journal_mode']}")
+    pragma += [
+        f"PRAGMA synchronous = {profilo['synchronous']}",
+        f"PRAGMA mmap_size = {profilo['mmap_size']}",
+        f"PRAGMA cache_size = {profilo['cache_size']}",
+        f"PRAGMA temp_store = {profilo['temp_store']}",
+        f"PRAGMA busy_timeout = {profilo['busy_timeout']}",
+    ]
+    return pragma
+
+
+def applica_profilo(conn: sqlite3.Connection, profilo: dict = None, sola_lettura: bool = False):
+    """Applica il profilo a una connessione sqlite3."""
+    for pragma in pragma_profilo(profilo, sola_lettura):
+        conn.execute(pragma)
+
+
+def connetti(percorso: str, sola_lettura: bool = False, **kwargs) -> sqlite3.Connection:
+    """Apre una connessione sqlite3 con il profilo attivo già applicato."""
+    if sola_lettura:
+        # URI con il percorso codificato: '?', '#' e '%' nel nome del file restano tali
+        conn = sqlite3.connect(Path(percorso).resolve().as_uri() + "?mode=ro", uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(percorso, **kwargs)
+    applica_profilo(conn, sola_lettura=sola_lettura)
+    if not sola_lettura:
+        conn.execute("PRAGMA foreign_keys = ON")
+    return conn
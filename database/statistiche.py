@@ -0,0 +1,138 @@
+# This Python file uses the following encoding: utf-8
+"""
+Statistiche della dashboard: dispositivi per edificio, piano e stato, porte
+senza dispositivi, interconnessioni per sistema esterno.
+
+Le cifre stanno nelle tabelle Statistiche_* (migrazione 6), tenute
+aggiornate dai trigger a ogni scrittura: leggerle è una ricerca sulla chiave
+per cifra, qualunque sia la dimensione dell'inventario. I conteggi calcolati
+da zero con GROUP BY sui join Porte -> Locali -> Piani -> Edifici servono
+solo come riferimento per verificare le tabelle.
+
+Uso:  python -m database.statistiche --db FILE [--verifica] [--ricalcola]
+(le cifre: python -m database.inventario --db FILE statistiche)
+"""
+import argparse
+import sqlite3
+
+from database.migrations import SQL_POPOLA_STATISTICHE
+from database.sqlite_profile import connetti
+
+# Conteggi per stato di un livello: 'totale' (entita_id 0), 'edificio' o 'piano'
+QUERY_STATI = """
+    SELECT stato, dispositivi FROM Statistiche_Dispositivi
+    WHERE livello = ? AND entita_id = ? AND dispositivi <> 0
+    ORDER BY stato"""
+
+# ...e delle entità di un livello (edifici, o piani di un edificio), anche senza dispositivi
+QUERY_EDIFICI_STATI = """
+    SELECT e.edificio_id, e.nome_edificio, s.stato, s.dispositivi
+    FROM Edifici e
+    LEFT JOIN Statistiche_Dispositivi s
+        ON s.livello = 'edificio' AND s.entita_id = e.edificio_id AND s.dispositivi <> 0
+    ORDER BY e.nome_edificio"""
+
+QUERY_PIANI_STATI = """
+    SELECT p.piano_id, p.nome_piano, s.stato, s.dispositivi
+    FROM Piani p
+    LEFT JOIN Statistiche_Dispositivi s
+        ON s.livello = 'piano' AND s.entita_id = p.piano_id AND s.dispositivi <> 0
+    WHERE p.edificio_id = ?
+    ORDER BY p.nome_piano"""
+
+QUERY_TOTALI = "SELECT voce, valore FROM Statistiche_Totali"
+
+QUERY_SISTEMI = """
+    SELECT s.sistema_id, s.nome_sistema, COALESCE(st.interconnessioni, 0)
+    FROM SistemiEsterni s
+    LEFT JOIN Statistiche_Sistemi st ON st.sistema_id = s.sistema_id
+    ORDER BY s.nome_sistema"""
+
+# --- Riferimento: gli stessi numeri calcolati da zero ---
+
+_CALCOLO_DISPOSITIVI = """
+    WITH posizione (stato, piano_id, edificio_id) AS (
+        SELECT COALESCE(d.stato, ''), pi.piano_id, pi.edificio_id
+        FROM Inventario_Dispositivi d
+        LEFT JOIN Porte po ON po.porta_id = d.porta_id
+        LEFT JOIN Locali l ON l.locale_id = COALESCE(po.locale_id, d.locale_id)
+        LEFT JOIN Piani pi ON pi.piano_id = l.piano_id
+    )
+    SELECT 'totale', 0, stato, COUNT(*) FROM posizione GROUP BY stato
+    UNION ALL
+    SELECT 'edificio', edificio_id, stato, COUNT(*) FROM posizione
+    WHERE piano_id IS NOT NULL GROUP BY edificio_id, stato
+    UNION ALL
+    SELECT 'piano', piano_id, stato, COUNT(*) FROM posizione
+    WHERE piano_id IS NOT NULL GROUP BY piano_id, stato"""
+
+_CALCOLO_TOTALI = """
+    SELECT 'porte', COUNT(*) FROM Porte
+    UNION ALL
+    SELECT 'porte_senza_dispositivi', COUNT(*) FROM Porte p
+    WHERE NOT EXISTS (SELECT 1 FROM Inventario_Dispositivi d WHERE d.porta_id = p.porta_id)"""
+
+_CALCOLO_SISTEMI = "SELECT sistema_id, COUNT(*) FROM Interconnessioni GROUP BY sistema_id"
+
+# (nome, query sulle tabelle, query di riferimento); i valori nulli non contano
+_CONFRONTI = (
+    ("Statistiche_Dispositivi", "SELECT livello, entita_id, stato, dispositivi FROM Statistiche_Dispositivi",
+     _CALCOLO_DISPOSITIVI),
+    ("Statistiche_Totali", QUERY_TOTALI, _CALCOLO_TOTALI),
+    ("Statistiche_Sistemi", "SELECT sistema_id, interconnessioni FROM Statistiche_Sistemi", _CALCOLO_SISTEMI),
+)
+
+
+def _valori(conn: sqlite3.Connection, sql: str) -> dict:
+    return {riga[:-1]: riga[-1] for riga in conn.execute(sql) if riga[-1]}
+
+
+def verifica_statistiche(conn: sqlite3.Connection, limite: int = 20) -> list:
+    """
+    Confronta le tabelle delle statistiche con i conteggi ricalcolati.
+    Restituisce fino a 'limite' differenze (tabella, chiave, nella tabella, ricalcolato).
+    """
+    differenze = []
+    for tabella, sql_tabella, sql_calcolo in _CONFRONTI:
+        salvati, calcolati = _valori(conn, sql_tabella), _valori(conn, sql_calcolo)
+        for chiave in sorted(salvati.keys() | calcolati.keys(), key=str):
+            if salvati.get(chiave, 0) != calcolati.get(chiave, 0):
+                differenze.append((tabella, chiave, salvati.get(chiave, 0), calcolati.get(chiave, 0)))
+    return differenze[:limite]
+
+
+def ricalcola_statistiche(conn: sqlite3.Connection):
+    """Svuota e ripopola le tabelle delle statistiche in una sola transazione."""
+    with conn:
+        for tabella, _, _ in _CONFRONTI:
+            conn.execute(f"DELETE FROM {tabella}")
+        for sql in SQL_POPOLA_STATISTICHE:
+            conn.execute(sql)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistiche dell'inventario (tabelle Statistiche_*).")
+    parser.add_argument("--db", default="inventario_hardware_v3.db")
+    parser.add_argument("--verifica", action="store_true",
+                        help="confronta le tabelle con i conteggi calcolati da zero")
+    parser.add_argument("--ricalcola", action="store_true",
+                        help="ripopola le tabelle da zero (es. dopo modifiche fatte con i trigger disattivati)")
+    args = parser.parse_args()
+
+    conn = connetti(args.db, sola_lettura=not args.ricalcola)
+    try:
+        if args.ricalcola:
+            ricalcola_statistiche(conn)
+            print("Statistiche ricalcolate.")
+        if args.verifica:
+            differenze = verifica_statistiche(conn)
+            for differenza in differenze:
+                print("Differenza:", differenza)
+            if not differenze:
+                print("Le statistiche sono allineate con i dati.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# This Python file uses the following encoding: utf-8
+"""
+Topologia dei dispositivi (parent_dispositivo_id): concentratori, controller
+e le periferiche collegate.
+
+Le ricerche di antenati e discendenti usano la tabella di chiusura
+Topologia_Dispositivi (migrazione 3), tenuta aggiornata dai trigger: una sola
+query indicizzata anche per catene profonde. Le varianti con CTE ricorsiva
+leggono direttamente parent_dispositivo_id; servono come riferimento per
+verificare la tabella e sui database non ancora migrati.
+
+Le query restituiscono righe con le colonne di COLONNE_NODO.
+
+Uso:  python -m database.topology --db FILE [--dispositivo ID] [--verifica]
+"""
+import argparse
+import sqlite3
+
+from database.sqlite_profile import connetti
+
+COLONNE_NODO = ("dispositivo_id", "parent_dispositivo_id", "profondita", "modello",
+                "tipo", "matricola", "stato", "posizione")
+
+_SELECT_NODO = """
+    SELECT d.dispositivo_id, d.parent_dispositivo_id, {profondita}, d.modello,
+           t.nome_tipo, d.matricola, d.stato, COALESCE(po.nome_porta, l.nome_locale)"""
+_JOIN_NODO = """
+    JOIN Tipi_Dispositivi t ON t.tipo_id = d.tipo_id
+    LEFT JOIN Porte po ON po.porta_id = d.porta_id
+    LEFT JOIN Locali l ON l.locale_id = d.locale_id"""
+
+# Il dispositivo e tutto ciò che dipende da lui, i padri prima dei figli
+QUERY_DISCENDENTI = _SELECT_NODO.format(profondita="c.profondita") + """
+    FROM Topologia_Dispositivi c
+    JOIN Inventario_Dispositivi d ON d.dispositivo_id = c.discendente_id""" + _JOIN_NODO + """
+    WHERE c.antenato_id = ?
+    ORDER BY c.profondita, d.dispositivo_id"""
+
+# Catena dalla radice fino al dispositivo (compreso)
+QUERY_ANTENATI = _SELECT_NODO.format(profondita="c.profondita") + """
+    FROM Topologia_Dispositivi c
+    JOIN Inventario_Dispositivi d ON d.dispositivo_id = c.antenato_id""" + _JOIN_NODO + """
+    WHERE c.discendente_id = ?
+    ORDER BY c.profondita DESC"""
+
+CTE_DISCENDENTI = """
+    WITH RECURSIVE sotto (id, profondita) AS (
+        SELECT ?, 0
+        UNION ALL
+        SELECT f.dispositivo_id, s.profondita + 1
+        FROM sotto s JOIN Inventario_Dispositivi f ON f.parent_dispositivo_id = s.id
+    )""" + _SELECT_NODO.format(profondita="s.profondita") + """
+    FROM sotto s
+    JOIN Inventario_Dispositivi d ON d.dispositivo_id = s.id""" + _JOIN_NODO + """
+    ORDER BY s.profondita, d.dispositivo_id"""
+
+CTE_ANTENATI = """
+    WITH RECURSIVE sopra (id, profondita) AS (
+        SELECT ?, 0
+        UNION ALL
+        SELECT p.parent_dispositivo_id, s.profondita + 1
+        FROM sopra s JOIN Inventario_Dispositivi p ON p.dispositivo_id = s.id
+        WHERE p.parent_dispositivo_id IS NOT NULL
+    )""" + _SELECT_NODO.format(profondita="s.profondita") + """
+    FROM sopra s
+    JOIN Inventario_Dispositivi d ON d.dispositivo_id = s.id""" + _JOIN_NODO + """
+    ORDER BY s.profondita DESC"""
+
+# I dispositivi della porta con tutto ciò che dipende da loro. Le radici sono
+# i dispositivi della porta che non dipendono da un altro dispositivo della
+# stessa porta, così nessun sottoalbero compare due volte
+QUERY_DISCENDENTI_PORTA = _SELECT_NODO.format(profondita="c.profondita") + """
+    FROM Inventario_Dispositivi r
+    JOIN Topologia_Dispositivi c ON c.antenato_id = r.dispositivo_id
+    JOIN Inventario_Dispositivi d ON d.dispositivo_id = c.discendente_id""" + _JOIN_NODO + """
+    WHERE r.porta_id = ?
+      AND NOT EXISTS (SELECT 1 FROM Topologia_Dispositivi a
+                      JOIN Inventario_Dispositivi p ON p.dispositivo_id = a.antenato_id
+                      WHERE a.discendente_id = r.dispositivo_id AND a.profondita > 0
+                        AND p.porta_id = r.porta_id)
+    ORDER BY c.profondita, t.nome_tipo, d.modello"""
+
+# Chiusura calcolata da zero, per il confronto con la tabella
+_CTE_CHIUSURA = """
+    WITH RECURSIVE chiusura (antenato_id, discendente_id, profondita) AS (
+        SELECT dispositivo_id, dispositivo_id, 0 FROM Inventario_Dispositivi
+        UNION ALL
+        SELECT c.antenato_id, d.dispositivo_id, c.profondita + 1
+        FROM chiusura c JOIN Inventario_Dispositivi d ON d.parent_dispositivo_id = c.discendente_id
+    )"""
+
+
+def sql_radici_topologia(filtro: str) -> str:
+    """INSERT delle righe di profondità 0 per i dispositivi (senza padre) che soddisfano 'filtro'."""
+    return (f"INSERT INTO Topologia_Dispositivi (antenato_id, discendente_id, profondita) "
+            f"SELECT dispositivo_id, dispositivo_id, 0 FROM Inventario_Dispositivi WHERE {filtro}")
+
+
+def in_ordine_albero(righe: list) -> list:
+    """
+    Riordina righe con le colonne di COLONNE_NODO (i padri prima dei figli)
+    in ordine di visita dell'albero: ogni nodo è seguito dal suo sottoalbero.
+    """
+    figli = {}
+    presenti = {riga[0] for riga in righe}
+    radici = []
+    for riga in righe:
+        if riga[1] in presenti and riga[2] > 0:
+            figli.setdefault(riga[1], []).append(riga)
+        else:
+            radici.append(riga)
+    ordinate = []
+    pila = radici[::-1]
+    while pila:
+        riga = pila.pop()
+        ordinate.append(riga)
+        pila.extend(reversed(figli.get(riga[0], ())))
+    return ordinate
+
+
+def ha_chiusura(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                        "AND name = 'Topologia_Dispositivi'").fetchone() is not None
+
+
+def discendenti(conn: sqlite3.Connection, dispositivo_id: int) -> list:
+    """Il dispositivo e i suoi discendenti (vuota se non esiste)."""
+    sql = QUERY_DISCENDENTI if ha_chiusura(conn) else CTE_DISCENDENTI
+    return conn.execute(sql, (dispositivo_id,)).fetchall()
+
+
+def antenati(conn: sqlite3.Connection, dispositivo_id: int) -> list:
+    """Catena dalla radice al dispositivo compreso (vuota se non esiste)."""
+    sql = QUERY_ANTENATI if ha_chiusura(conn) else CTE_ANTENATI
+    return conn.execute(sql, (dispositivo_id,)).fetchall()
+
+
+def verifica_chiusura(conn: sqlite3.Connection, limite: int = 20) -> list:
+    """
+    Confronta Topologia_Dispositivi con la chiusura ricalcolata dalla CTE.
+    Restituisce fino a 'limite' differenze (origine, antenato, discendente, profondità).
+    """
+    return conn.execute(_CTE_CHIUSURA + """
+        SELECT 'mancante', * FROM (
+            SELECT * FROM chiusura EXCEPT SELECT * FROM Topologia_Dispositivi)
+        UNION ALL
+        SELECT 'in eccesso', * FROM (
+            SELECT * FROM Topologia_Dispositivi EXCEPT SELECT * FROM chiusura)
+        LIMIT ?""", (limite,)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interroga la topologia dei dispositivi.")
+    parser.add_argument("--db", default="inventario_hardware_v3.db")
+    parser.add_argument("--dispositivo", type=int, help="mostra antenati e discendenti del dispositivo")
+    parser.add_argument("--verifica", action="store_true",
+                        help="confronta la tabella di chiusura con la CTE ricorsiva")
+    args = parser.parse_args()
+
+    conn = connetti(args.db, sola_lettura=True)
+    try:
+        if args.dispositivo is not None:
+            for riga in antenati(conn, args.dispositivo)[:-1]:
+                print(f"  (antenato) {riga[3]} [{riga[4]}] SN {riga[5]}")
+            for riga in in_ordine_albero(discendenti(conn, args.dispositivo)):
+                print(f"{'    ' * riga[2]}{riga[3]} [{riga[4]}] SN {riga[5]} - {riga[7] or ''}")
+        if args.verifica:
+            differenze = verifica_chiusura(conn)
+            for differenza in differenze:
+                print("Differenza:", differenza)
+            if not differenze:
+                print("La tabella di chiusura è allineata con parent_dispositivo_id.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
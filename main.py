@@ -3,6 +3,8 @@
 # if __name__ == "__main__":
 #     pass
 import sys
+# Primo import: da qui partono i tempi di --profile-startup
+from profilo_avvio import ProfiloAvvio
 from PySide6.QtWidgets import QApplication
 from PySide6.QtCore import (
     qInstallMessageHandler, QtMsgType, QMessageLogContext
@@ -11,27 +13,47 @@ from PySide6.QtCore import (
 from PySide6.QtSql import QSqlDatabase
 
 # Importa le nostre funzioni/classi dagli altri file
+from database import diagnostica
+from database.async_loader import rilascia_preparate
 from database.database_setup import setup_database, connect_db
+from database.sqlite_profile import scegli_profilo
 from main_window import MainWindow
 
 def qt_message_handler(mode, context, message):
-    """ Un gestore per silenziare i warning di QtSql se non sono errori. """
-    if mode == QtMsgType.QtWarningMsg and "QSqlQuery" in message:
-        return # Silenzia i warning comuni di QSqlQuery
+    """ I warning di QtSql finiscono nella diagnostica invece che sul terminale. """
+    if mode == QtMsgType.QtWarningMsg and "QSql" in message:
+        diagnostica.avviso(f"Qt: {message}")
+        return
     # Stampa gli altri messaggi (info, debug, errori critici)
     print(f"Qt: {message}")
 
 if __name__ == "__main__":
+    profilo = ProfiloAvvio(sys.argv)
+    profilo.fase("import")
 
     # 1. Installa il gestore di messaggi per un output più pulito
     qInstallMessageHandler(qt_message_handler)
 
-    # 2. Crea e popola il file DB (se necessario)
-    # Questo usa sqlite3 standard, prima che Qt parta
+    # 2. Scegli il profilo SQLite (--profilo-db o inventario.ini)
+    try:
+        scegli_profilo(sys.argv)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    #    e le opzioni di diagnostica (soglia e log delle query lente),
+    diagnostica.configura(sys.argv)
+    profilo.fase("configurazione")
+
+    #    poi crea e popola il file DB (se necessario)
+    # Questo usa sqlite3 standard, prima che Qt parta; se il DB è già
+    # aggiornato apre una sola connessione e non fa altro
     setup_database()
+    profilo.fase("setup database")
 
     # 3. Avvia l'applicazione Qt
     app = QApplication(sys.argv)
+    profilo.fase("QApplication")
 
     # 4. Stabilisci la connessione QtSql (UNA SOLA VOLTA)
     db_connection = connect_db()
@@ -39,17 +61,31 @@ if __name__ == "__main__":
     if db_connection is None:
         print("Impossibile connettersi al database. Uscita.")
         sys.exit(1)
+    profilo.fase("connessione QtSql")
 
     # 5. Crea la finestra principale e passale la connessione
     window = MainWindow(db=db_connection)
+    profilo.fase("MainWindow")
     window.show()
+    profilo.fase("show")
+    profilo.attendi_primo_disegno(window, window.loader)
 
     # 6. Esegui l'app
     exit_code = app.exec()
 
-    # 7. Chiudi la connessione DB *solo* alla fine
+    # 7. Salva l'istantanea dell'albero per il prossimo avvio, ferma i
+    #    caricamenti in background (e le loro connessioni), poi chiudi la
+    #    connessione DB *solo* alla fine
+    window.asset_tree.salva_istantanea()
+    window.osservatore.ferma()
+    window.loader.shutdown()
+    window.modifiche.shutdown()
+    rilascia_preparate(db_connection.connectionName())
     db_connection.close()
 
+    if diagnostica.percorso_json():
+        diagnostica.salva_json(diagnostica.percorso_json())
+
     # Questa riga ora funzionerà perché QSqlDatabase è importato
     QSqlDatabase.removeDatabase("qt_sql_default_connection")
 
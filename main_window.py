@@ -4,10 +4,17 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtSql import QSqlDatabase
 from PySide6.QtCore import Qt
+from PySide6.QtGui import QKeySequence, QShortcut
 
-from widget.porta_widget import PortaDetailWidget
+from database.async_loader import AsyncLoader
+from widget.cache_percorsi import CachePercorsi
+from widget.osservatore_modifiche import OsservatoreModifiche
+from widget.sessione_modifiche import SessioneModifiche, SessioneBar
 # Importiamo la nuova classe rinominata
 from widget.location_manager import LocationManagerWidget
+# Le pagine di dettaglio, le statistiche e il pannello diagnostica sono
+# importati e creati al primo uso (vedi pagina_porta, pagina_statistiche e
+# mostra_diagnostica): l'avvio non li paga
 
 class MainWindow(QMainWindow):
     def __init__(self, db: QSqlDatabase):
@@ -19,7 +26,18 @@ class MainWindow(QMainWindow):
              QMessageBox.critical(self, "Errore", "Connessione DB non valida.")
              return
 
+        # Esegue le letture dei widget in background (una connessione per thread)
+        self.loader = AsyncLoader(self.db, parent=self)
+        # Percorsi 'Edificio > Piano > Locale' condivisi da albero, ricerca e dettaglio
+        self.percorsi = CachePercorsi(self.db, self.loader, parent=self)
+        # Modifiche in sospeso della modalità "modifica multipla" (tutte le pagine)
+        self.modifiche = SessioneModifiche(self.db, parent=self)
+        self.modifiche.applicate.connect(self.on_modifiche_applicate)
         self.setup_ui()
+        # Modifiche fatte da altre istanze sullo stesso file: l'albero e il
+        # dettaglio rileggono solo ciò che è cambiato
+        self.osservatore = OsservatoreModifiche(self.db, self.loader, parent=self)
+        self.asset_tree.segui_modifiche(self.osservatore)
         # Carica inizialmente tutte le porte
         #self.load_door_list(locale_id=-1)
 
@@ -38,7 +56,7 @@ class MainWindow(QMainWindow):
         navigation_panel.setMaximumWidth(300) # O la larghezza che preferisci
 
         # L'albero va nel pannello di navigazione
-        self.asset_tree = LocationManagerWidget(self.db)
+        self.asset_tree = LocationManagerWidget(self.db, self.loader, self.percorsi)
         nav_layout.addWidget(self.asset_tree)
 
         # --- Area Contenuti Destra (Stacked Widget) ---
@@ -46,10 +64,11 @@ class MainWindow(QMainWindow):
 
         # Aggiungi le pagine allo stack
         self.placeholder_page = QWidget() # Pagina vuota iniziale
-        self.detail_widget = PortaDetailWidget(self.db) # Il tuo widget dettaglio porta
-
         self.main_stack.addWidget(self.placeholder_page) # Indice 0
-        self.main_stack.addWidget(self.detail_widget)    # Indice 1
+        # Il dettaglio porta viene creato al primo click su una porta, le
+        # statistiche al primo click su un edificio, piano o locale
+        self.detail_widget = None
+        self.statistiche_widget = None
 
         # (Aggiungi qui futuri widget dettaglio per Locali, Edifici, etc.)
         # self.locale_detail_widget = LocaleDetailWidget(self.db)
@@ -65,6 +84,60 @@ class MainWindow(QMainWindow):
         # Inizia mostrando la pagina placeholder
         self.main_stack.setCurrentIndex(0)
 
+        # Modalità modifica multipla e modifiche in sospeso nella barra di stato
+        self.statusBar().addPermanentWidget(SessioneBar(self.modifiche))
+
+        # Pannello diagnostica delle query: nascosto, solo da scorciatoia
+        self.diagnostica_dialog = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.mostra_diagnostica)
+
+    def pagina_porta(self):
+        """Il widget dettaglio porta, creato (e aggiunto allo stack) al primo uso."""
+        if self.detail_widget is None:
+            from widget.porta_widget import PortaDetailWidget
+            self.detail_widget = PortaDetailWidget(self.db, self.loader, self.percorsi, self.modifiche)
+            self.osservatore.modificate.connect(self.detail_widget.applica_modifiche)
+            self.main_stack.addWidget(self.detail_widget)
+        return self.detail_widget
+
+    def pagina_statistiche(self):
+        """La pagina delle statistiche, creata (e aggiunta allo stack) al primo uso."""
+        if self.statistiche_widget is None:
+            from widget.statistiche_widget import StatisticheWidget
+            self.statistiche_widget = StatisticheWidget(self.db, self.loader)
+            # Le cifre cambiano con qualunque scrittura: si rileggono (poche ricerche sulla chiave)
+            self.osservatore.modificate.connect(self.statistiche_widget.applica_modifiche)
+            self.osservatore.riallinea.connect(self.statistiche_widget.applica_modifiche)
+            self.main_stack.addWidget(self.statistiche_widget)
+        return self.statistiche_widget
+
+    def on_modifiche_applicate(self, righe: int):
+        """Nomi e locali delle porte possono essere cambiati: l'albero va riallineato."""
+        self.asset_tree.refresh_location_tree()
+
+    def closeEvent(self, event):
+        """Chiede conferma prima di perdere modifiche in sospeso (o in scrittura)."""
+        if self.modifiche.in_corso():
+            QMessageBox.information(self, "Modifiche in corso",
+                                    "Attendi la fine del salvataggio delle modifiche.")
+            event.ignore()
+            return
+        if len(self.modifiche) and QMessageBox.question(
+                self, "Modifiche in sospeso",
+                f"Ci sono {len(self.modifiche)} modifiche non applicate. Uscire e scartarle?"
+        ) != QMessageBox.Yes:
+            event.ignore()
+            return
+        event.accept()
+
+    def mostra_diagnostica(self):
+        if self.diagnostica_dialog is None:
+            from widget.diagnostica_widget import DiagnosticaDialog
+            self.diagnostica_dialog = DiagnosticaDialog(self)
+        self.diagnostica_dialog.aggiorna()
+        self.diagnostica_dialog.show()
+        self.diagnostica_dialog.raise_()
+
     def load_door_list(self, locale_id=-1):
         """
         Carica le porte. Se locale_id è -1 mostra tutto,
@@ -103,9 +176,15 @@ class MainWindow(QMainWindow):
         """
         if item_type == "porta":
             # Cambia alla pagina del dettaglio porta
-            self.main_stack.setCurrentWidget(self.detail_widget)
+            self.main_stack.setCurrentWidget(self.pagina_porta())
             # Carica i dati della porta selezionata
             self.detail_widget.load_porta_data(item_id)
+        elif item_type in ("edificio", "piano", "locale"):
+            # Statistiche dell'edificio per piano; per piani e locali di tutto l'inventario
+            self.main_stack.setCurrentWidget(self.pagina_statistiche())
+            self.statistiche_widget.mostra(item_id if item_type == "edificio" else None)
+            if self.detail_widget is not None:
+                self.detail_widget.clear_form()
         # --- Esempi per il futuro ---
         # elif item_type == "locale":
         #     # Cambia alla pagina del dettaglio locale (da creare)
@@ -122,10 +201,10 @@ class MainWindow(QMainWindow):
         #     self.main_stack.setCurrentIndex(0)
         #     self.detail_widget.clear_form()
         else:
-            # Per tutti gli altri tipi (Piani, Edifici al momento) o se non valido
+            # Per tutti gli altri tipi o se non valido
             # mostra la pagina placeholder iniziale
             self.main_stack.setCurrentIndex(0)
             # Assicurati che il form dettaglio porta sia pulito
-            self.detail_widget.clear_form()
+            if self.detail_widget is not None:
+                self.detail_widget.clear_form()
 
-    # (closeEvent rimane uguale)
@@ -0,0 +1,81 @@
+# This Python file uses the following encoding: utf-8
+"""
+Profilo dei tempi di avvio:  python main.py --profile-startup
+
+main.py segna la fine di ogni fase (import, setup del DB, QApplication,
+connessione, finestra...). Il profilo termina al primo disegno della
+finestra e ai primi dati dell'albero, stampa i tempi e chiude l'applicazione.
+
+Va importato per primo da main.py: l'orologio parte dal suo import.
+"""
+import sys
+import time
+
+_INIZIO = time.perf_counter()
+
+OPZIONE = "--profile-startup"
+
+
+class ProfiloAvvio:
+    """Tempi delle fasi di avvio, ognuna misurata dalla fine della precedente."""
+
+    def __init__(self, argv: list):
+        self.attivo = OPZIONE in argv
+        self.fasi = []  # (nome, durata ms, trascorso dall'avvio ms)
+        self._ultimo = _INIZIO
+        self._finestra = None
+        self._loader = None
+        self._filtro = None
+
+    def fase(self, nome: str):
+        """Chiude la fase 'nome' (no-op se il profilo non è attivo)."""
+        if not self.attivo:
+            return
+        ora = time.perf_counter()
+        self.fasi.append((nome, (ora - self._ultimo) * 1000, (ora - _INIZIO) * 1000))
+        self._ultimo = ora
+
+    def report(self) -> str:
+        righe = [f"{'fase':<28} {'durata ms':>10} {'dall avvio':>11}"]
+        righe += [f"{nome:<28} {durata:>10.1f} {trascorso:>11.1f}" for nome, durata, trascorso in self.fasi]
+        return "\n".join(righe)
+
+    def attendi_primo_disegno(self, finestra, loader):
+        """
+        Segna 'primo disegno' al primo paint della finestra, poi 'dati iniziali'
+        quando il loader non ha più richieste; infine stampa il report ed esce.
+        """
+        if not self.attivo:
+            return
+        from PySide6.QtCore import QObject, QEvent, QTimer
+
+        profilo = self
+
+        class _FiltroPaint(QObject):
+            def eventFilter(self, oggetto, evento):
+                if evento.type() == QEvent.Paint:
+                    oggetto.removeEventFilter(self)
+                    # Il paint è in corso: la fase si chiude appena è finito
+                    QTimer.singleShot(0, profilo._on_primo_disegno)
+                return False
+
+        self._finestra = finestra
+        self._loader = loader
+        self._filtro = _FiltroPaint(finestra)
+        finestra.installEventFilter(self._filtro)
+
+    def _on_primo_disegno(self):
+        from PySide6.QtCore import QTimer
+        self.fase("primo disegno")
+        self._timer = QTimer(self._finestra)
+        self._timer.setInterval(1)
+        self._timer.timeout.connect(self._controlla_dati)
+        self._timer.start()
+
+    def _controlla_dati(self):
+        if self._loader.in_attesa():
+            return
+        self._timer.stop()
+        self.fase("dati iniziali")
+        print(self.report(), file=sys.stderr)
+        self._finestra.close()
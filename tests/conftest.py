@@ -0,0 +1,16 @@
+# This Python file uses the following encoding: utf-8
+import pytest
+
+from database.database_setup import _crea_schema
+from database.migrations import applica_migrazioni
+from database.sqlite_profile import connetti
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Database vuoto con lo schema v3 e tutte le migrazioni (trigger compresi)."""
+    conn = connetti(str(tmp_path / "inventario.db"))
+    _crea_schema(conn)
+    applica_migrazioni(conn)
+    yield conn
+    conn.close()
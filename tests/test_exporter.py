@@ -0,0 +1,57 @@
+# This Python file uses the following encoding: utf-8
+import csv
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database.database_setup import _crea_schema
+from database.exporter import esporta, righe_esportazione
+from database.percorsi import formatta_percorso
+
+
+class TestEsportazioneDispositivi(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        _crea_schema(self.conn)
+        self.conn.executescript("""
+            INSERT INTO Edifici (edificio_id, nome_edificio) VALUES (1, 'Sede');
+            INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (1, 'PT', 1), (2, 'P1', 1);
+            INSERT INTO Locali (locale_id, nome_locale, piano_id) VALUES (1, 'Ingresso', 1), (2, 'Ufficio', 2);
+            INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (1, 'Porta ingresso', 1);
+            INSERT INTO Tipi_Dispositivi (tipo_id, nome_tipo) VALUES (1, 'Lettore');
+            -- Il locale del dispositivo non è quello della sua porta
+            INSERT INTO Inventario_Dispositivi (dispositivo_id, modello, matricola, tipo_id, locale_id, porta_id)
+                VALUES (1, 'HID R10', 'M1', 1, 2, 1);
+            INSERT INTO Inventario_Dispositivi (dispositivo_id, modello, matricola, tipo_id, locale_id)
+                VALUES (2, 'Axis A1001', 'M2', 1, 2);
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _dispositivi(self) -> dict:
+        righe = righe_esportazione(self.conn, "dispositivi")
+        colonne = next(righe)
+        return {riga[0]: dict(zip(colonne, riga)) for riga in righe}
+
+    def test_dispositivo_su_porta_nel_locale_della_porta(self):
+        dispositivo = self._dispositivi()[1]
+        self.assertEqual((dispositivo["piano"], dispositivo["locale"]), ("PT", "Ingresso"))
+        self.assertEqual(dispositivo["posizione"], formatta_percorso("Sede", "PT", "Ingresso", "Porta ingresso"))
+
+    def test_dispositivo_senza_porta_nel_proprio_locale(self):
+        dispositivo = self._dispositivi()[2]
+        self.assertEqual(dispositivo["posizione"], formatta_percorso("Sede", "P1", "Ufficio"))
+
+    def test_esporta_csv(self):
+        with tempfile.TemporaryDirectory() as cartella:
+            self.assertEqual(esporta(self.conn, cartella, entita=["dispositivi"]), {"dispositivi": 2})
+            with open(os.path.join(cartella, "dispositivi.csv"), newline="", encoding="utf-8") as f:
+                righe = {riga["dispositivo_id"]: riga for riga in csv.DictReader(f)}
+        self.assertEqual(righe["1"]["locale"], "Ingresso")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# This Python file uses the following encoding: utf-8
+import random
+import sqlite3
+import time
+
+import pytest
+
+from database.giornale import ENTITA, QUERY_VOCI_DOPO, imposta_autore, riepiloga, stato_a, storia
+
+
+def _stati(conn, tipo: str) -> dict:
+    """{id: {colonna: valore}} delle colonne registrate nel giornale."""
+    _, tabella, chiave, colonne = ENTITA[tipo]
+    righe = conn.execute(f"SELECT {chiave}, {', '.join(colonne)} FROM {tabella}")
+    return {riga[0]: dict(zip(colonne, riga[1:])) for riga in righe}
+
+
+def _adesso_ms(conn) -> int:
+    # Il giornale ha la risoluzione del millisecondo: nessuna scrittura nello stesso istante
+    time.sleep(0.003)
+    istante = conn.execute("SELECT CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)").fetchone()[0]
+    time.sleep(0.003)
+    return istante
+
+
+@pytest.fixture
+def inventario(conn):
+    conn.executescript("""
+        INSERT INTO Edifici (edificio_id, nome_edificio) VALUES (1, 'Sede');
+        INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (1, 'PT', 1);
+        INSERT INTO Locali (locale_id, nome_locale, piano_id) VALUES (1, 'Ingresso', 1), (2, 'Ufficio', 1);
+        INSERT INTO Tipi_Dispositivi (tipo_id, nome_tipo) VALUES (1, 'Lettore'), (2, 'Centrale');
+    """)
+    return conn
+
+
+def test_voci_e_autore(inventario):
+    conn = inventario
+    with conn:
+        imposta_autore(conn, "mario")
+        conn.execute("INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (1, 'P1', 1)")
+    with conn:
+        imposta_autore(conn, "anna")
+        conn.execute("UPDATE Porte SET nome_porta = 'P1 nord', note = NULL WHERE porta_id = 1")
+    with conn:
+        conn.execute("DELETE FROM Porte WHERE porta_id = 1")
+    voci = storia(conn, "porta", 1)
+    assert [(voce["operazione"], voce["autore"]) for voce in voci] == [
+        ("eliminazione", "anna"), ("modifica", "anna"), ("inserimento", "mario")]
+    assert voci[1]["campi"] == {"nome_porta": ["P1", "P1 nord"]}  # Solo le colonne cambiate
+    assert voci[2]["campi"] == {"nome_porta": "P1", "locale_id": 1}  # Solo i valori non nulli
+    righe = conn.execute(QUERY_VOCI_DOPO, (0, 100)).fetchall()
+    assert riepiloga(righe)["porta"] == {1: {"nome_porta": {"P1", "P1 nord"}, "locale_id": {1}}}
+
+
+def test_solo_aggiunte(inventario):
+    conn = inventario
+    with conn:
+        conn.execute("INSERT INTO Porte (nome_porta) VALUES ('P1')")
+    for sql in ("UPDATE Giornale_Modifiche SET autore = 'x'", "DELETE FROM Giornale_Modifiche"):
+        with pytest.raises(sqlite3.IntegrityError):
+            with conn:
+                conn.execute(sql)
+
+
+def test_stato_a_ricostruisce_ogni_istante(inventario):
+    conn = inventario
+    rng = random.Random(3)
+    fotografie = [(_adesso_ms(conn), _stati(conn, "porta"), _stati(conn, "dispositivo"))]
+    for passo in range(40):
+        porte = list(_stati(conn, "porta"))
+        dispositivi = list(_stati(conn, "dispositivo"))
+        azione = rng.random()
+        try:
+            with conn:
+                if azione < 0.3 or not porte:
+                    conn.execute("INSERT INTO Porte (nome_porta, locale_id, note) VALUES (?, ?, ?)",
+                                 (f"Porta {passo}", rng.choice((1, 2, None)), rng.choice(("", "nota", None))))
+                elif azione < 0.55:
+                    conn.execute("INSERT INTO Inventario_Dispositivi (modello, matricola, tipo_id, porta_id, "
+                                 "parent_dispositivo_id, stato) VALUES (?, ?, ?, ?, ?, ?)",
+                                 (f"M{passo}", rng.choice((f"S{passo}", None)), rng.choice((1, 2)),
+                                  rng.choice(porte), rng.choice(dispositivi + [None]),
+                                  rng.choice(("Operativo", "Guasto", None))))
+                elif azione < 0.7:
+                    conn.execute("UPDATE Porte SET nome_porta = ?, note = ? WHERE porta_id = ?",
+                                 (f"Porta {passo} bis", rng.choice(("x", None)), rng.choice(porte)))
+                elif azione < 0.85 and dispositivi:
+                    conn.execute("UPDATE Inventario_Dispositivi SET stato = ?, porta_id = ?, descrizione = ? "
+                                 "WHERE dispositivo_id = ?",
+                                 (rng.choice(("Operativo", "Dismesso", None)), rng.choice(porte + [None]),
+                                  rng.choice(("d", None)), rng.choice(dispositivi)))
+                elif dispositivi and rng.random() < 0.5:
+                    conn.execute("DELETE FROM Inventario_Dispositivi WHERE dispositivo_id = ?",
+                                 (rng.choice(dispositivi),))
+                else:
+                    conn.execute("DELETE FROM Porte WHERE porta_id = ?", (rng.choice(porte),))
+        except sqlite3.IntegrityError:
+            pass  # Chiave esterna ancora usata: niente scritto, niente giornale
+        fotografie.append((_adesso_ms(conn), _stati(conn, "porta"), _stati(conn, "dispositivo")))
+
+    porte = {porta_id for _, stati, _ in fotografie for porta_id in stati}
+    dispositivi = {dispositivo_id for _, _, stati in fotografie for dispositivo_id in stati}
+    for istante, stati_porte, stati_dispositivi in fotografie:
+        for porta_id in porte:
+            assert stato_a(conn, "porta", porta_id, istante) == stati_porte.get(porta_id)
+        for dispositivo_id in dispositivi:
+            assert stato_a(conn, "dispositivo", dispositivo_id, istante) == stati_dispositivi.get(dispositivo_id)
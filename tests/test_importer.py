@@ -0,0 +1,49 @@
+# This Python file uses the following encoding: utf-8
+from database.importer import TRIGGER_SOSPESI, ImportatoreInventario
+from database.statistiche import verifica_statistiche
+from database.topology import verifica_chiusura
+
+
+def _riga(matricola, padre=None, porta="P1", locale="L1", stato="Operativo"):
+    return {"edificio": "Sede", "piano": "PT", "locale": locale, "porta": porta, "tipo": "Lettore",
+            "modello": "HID R10", "matricola": matricola, "stato": stato, "matricola_padre": padre}
+
+
+def _padri(conn) -> dict:
+    return dict(conn.execute("""
+        SELECT d.matricola, p.matricola FROM Inventario_Dispositivi d
+        LEFT JOIN Inventario_Dispositivi p ON p.dispositivo_id = d.parent_dispositivo_id"""))
+
+
+def test_importa_a_blocchi_con_trigger_sospesi(conn):
+    righe = [_riga(f"M{i}", f"M{i // 3}" if i >= 3 else None, porta=f"P{i % 4}", locale=f"L{i % 2}",
+                   stato="Guasto" if i % 5 == 0 else None) for i in range(25)]
+    importatore = ImportatoreInventario(conn, dimensione_batch=7)
+    assert importatore.importa(righe) == {"lette": 25, "inserite": 25, "scartate": 0}
+    assert _padri(conn)["M10"] == "M3"
+
+    # I trigger sospesi durante l'importazione sono tutti tornati al loro posto...
+    trigger = {nome for (nome,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert set(TRIGGER_SOSPESI) <= trigger
+    # ...e le tabelle che mantengono sono allineate
+    assert verifica_chiusura(conn) == []
+    assert verifica_statistiche(conn) == []
+    assert conn.execute("SELECT COUNT(*) FROM Giornale_Modifiche WHERE tipo = 3 AND operazione = 'I'").fetchone()[0] == 25
+    assert conn.execute("SELECT COUNT(*) FROM Ricerca_FTS WHERE Ricerca_FTS MATCH 'M1*'").fetchone()[0] > 0
+
+
+def test_matricola_esistente_non_cambia_padre(conn):
+    ImportatoreInventario(conn).importa([_riga("A"), _riga("B", "A"), _riga("C")])
+    risultato = ImportatoreInventario(conn).importa([_riga("B", "C"), _riga("D", "C")])
+    assert risultato == {"lette": 2, "inserite": 1, "scartate": 1}
+    padri = _padri(conn)
+    assert padri["B"] == "A"
+    assert padri["D"] == "C"
+    assert verifica_chiusura(conn) == []
+
+
+def test_padre_senza_matricola_scartato(conn):
+    importatore = ImportatoreInventario(conn)
+    risultato = importatore.importa([_riga("A"), _riga(None, "A")])
+    assert risultato == {"lette": 2, "inserite": 1, "scartate": 1}
+    assert importatore.errori == [(2, "'matricola_padre' richiede 'matricola'")]
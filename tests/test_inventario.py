@@ -0,0 +1,16 @@
+# This Python file uses the following encoding: utf-8
+import pytest
+
+from database.inventario import Inventario
+
+
+def test_figli(conn):
+    conn.executescript("""
+        INSERT INTO Edifici (edificio_id, nome_edificio) VALUES (1, 'Sede');
+        INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (1, 'PT', 1), (2, 'P1', 1);
+    """)
+    inventario = Inventario.da_connessione(conn)
+    assert inventario.figli("root") == [(1, "Sede")]
+    assert inventario.figli("edificio", 1) == [(2, "P1"), (1, "PT")]
+    with pytest.raises(ValueError):
+        inventario.figli("piano")
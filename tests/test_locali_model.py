@@ -0,0 +1,37 @@
+# This Python file uses the following encoding: utf-8
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+from PySide6.QtSql import QSqlDatabase  # noqa: E402
+
+from widget.locali_model import LocaliModel  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def modello(app):
+    modello = LocaliModel(QSqlDatabase())
+    modello._finito = True  # Niente paginazione: le righe arrivano solo dai test
+    return modello
+
+
+def _nomi(modello) -> list:
+    return [modello.data(modello.index(riga, 0)) for riga in range(1, modello.rowCount())]
+
+
+def test_inserimento_ordinato_a_blocchi(modello):
+    modello._inserisci([(1, "Aula"), (2, "Lab"), (3, "Sala")])
+    modello._inserisci([(4, "Atrio"), (5, "Bagno"), (6, "Zona")])
+    assert _nomi(modello) == ["Atrio", "Aula", "Bagno", "Lab", "Sala", "Zona"]
+    assert [modello.riga(locale_id) for locale_id in (4, 1, 5, 2, 3, 6)] == [1, 2, 3, 4, 5, 6]
+
+
+def test_nome_gia_presente(modello):
+    assert modello.assicura(5, "Aula") == 1
+    modello._inserisci([(9, "Aula"), (10, "Aula"), (11, "Bagno")])
+    assert _nomi(modello) == ["Aula", "Aula", "Aula", "Bagno"]
+    assert sorted(modello.riga(locale_id) for locale_id in (5, 9, 10, 11)) == [1, 2, 3, 4]
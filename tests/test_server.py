@@ -0,0 +1,51 @@
+# This Python file uses the following encoding: utf-8
+import asyncio
+
+import pytest
+
+from database.server import ServerInventario
+
+
+@pytest.fixture
+def server(conn, tmp_path):
+    conn.executescript("""
+        INSERT INTO Edifici (edificio_id, nome_edificio) VALUES (1, 'Sede');
+        INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (1, 'PT', 1);
+        INSERT INTO Locali (locale_id, nome_locale, piano_id) VALUES (1, 'Ingresso', 1);
+        INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (1, 'Porta ingresso', 1);
+    """)
+    server = ServerInventario(str(tmp_path / "inventario.db"), lettori=1)
+    yield server
+    server.chiudi()
+
+
+def _get(server, destinazione: str, etag: str = None) -> tuple:
+    intestazioni = {"if-none-match": etag} if etag else {}
+    return asyncio.run(server.rispondi("GET", destinazione, intestazioni))
+
+
+def test_etag_vale_solo_per_la_sua_risorsa(server):
+    stato, _, etag = _get(server, "/albero")
+    assert stato == 200
+    assert _get(server, "/albero", etag)[0] == 304
+    assert _get(server, "/porte/1", etag)[0] == 200
+    assert _get(server, "/porte/999", etag)[0] == 404
+
+
+def test_etag_cambia_dopo_una_scrittura(server, conn):
+    _, _, etag = _get(server, "/albero")
+    with conn:
+        conn.execute("INSERT INTO Edifici (nome_edificio) VALUES ('Magazzino')")
+    stato, corpo, nuovo = _get(server, "/albero", etag)
+    assert stato == 200 and b"Magazzino" in corpo and nuovo != etag
+
+
+def test_statistiche_di_un_edificio(server):
+    assert _get(server, "/statistiche/edificio/1")[0] == 200
+    assert _get(server, "/statistiche/edificio/99")[0] == 404
+
+
+def test_percorso(server):
+    assert _get(server, "/percorso/porta/1")[0] == 200
+    assert _get(server, "/percorso/porta/99")[0] == 404
+    assert _get(server, "/percorso/foo/1")[0] == 400
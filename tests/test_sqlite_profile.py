@@ -0,0 +1,25 @@
+# This Python file uses the following encoding: utf-8
+import sqlite3
+
+import pytest
+
+from database.sqlite_profile import connetti
+
+
+@pytest.mark.parametrize("nome", ["inventario.db", "a?b.db", "c#d.db", "e%20f.db", "con spazi.db"])
+def test_sola_lettura_con_caratteri_speciali(tmp_path, nome):
+    percorso = str(tmp_path / nome)
+    conn = connetti(percorso)
+    with conn:
+        conn.execute("CREATE TABLE t (x)")
+        conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+
+    conn = connetti(percorso, sola_lettura=True)
+    try:
+        assert conn.execute("SELECT x FROM t").fetchall() == [(1,)]
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (2)")
+    finally:
+        conn.close()
+    assert sorted(p.name for p in tmp_path.iterdir() if p.suffix == ".db") == [nome]
@@ -0,0 +1,126 @@
+# This Python file uses the following encoding: utf-8
+import random
+import sqlite3
+
+import pytest
+
+from database.inventario import Inventario
+from database.statistiche import ricalcola_statistiche, verifica_statistiche
+
+STATI = ("Operativo", "Guasto", "Dismesso", None)
+
+
+@pytest.fixture
+def inventario(conn):
+    conn.executescript("""
+        INSERT INTO Edifici (edificio_id, nome_edificio) VALUES (1, 'Sede'), (2, 'Magazzino');
+        INSERT INTO Piani (piano_id, nome_piano, edificio_id) VALUES (1, 'PT', 1), (2, 'P1', 1), (3, 'PT', 2);
+        INSERT INTO Locali (locale_id, nome_locale, piano_id) VALUES (1, 'Ingresso', 1), (2, 'Ufficio', 2),
+                                                                     (3, 'Deposito', 3), (4, 'Isolato', NULL);
+        INSERT INTO Porte (porta_id, nome_porta, locale_id) VALUES (1, 'P1', 1), (2, 'P2', 2), (3, 'P3', 3);
+        INSERT INTO Tipi_Dispositivi (tipo_id, nome_tipo) VALUES (1, 'Lettore');
+        INSERT INTO SistemiEsterni (sistema_id, nome_sistema) VALUES (1, 'Antincendio'), (2, 'Videosorveglianza');
+        -- Sulla porta 1 ma con il locale 2: conta nel locale della porta
+        INSERT INTO Inventario_Dispositivi (dispositivo_id, modello, tipo_id, porta_id, locale_id, stato)
+        VALUES (1, 'A', 1, 1, 2, 'Operativo'), (2, 'B', 1, NULL, 2, 'Guasto'), (3, 'C', 1, NULL, 4, 'Operativo');
+        INSERT INTO Interconnessioni (dispositivo_id, sistema_id, descrizione_connessione) VALUES (1, 1, 'c');
+    """)
+    return conn
+
+
+def _ids(conn, tabella: str, chiave: str) -> list:
+    return [riga[0] for riga in conn.execute(f"SELECT {chiave} FROM {tabella}")]
+
+
+def test_cifre(inventario):
+    statistiche = Inventario.da_connessione(inventario).statistiche()
+    assert statistiche["stati"] == {"Guasto": 1, "Operativo": 2}
+    assert [(nome, conteggi) for _, nome, conteggi in statistiche["righe"]] == [
+        ("Magazzino", {}), ("Sede", {"Guasto": 1, "Operativo": 1})]
+    assert (statistiche["porte"], statistiche["porte_senza_dispositivi"]) == (3, 2)
+    assert statistiche["sistemi"] == [(1, "Antincendio", 1), (2, "Videosorveglianza", 0)]
+    per_piano = Inventario.da_connessione(inventario).statistiche(1)
+    assert [(nome, conteggi) for _, nome, conteggi in per_piano["righe"]] == [
+        ("P1", {"Guasto": 1}), ("PT", {"Operativo": 1})]
+
+
+def _modifica_casuale(conn, rng: random.Random, passo: int):
+    porte, locali = _ids(conn, "Porte", "porta_id"), _ids(conn, "Locali", "locale_id")
+    piani, edifici = _ids(conn, "Piani", "piano_id"), _ids(conn, "Edifici", "edificio_id")
+    dispositivi = _ids(conn, "Inventario_Dispositivi", "dispositivo_id")
+    azione = rng.randrange(12)
+    if azione == 0 or not dispositivi:
+        conn.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, porta_id, locale_id, stato) "
+                     "VALUES ('X', 1, ?, ?, ?)", (rng.choice(porte + [None]), rng.choice(locali + [None]),
+                                                  rng.choice(STATI)))
+    elif azione == 1:
+        conn.execute("UPDATE Inventario_Dispositivi SET stato = ? WHERE dispositivo_id = ?",
+                     (rng.choice(STATI), rng.choice(dispositivi)))
+    elif azione == 2:
+        conn.execute("UPDATE Inventario_Dispositivi SET porta_id = ?, locale_id = ? WHERE dispositivo_id = ?",
+                     (rng.choice(porte + [None]), rng.choice(locali + [None]), rng.choice(dispositivi)))
+    elif azione == 3:
+        dispositivo_id = rng.choice(dispositivi)
+        conn.execute("DELETE FROM Interconnessioni WHERE dispositivo_id = ?", (dispositivo_id,))
+        conn.execute("DELETE FROM Inventario_Dispositivi WHERE dispositivo_id = ?", (dispositivo_id,))
+    elif azione == 4:
+        conn.execute("INSERT INTO Porte (nome_porta, locale_id) VALUES (?, ?)",
+                     (f"Porta {passo}", rng.choice(locali + [None])))
+    elif azione == 5 and porte:
+        conn.execute("UPDATE Porte SET locale_id = ? WHERE porta_id = ?",
+                     (rng.choice(locali + [None]), rng.choice(porte)))
+    elif azione == 6 and porte:
+        porta_id = rng.choice(porte)
+        conn.execute("UPDATE Inventario_Dispositivi SET porta_id = NULL WHERE porta_id = ?", (porta_id,))
+        conn.execute("DELETE FROM Porte WHERE porta_id = ?", (porta_id,))
+    elif azione == 7 and locali:
+        conn.execute("UPDATE Locali SET piano_id = ? WHERE locale_id = ?",
+                     (rng.choice(piani + [None]), rng.choice(locali)))
+    elif azione == 8 and piani:
+        if rng.random() < 0.3:
+            conn.execute("DELETE FROM Piani WHERE piano_id = ?", (rng.choice(piani),))  # Locali senza piano
+        else:
+            conn.execute("UPDATE Piani SET edificio_id = ? WHERE piano_id = ?",
+                         (rng.choice(edifici), rng.choice(piani)))
+    elif azione == 9:
+        if rng.random() < 0.2 and len(edifici) > 1:
+            conn.execute("DELETE FROM Edifici WHERE edificio_id = ?", (rng.choice(edifici),))  # Piani in cascata
+        else:
+            edificio_id = conn.execute("INSERT INTO Edifici (nome_edificio) VALUES (?)",
+                                       (f"Edificio {passo}",)).lastrowid
+            piano_id = conn.execute("INSERT INTO Piani (nome_piano, edificio_id) VALUES ('PT', ?)",
+                                    (edificio_id,)).lastrowid
+            conn.execute("INSERT INTO Locali (nome_locale, piano_id) VALUES (?, ?)", (f"Locale {passo}", piano_id))
+    elif azione == 10:
+        conn.execute("INSERT INTO Interconnessioni (dispositivo_id, sistema_id, descrizione_connessione) "
+                     "VALUES (?, ?, 'c')", (rng.choice(dispositivi), rng.choice((1, 2))))
+    else:
+        interconnessioni = _ids(conn, "Interconnessioni", "interconnessione_id")
+        if interconnessioni and rng.random() < 0.5:
+            conn.execute("DELETE FROM Interconnessioni WHERE interconnessione_id = ?", (rng.choice(interconnessioni),))
+        elif interconnessioni:
+            conn.execute("UPDATE Interconnessioni SET sistema_id = ? WHERE interconnessione_id = ?",
+                         (rng.choice((1, 2)), rng.choice(interconnessioni)))
+
+
+@pytest.mark.parametrize("seme", range(3))
+def test_modifiche_casuali(inventario, seme):
+    conn = inventario
+    assert verifica_statistiche(conn) == []
+    rng = random.Random(seme)
+    for passo in range(250):
+        try:
+            with conn:
+                _modifica_casuale(conn, rng, passo)
+        except sqlite3.IntegrityError:
+            pass  # Chiave esterna ancora usata: la transazione è annullata
+        assert verifica_statistiche(conn) == [], f"passo {passo}"
+
+
+def test_ricalcola(inventario):
+    conn = inventario
+    with conn:
+        conn.execute("DELETE FROM Statistiche_Dispositivi")
+    assert verifica_statistiche(conn) != []
+    ricalcola_statistiche(conn)
+    assert verifica_statistiche(conn) == []
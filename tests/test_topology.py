@@ -0,0 +1,67 @@
+# This Python file uses the following encoding: utf-8
+import random
+import sqlite3
+
+import pytest
+
+from database.topology import CTE_ANTENATI, CTE_DISCENDENTI, antenati, discendenti, verifica_chiusura
+
+
+@pytest.fixture
+def dispositivi(conn):
+    """Albero 1 > 2 > (3, 4), 3 > 5, più la radice isolata 6."""
+    conn.executescript("""
+        INSERT INTO Tipi_Dispositivi (tipo_id, nome_tipo) VALUES (1, 'Centrale');
+        INSERT INTO Inventario_Dispositivi (dispositivo_id, modello, tipo_id, parent_dispositivo_id)
+        VALUES (1, 'C', 1, NULL), (2, 'C', 1, 1), (3, 'C', 1, 2), (4, 'C', 1, 2), (5, 'C', 1, 3), (6, 'C', 1, NULL);
+    """)
+    return conn
+
+
+def _ids(righe) -> list:
+    return [riga[0] for riga in righe]
+
+
+def test_chiusura_e_cte_coincidono(dispositivi):
+    conn = dispositivi
+    assert verifica_chiusura(conn) == []
+    assert sorted(_ids(discendenti(conn, 2))) == [2, 3, 4, 5]
+    assert _ids(antenati(conn, 5)) == [1, 2, 3, 5]
+    assert sorted(conn.execute(CTE_DISCENDENTI, (2,)).fetchall()) == sorted(discendenti(conn, 2))
+    assert conn.execute(CTE_ANTENATI, (5,)).fetchall() == antenati(conn, 5)
+
+
+def test_ciclo_rifiutato(dispositivi):
+    conn = dispositivi
+    with pytest.raises(sqlite3.IntegrityError):
+        with conn:
+            conn.execute("UPDATE Inventario_Dispositivi SET parent_dispositivo_id = 5 WHERE dispositivo_id = 2")
+    with pytest.raises(sqlite3.IntegrityError):
+        with conn:
+            conn.execute("UPDATE Inventario_Dispositivi SET parent_dispositivo_id = 1 WHERE dispositivo_id = 1")
+    assert verifica_chiusura(conn) == []
+
+
+def test_modifiche_casuali(dispositivi):
+    conn = dispositivi
+    rng = random.Random(7)
+    for passo in range(300):
+        ids = _ids(conn.execute("SELECT dispositivo_id FROM Inventario_Dispositivi"))
+        azione = rng.random()
+        try:
+            with conn:
+                if azione < 0.35 or len(ids) < 3:
+                    conn.execute("INSERT INTO Inventario_Dispositivi (modello, tipo_id, parent_dispositivo_id) "
+                                 "VALUES ('C', 1, ?)", (rng.choice(ids + [None]),))
+                elif azione < 0.8:
+                    # Spostamenti (i cicli vengono rifiutati dal trigger)
+                    conn.execute("UPDATE Inventario_Dispositivi SET parent_dispositivo_id = ? "
+                                 "WHERE dispositivo_id = ?", (rng.choice(ids + [None]), rng.choice(ids)))
+                else:
+                    foglie = _ids(conn.execute("""
+                        SELECT dispositivo_id FROM Inventario_Dispositivi d WHERE NOT EXISTS (
+                            SELECT 1 FROM Inventario_Dispositivi f WHERE f.parent_dispositivo_id = d.dispositivo_id)"""))
+                    conn.execute("DELETE FROM Inventario_Dispositivi WHERE dispositivo_id = ?", (rng.choice(foglie),))
+        except sqlite3.IntegrityError:
+            pass
+        assert verifica_chiusura(conn) == [], f"passo {passo}"
@@ -0,0 +1,299 @@
+# This Python file uses the following encoding: utf-8
+"""
+Archivio compatto dei nodi dell'albero Edifici > Piani > Locali > Porte.
+
+Un nodo è un indice in array paralleli (tipo, id, padre, riga nel padre,
+stato, posizione del nome) invece di un oggetto Python o di un QStandardItem:
+circa 60 byte per nodo contro i ~900 di un QStandardItem con icona e due
+ruoli (vedi benchmark/bench_memoria_albero.py). I nomi stanno, in UTF-8, in
+un unico buffer e diventano str solo quando la vista li chiede. I figli di
+un nodo sono un array di indici, creato solo per i nodi che ne hanno.
+
+Gli indici dei nodi rimossi (e lo spazio dei nomi sostituiti) non vengono
+riusati fino a svuota(), che cambia
+anche 'epoca': chi ricorda un indice (es. una lettura in background) ricorda
+anche l'epoca e controlla con attivo() che il nodo esista ancora.
+
+Gli array si salvano così come sono in un'istantanea su file (salva_istantanea)
+che apri_istantanea rilegge con mmap, senza ricostruire un nodo alla volta.
+
+Niente Qt: LocationTreeModel traduce gli indici in QModelIndex.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from operator import itemgetter
+
+TIPI = ("root", "edificio", "piano", "locale", "porta")
+CODICE_TIPO = {tipo: codice for codice, tipo in enumerate(TIPI)}
+
+RADICE = 0
+
+# Bit di 'stati'
+CARICATO = 1         # Figli già letti dal DB (sempre per le foglie)
+IN_CARICAMENTO = 2   # Lettura dei figli in corso
+RIMOSSO = 4          # Tolto dall'albero: l'indice non è più valido
+
+# Istantanea: intestazione, poi gli array uno dopo l'altro (byte nativi della macchina)
+FIRMA = b"ALBERO01"
+_INTESTAZIONE = struct.Struct("<8s8sqqqqq")  # firma, byteorder, nodi, padri con figli, figli, byte dei nomi, cursore
+
+
+class ArchivioNodi:
+    """Nodi dell'albero in array paralleli: un nodo è il suo indice."""
+
+    def __init__(self):
+        self.epoca = 0
+        self.svuota()
+
+    def svuota(self):
+        """Lascia solo la radice (indice RADICE) e invalida tutti gli indici dati finora."""
+        self.epoca += 1
+        self.tipi = bytearray()   # Codice del tipo (indice in TIPI)
+        self.ids = array("q")     # Id dell'entità nel DB (0 per la radice)
+        self.padri = array("i")   # Indice del padre (-1 per la radice)
+        self.righe = array("i")   # Riga nel padre
+        self.stati = bytearray()  # Bit CARICATO, IN_CARICAMENTO, RIMOSSO
+        self.testi = bytearray()  # Nomi in UTF-8, uno dopo l'altro
+        self.inizi = array("q")   # Posizione del nome in 'testi'
+        self.lunghezze = array("i")
+        self.figli = []           # Array degli indici dei figli (None se non ne ha mai avuti)
+        self.rimossi = 0
+        self.aggiungi("root", None, "", -1)
+
+    def __len__(self):
+        return len(self.tipi)
+
+    def aggiungi(self, tipo: str, item_id, nome: str, padre: int, riga: int = 0, stato: int = 0) -> int:
+        """Nuovo nodo (non ancora tra i figli del padre: vedi accoda e inserisci)."""
+        self.tipi.append(CODICE_TIPO[tipo])
+        self.ids.append(0 if item_id is None else item_id)
+        self.padri.append(padre)
+        self.righe.append(riga)
+        self.stati.append(stato)
+        self.inizi.append(0)
+        self.lunghezze.append(0)
+        self.rinomina(len(self.tipi) - 1, nome)
+        self.figli.append(None)
+        return len(self.tipi) - 1
+
+    def attivo(self, nodo: int, epoca: int) -> bool:
+        """False se il nodo è stato rimosso (o l'archivio svuotato) dopo 'epoca'."""
+        return epoca == self.epoca and nodo < len(self.tipi) and not self.stati[nodo] & RIMOSSO
+
+    # --- Lettura ---
+
+    def tipo(self, nodo: int) -> str:
+        return TIPI[self.tipi[nodo]]
+
+    def item_id(self, nodo: int):
+        return None if nodo == RADICE else self.ids[nodo]
+
+    def nome(self, nodo: int) -> str:
+        return self.nome_utf8(nodo).decode()
+
+    def nome_utf8(self, nodo: int) -> bytes:
+        inizio = self.inizi[nodo]
+        return self.testi[inizio:inizio + self.lunghezze[nodo]]
+
+    def rinomina(self, nodo: int, nome: str):
+        # Il nome vecchio resta nel buffer: le rinomine sono rare
+        testo = nome.encode()
+        self.inizi[nodo] = len(self.testi)
+        self.lunghezze[nodo] = len(testo)
+        self.testi += testo
+
+    def figli_di(self, nodo: int):
+        """Indici dei figli in ordine di riga (da non modificare)."""
+        return self.figli[nodo] or ()
+
+    def numero_figli(self, nodo: int) -> int:
+        figli = self.figli[nodo]
+        return len(figli) if figli is not None else 0
+
+    def ha(self, nodo: int, bit: int) -> bool:
+        return bool(self.stati[nodo] & bit)
+
+    def imposta(self, nodo: int, bit: int, valore: bool = True):
+        if valore:
+            self.stati[nodo] |= bit
+        else:
+            self.stati[nodo] &= ~bit
+
+    def figlio(self, padre: int, tipo: str, item_id):
+        """Indice del figlio con quel tipo e id (None se non c'è)."""
+        codice = CODICE_TIPO[tipo]
+        for nodo in self.figli_di(padre):
+            if self.ids[nodo] == item_id and self.tipi[nodo] == codice:
+                return nodo
+        return None
+
+    # --- Figli ---
+
+    def _figli_modificabili(self, padre: int) -> array:
+        figli = self.figli[padre]
+        if figli is None:
+            figli = self.figli[padre] = array("i")
+        return figli
+
+    def accoda(self, padre: int, nodi):
+        figli = self._figli_modificabili(padre)
+        for nodo in nodi:
+            self.righe[nodo] = len(figli)
+            figli.append(nodo)
+
+    def inserisci(self, padre: int, riga: int, nodo: int):
+        self._figli_modificabili(padre).insert(riga, nodo)
+        self._rinumera(padre, riga)
+
+    def sposta(self, padre: int, da_riga: int, a_riga: int):
+        """Sposta il figlio da 'da_riga' ad 'a_riga' (a_riga < da_riga)."""
+        figli = self.figli[padre]
+        figli.insert(a_riga, figli.pop(da_riga))
+        self._rinumera(padre, a_riga)
+
+    def rimuovi(self, padre: int, riga: int):
+        """Toglie il figlio (e il suo sottoalbero) dall'albero."""
+        da_rimuovere = [self.figli[padre].pop(riga)]
+        self._rinumera(padre, riga)
+        while da_rimuovere:
+            nodo = da_rimuovere.pop()
+            self.stati[nodo] |= RIMOSSO
+            self.rimossi += 1
+            self.lunghezze[nodo] = 0
+            da_rimuovere.extend(self.figli_di(nodo))
+            self.figli[nodo] = None
+
+    def _rinumera(self, padre: int, da_riga: int):
+        figli = self.figli[padre]
+        for riga in range(da_riga, len(figli)):
+            self.righe[figli[riga]] = riga
+
+    def compattato(self) -> "ArchivioNodi":
+        """Copia senza i nodi rimossi e i nomi sostituiti (indici nuovi, stessa epoca)."""
+        # Nodi raggiungibili dalla radice, livello per livello
+        ordine = [RADICE]
+        livello = [RADICE]
+        while livello:
+            livello = [figlio for figli in _scegli(self.figli, livello) if figli for figlio in figli]
+            ordine.extend(livello)
+        nuovo_indice = dict(zip(ordine, range(len(ordine))))
+        nuovo_indice[-1] = -1  # Padre della radice
+
+        # Le copie scorrono gli array in C (itemgetter), non un nodo alla volta
+        copia = ArchivioNodi()
+        copia.epoca = self.epoca
+        copia.tipi = bytearray(_scegli(self.tipi, ordine))
+        copia.stati = bytearray(_scegli(self.stati, ordine))
+        copia.ids = array("q", _scegli(self.ids, ordine))
+        copia.padri = array("i", _scegli(nuovo_indice, _scegli(self.padri, ordine)))
+        copia.righe = array("i", _scegli(self.righe, ordine))
+        copia.lunghezze = array("i", _scegli(self.lunghezze, ordine))
+        copia.testi = bytearray(b"".join(map(self.nome_utf8, ordine)))
+        copia.inizi = array("q", accumulate(copia.lunghezze, initial=0))
+        copia.inizi.pop()
+        copia.figli = [None if figli is None else array("i", _scegli(nuovo_indice, figli))
+                       for figli in _scegli(self.figli, ordine)]
+        return copia
+
+
+def _scegli(valori, indici) -> list:
+    """[valori[i] for i in indici], ma in C."""
+    if len(indici) < 2:
+        return [valori[i] for i in indici]
+    return itemgetter(*indici)(valori)
+
+
+def percorso_istantanea(percorso_db: str) -> str | None:
+    """File dell'istantanea accanto al database (None per un DB in memoria)."""
+    if not percorso_db or percorso_db == ":memory:":
+        return None
+    return f"{percorso_db}.albero"
+
+
+def salva_istantanea(archivio: ArchivioNodi, percorso: str, cursore: int):
+    """
+    Scrive l'archivio in 'percorso' con il cursore del giornale delle
+    modifiche a cui corrisponde. I nodi in caricamento tornano da caricare.
+    Il file viene sostituito in un colpo solo: chi lo legge non lo vede a metà.
+    """
+    if archivio.rimossi > len(archivio) // 4 or len(archivio.testi) > 2 * sum(archivio.lunghezze):
+        archivio = archivio.compattato()
+    padri_con_figli = array("i")
+    fine_figli = array("q")  # Per ogni padre: fine dei suoi figli in 'elenco'
+    elenco = array("i")
+    for nodo, figli in enumerate(archivio.figli):
+        if figli:
+            padri_con_figli.append(nodo)
+            elenco.extend(figli)
+            fine_figli.append(len(elenco))
+    stati = archivio.stati.translate(_STATI_SALVATI)
+    provvisorio = f"{percorso}.{os.getpid()}.tmp"
+    with open(provvisorio, "wb") as f:
+        f.write(_INTESTAZIONE.pack(FIRMA, sys.byteorder.encode(), len(archivio), len(padri_con_figli),
+                                   len(elenco), len(archivio.testi), cursore))
+        for dati in (archivio.tipi, stati, archivio.ids, archivio.padri, archivio.righe, archivio.inizi,
+                     archivio.lunghezze, padri_con_figli, fine_figli, elenco, archivio.testi):
+            f.write(dati)
+    os.replace(provvisorio, percorso)
+
+
+def apri_istantanea(percorso: str):
+    """
+    (archivio, cursore) letti da un'istantanea di salva_istantanea, o None se
+    il file manca o non è valido (altra versione, altra macchina, troncato).
+    """
+    try:
+        with (open(percorso, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mappa,
+              memoryview(mappa) as dati):
+            return _leggi_istantanea(dati)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _leggi_istantanea(dati: memoryview):
+    firma, ordine, n_nodi, n_padri, n_figli, n_testi, cursore = _INTESTAZIONE.unpack_from(dati)
+    if firma != FIRMA or ordine.rstrip(b"\0") != sys.byteorder.encode():
+        return None
+    posizione = _INTESTAZIONE.size
+
+    def leggi(tipo, numero):
+        nonlocal posizione
+        valori = array(tipo)
+        fine = posizione + numero * valori.itemsize
+        if fine > len(dati):
+            raise ValueError("Istantanea troncata")
+        valori.frombytes(dati[posizione:fine])
+        posizione = fine
+        return valori
+
+    archivio = ArchivioNodi()
+    archivio.tipi = bytearray(leggi("B", n_nodi))
+    archivio.stati = bytearray(leggi("B", n_nodi))
+    archivio.ids = leggi("q", n_nodi)
+    archivio.padri = leggi("i", n_nodi)
+    archivio.righe = leggi("i", n_nodi)
+    archivio.inizi = leggi("q", n_nodi)
+    archivio.lunghezze = leggi("i", n_nodi)
+    padri_con_figli = leggi("i", n_padri)
+    fine_figli = leggi("q", n_padri)
+    elenco = leggi("i", n_figli)
+    archivio.testi = bytearray(leggi("B", n_testi))
+    if posizione != len(dati):
+        raise ValueError("Istantanea di lunghezza inattesa")
+    archivio.figli = [None] * n_nodi
+    inizio = 0
+    for padre, fine in zip(padri_con_figli, fine_figli):
+        archivio.figli[padre] = elenco[inizio:fine]
+        inizio = fine
+    archivio.rimossi = archivio.stati.translate(_RIMOSSI).count(1)
+    return archivio, cursore
+
+
+# Stato salvato per ogni stato in memoria: un caricamento in corso non arriverà mai
+_STATI_SALVATI = bytes(stato & ~(CARICATO | IN_CARICAMENTO) if stato & IN_CARICAMENTO else stato
+                       for stato in range(256))
+_RIMOSSI = bytes(1 if stato & RIMOSSO else 0 for stato in range(256))
@@ -0,0 +1,74 @@
+# This Python file uses the following encoding: utf-8
+"""
+Cache dei percorsi dei locali per i widget.
+
+CachePercorsi legge i percorsi di tutti i locali con una sola query (in
+background se c'è un AsyncLoader) e poi li restituisce senza toccare il
+database. Va invalidata quando cambiano Edifici, Piani o Locali: chi li
+modifica (o ricarica l'albero) chiama invalida().
+"""
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtSql import QSqlDatabase
+
+from database.async_loader import AsyncLoader, LetturaInBlocco, carica, inventario
+
+
+def leggi_percorsi(db: QSqlDatabase) -> dict:
+    """Job di lettura in blocco (vedi LetturaInBlocco): {locale_id: percorso} di tutti i locali."""
+    return inventario(db).percorsi()
+
+
+class CachePercorsi(QObject):
+    """Percorsi dei locali in memoria, condivisi dai widget."""
+
+    # Emesso quando i percorsi sono stati (ri)letti dal database
+    aggiornata = Signal()
+    # Emesso da invalida(): anche chi tiene altri dati dei locali deve rileggerli
+    invalidata = Signal()
+
+    def __init__(self, db: QSqlDatabase, loader: AsyncLoader = None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.loader = loader
+        self._percorsi = None  # None finché non è stata letta (o dopo invalida())
+        self._in_lettura = False
+
+    def pronta(self) -> bool:
+        return self._percorsi is not None
+
+    def percorso(self, locale_id) -> str | None:
+        """
+        Percorso del locale, senza query. None se il locale non ha un piano
+        o se la cache non è ancora pronta (in quel caso la lettura viene
+        avviata e al termine viene emesso 'aggiornata').
+        """
+        if self._percorsi is None:
+            self.carica()  # Senza loader la lettura avviene subito
+            if self._percorsi is None:
+                return None
+        return self._percorsi.get(locale_id)
+
+    def carica(self):
+        """Avvia la lettura dei percorsi se non sono già in memoria o in arrivo."""
+        if self._percorsi is not None or self._in_lettura:
+            return
+        self._in_lettura = True
+        carica(self.loader, self.db, "percorsi", LetturaInBlocco(leggi_percorsi), self._on_percorsi, self._on_errore)
+
+    def invalida(self):
+        """Scarta i percorsi (es. dopo modifiche a Edifici, Piani o Locali) e li rilegge."""
+        self._percorsi = None
+        self._in_lettura = False
+        if self.loader is not None:
+            self.loader.cancel("percorsi")
+        self.invalidata.emit()
+        self.carica()
+
+    def _on_percorsi(self, percorsi: dict):
+        self._in_lettura = False
+        self._percorsi = percorsi
+        self.aggiornata.emit()
+
+    def _on_errore(self, errore: Exception):
+        self._in_lettura = False
+        print(f"Errore lettura percorsi dei locali: {errore}") # Debug
@@ -0,0 +1,100 @@
+# This Python file uses the following encoding: utf-8
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTabWidget, QTableWidget, QTableWidgetItem,
+    QListWidget, QPushButton, QLabel, QFileDialog, QHeaderView
+)
+from PySide6.QtCore import Qt
+
+from database import diagnostica
+
+COLONNE_QUERY = ("Chiamate", "Totale ms", "Media ms", "Max ms", "Righe", "Errori", "Query", "Chiamata da")
+COLONNE_AZIONI = ("Azione", "Esecuzioni", "Query", "Max query/esecuzione", "Totale ms")
+
+
+class DiagnosticaDialog(QDialog):
+    """
+    Pannello nascosto (Ctrl+Shift+D) con i contatori di database.diagnostica:
+    query per tempo totale, query per azione della UI, sospetti N+1, errori.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostica query")
+        self.resize(1000, 600)
+        self.setup_ui()
+        self.aggiorna()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        self.riepilogo = QLabel()
+        layout.addWidget(self.riepilogo)
+
+        self.schede = QTabWidget()
+        self.query_table = self._tabella(COLONNE_QUERY)
+        self.azioni_table = self._tabella(COLONNE_AZIONI)
+        self.n_piu_1_list = QListWidget()
+        self.messaggi_list = QListWidget()
+        self.schede.addTab(self.query_table, "Query")
+        self.schede.addTab(self.azioni_table, "Azioni")
+        self.schede.addTab(self.n_piu_1_list, "Sospetti N+1")
+        self.schede.addTab(self.messaggi_list, "Errori e avvisi")
+        layout.addWidget(self.schede)
+
+        pulsanti = QHBoxLayout()
+        for testo, slot in (("Aggiorna", self.aggiorna), ("Azzera", self.azzera),
+                            ("Esporta JSON...", self.esporta_json)):
+            pulsante = QPushButton(testo)
+            pulsante.clicked.connect(slot)
+            pulsanti.addWidget(pulsante)
+        pulsanti.addStretch()
+        layout.addLayout(pulsanti)
+
+    @staticmethod
+    def _tabella(colonne: tuple) -> QTableWidget:
+        tabella = QTableWidget(0, len(colonne))
+        tabella.setHorizontalHeaderLabels(colonne)
+        tabella.setEditTriggers(QTableWidget.NoEditTriggers)
+        tabella.setSortingEnabled(True)
+        tabella.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        return tabella
+
+    @staticmethod
+    def _riempi(tabella: QTableWidget, righe: list):
+        tabella.setSortingEnabled(False)  # Altrimenti le righe si riordinano mentre si riempiono
+        tabella.setRowCount(len(righe))
+        for r, riga in enumerate(righe):
+            for c, valore in enumerate(riga):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, valore)  # I numeri restano numeri (ordinamento)
+                tabella.setItem(r, c, item)
+        tabella.setSortingEnabled(True)
+
+    def aggiorna(self):
+        dati = diagnostica.istantanea()
+        self.riepilogo.setText(
+            f"Dal {dati['inizio']}: {sum(q['chiamate'] for q in dati['query'])} query, "
+            f"{dati['query_lente']} sopra {dati['soglia_query_lente_ms']:g} ms, "
+            f"{len(dati['n_piu_1'])} sospetti N+1.")
+        self._riempi(self.query_table, [
+            (q["chiamate"], q["tempo_ms"], q["media_ms"], q["max_ms"], q["righe"], q["errori"], q["sql"],
+             ", ".join(q["siti"]))
+            for q in dati["query"]])
+        self._riempi(self.azioni_table, [
+            (nome, a["esecuzioni"], a["query"], a["max_query_per_esecuzione"], a["tempo_ms"])
+            for nome, a in dati["azioni"].items()])
+        self.n_piu_1_list.clear()
+        self.n_piu_1_list.addItems(
+            f"{s['azione']}: {s['ripetizioni_minime']}+ volte da {s['sito']}\n    {s['sql']}"
+            for s in dati["n_piu_1"])
+        self.messaggi_list.clear()
+        self.messaggi_list.addItems([f"ERRORE {m}" for m in dati["errori"]] + dati["avvisi"])
+
+    def azzera(self):
+        diagnostica.azzera()
+        self.aggiorna()
+
+    def esporta_json(self):
+        percorso, _ = QFileDialog.getSaveFileName(self, "Esporta diagnostica", "diagnostica.json", "JSON (*.json)")
+        if percorso:
+            diagnostica.salva_json(percorso)
@@ -0,0 +1,142 @@
+# This Python file uses the following encoding: utf-8
+"""
+Modello dei locali per il combo di assegnazione della porta.
+
+I locali arrivano a pagine ordinate per nome (paginazione per chiave
+sull'indice UNIQUE di nome_locale) quando la vista chiede altre righe con
+fetchMore, quindi aprire il dettaglio non legge tutta la tabella. Un locale
+non ancora arrivato (es. quello della porta caricata) si aggiunge con
+assicura() nella sua posizione; la riga di un locale si trova per id con un
+dizionario.
+"""
+from bisect import bisect_left
+from functools import partial
+
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, Signal
+from PySide6.QtSql import QSqlDatabase
+
+from database.async_loader import AsyncLoader, carica, inventario
+from database.inventario import DIMENSIONE_PAGINA_LOCALI as DIMENSIONE_PAGINA
+from database.inventario import MAX_SUGGERIMENTI_LOCALI as MAX_SUGGERIMENTI
+
+ETICHETTA_NESSUNO = "Nessuno"
+
+
+# --- Job di lettura (vedi AsyncLoader) ---
+
+def leggi_pagina_locali(db: QSqlDatabase, dopo_nome: str | None, limite: int = DIMENSIONE_PAGINA) -> list:
+    """Righe (locale_id, nome_locale) successive a 'dopo_nome' in ordine di nome."""
+    return inventario(db).pagina_locali(dopo_nome, limite)
+
+
+def cerca_locali(db: QSqlDatabase, query_testo: str, limite: int = MAX_SUGGERIMENTI) -> list:
+    """Righe (locale_id, nome_locale) dei locali che corrispondono alla query FTS5."""
+    return inventario(db).cerca_locali(query_testo, limite)
+
+
+class LocaliModel(QAbstractListModel):
+    """'Nessuno' (id None) seguito dai locali in ordine di nome, caricati a pagine."""
+
+    errore_caricamento = Signal(object)
+
+    def __init__(self, db: QSqlDatabase, loader: AsyncLoader = None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.loader = loader
+        self._ids = []         # Id dei locali in ordine di nome (riga del modello - 1)
+        self._nomi = []        # Nomi nello stesso ordine, per la ricerca binaria
+        self._riga_di = {}     # locale_id -> riga del modello
+        self._cursore = None   # Ultimo nome letto dalla paginazione
+        self._finito = False
+        self._in_lettura = False
+
+    # --- API del modello ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids) + 1
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        riga = index.row()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return ETICHETTA_NESSUNO if riga == 0 else self._nomi[riga - 1]
+        if role == Qt.UserRole:
+            return None if riga == 0 else self._ids[riga - 1]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._finito and not self._in_lettura
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._in_lettura = True
+        carica(self.loader, self.db, "locali:pagina",
+               partial(leggi_pagina_locali, dopo_nome=self._cursore),
+               self._on_pagina, self._on_errore)
+
+    # --- Ricerca per id e aggiunta di singoli locali ---
+
+    def riga(self, locale_id) -> int:
+        """Riga del locale (0 = 'Nessuno'), -1 se non è ancora nel modello."""
+        if locale_id is None:
+            return 0
+        return self._riga_di.get(locale_id, -1)
+
+    def assicura(self, locale_id, nome: str) -> int:
+        """Aggiunge il locale (se manca) nella sua posizione e ne restituisce la riga."""
+        riga = self.riga(locale_id)
+        if riga == -1:
+            self._inserisci([(locale_id, nome)])
+            riga = self._riga_di[locale_id]
+        return riga
+
+    def reload(self):
+        """Svuota il modello e ricomincia la paginazione (es. dopo modifiche ai locali)."""
+        if self.loader is not None:
+            self.loader.cancel("locali:pagina")
+        self.beginResetModel()
+        self._ids, self._nomi, self._riga_di = [], [], {}
+        self._cursore = None
+        self._finito = False
+        self._in_lettura = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def _on_pagina(self, righe: list):
+        self._in_lettura = False
+        if len(righe) < DIMENSIONE_PAGINA:
+            self._finito = True
+        if righe:
+            self._cursore = righe[-1][1]
+            # Le righe già aggiunte con assicura() non vanno ripetute
+            self._inserisci([riga for riga in righe if riga[0] not in self._riga_di])
+
+    def _on_errore(self, errore: Exception):
+        self._in_lettura = False
+        self.errore_caricamento.emit(errore)
+
+    def _inserisci(self, righe: list):
+        """Inserisce righe ordinate per nome, a blocchi contigui tra quelle già presenti."""
+        nomi = [nome for _, nome in righe]
+        i = 0
+        in_coda = True
+        while i < len(righe):
+            pos = bisect_left(self._nomi, nomi[i])
+            # Il blocco prosegue finché le righe restano prima del nome già presente in 'pos'
+            fine = bisect_left(nomi, self._nomi[pos], i) if pos < len(self._nomi) else len(righe)
+            fine = max(fine, i + 1)  # Nome uguale a uno già presente: almeno una riga per blocco
+            blocco = righe[i:fine]
+            self.beginInsertRows(QModelIndex(), pos + 1, pos + len(blocco))
+            self._ids[pos:pos] = [locale_id for locale_id, _ in blocco]
+            self._nomi[pos:pos] = [nome for _, nome in blocco]
+            self.endInsertRows()
+            in_coda = in_coda and pos + len(blocco) == len(self._ids)
+            if in_coda:
+                for offset, (locale_id, _) in enumerate(blocco):
+                    self._riga_di[locale_id] = pos + offset + 1
+            i = fine
+        if not in_coda:
+            # Inserimento in mezzo: le righe successive sono scalate
+            self._riga_di = {locale_id: riga for riga, locale_id in enumerate(self._ids, 1)}
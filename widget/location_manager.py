@@ -1,24 +1,48 @@
+from functools import partial
+
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QTreeView, QToolBar, QMessageBox
+    QWidget, QVBoxLayout, QTreeView, QToolBar, QMessageBox, QLineEdit, QLabel
 )
 # AGGIUNTA: Importiamo Signal
-from PySide6.QtCore import Qt, Signal, QModelIndex
-from PySide6.QtSql import QSqlDatabase, QSqlQuery
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QIcon
+from PySide6.QtCore import Signal, QModelIndex, QTimer
+from PySide6.QtSql import QSqlDatabase
+
+from database import diagnostica
+from database.async_loader import AsyncLoader
+from database.async_loader import carica
+from database.inventario import MAX_TROVATI_FILTRO, query_fts, restringe, restringi_filtro
+from widget.archivio_nodi import apri_istantanea, percorso_istantanea, salva_istantanea
+from widget.cache_percorsi import CachePercorsi
+from widget.location_tree_model import LocationTreeModel, ID_ROLE, TIPO_ROLE, leggi_filtro, leggi_percorso
+from widget.osservatore_modifiche import OsservatoreModifiche
+from widget.ricerca_widget import RicercaWidget
+
+SALVATAGGIO_ISTANTANEA_MS = 10_000  # Pausa dopo l'ultima modifica dell'albero prima di salvarlo
 
 class LocationManagerWidget(QWidget): # Rinominiamo per chiarezza
     # Segnale personalizzato: emette l'ID del locale quando viene selezionato
     item_selected = Signal(str, int)
 
-    def __init__(self, db: QSqlDatabase, parent=None):
+    def __init__(self, db: QSqlDatabase, loader: AsyncLoader = None,
+                 percorsi: CachePercorsi = None, parent=None):
         super().__init__(parent)
         if not db or not db.isOpen():
             QMessageBox.critical(self, "Errore", "Connessione DB non valida in LocationManagerWidget.")
                      # Potresti voler disabilitare il widget o lanciare un'eccezione
             return
         self.db = db
+        self.loader = loader # Se presente, le query dell'albero girano in background
+        self.percorsi = percorsi # Cache dei percorsi dei locali, riletta con l'albero
+        self._espandi_edifici = False
+        self._espandi_tutto = False
+        self._filtro = None  # (testo, risultato di filtra_albero) mostrato; None = albero completo
+        # Istantanea dell'albero accanto al DB: all'avvio si disegna da lì (vedi ripristina_istantanea)
+        self.file_istantanea = percorso_istantanea(db.databaseName())
+        self.cursore_istantanea = None  # Cursore del giornale dell'istantanea mostrata all'avvio
+        self.osservatore = None
         self.setup_ui()
-        self.load_location_tree()
+        if not self.ripristina_istantanea():
+            self.load_location_tree()
 
     def setup_ui(self):
         layout = QVBoxLayout(self)
@@ -29,13 +53,54 @@ class LocationManagerWidget(QWidget): # Rinominiamo per chiarezza
         self.refresh_action = self.toolbar.addAction(
             style.standardIcon(style.StandardPixmap.SP_BrowserReload), "Aggiorna"
         )
-        self.refresh_action.triggered.connect(self.load_location_tree)
+        self.refresh_action.triggered.connect(self.refresh_location_tree)
+        self.expand_all_action = self.toolbar.addAction(
+            style.standardIcon(style.StandardPixmap.SP_ToolBarVerticalExtensionButton), "Espandi tutto"
+        )
+        self.expand_all_action.triggered.connect(self.expand_all)
+        # Filtro per nome: l'albero mostra solo porte e locali trovati con i loro antenati
+        self.filtro_edit = QLineEdit()
+        self.filtro_edit.setPlaceholderText("Filtra albero per nome...")
+        self.filtro_edit.setClearButtonEnabled(True)
+        self.filtro_edit.textChanged.connect(self.on_filtro_cambiato)
+        self.toolbar.addWidget(self.filtro_edit)
         layout.addWidget(self.toolbar)
 
+        # Una query al DB solo dopo una breve pausa nella digitazione
+        self.filtro_timer = QTimer(self)
+        self.filtro_timer.setSingleShot(True)
+        self.filtro_timer.setInterval(150)
+        self.filtro_timer.timeout.connect(self.interroga_filtro)
+        self.filtro_label = QLabel()
+        self.filtro_label.hide()
+        layout.addWidget(self.filtro_label)
+
+        # Ricerca globale: il risultato scelto viene mostrato nell'albero
+        self.ricerca = RicercaWidget(self.db, self.loader, self.percorsi)
+        self.ricerca.risultato_scelto.connect(self.on_risultato_ricerca)
+        layout.addWidget(self.ricerca)
+
         self.tree_view = QTreeView()
         self.tree_view.setHeaderHidden(True)
-        self.model = QStandardItemModel()
+        # Icone condivise per tipo di nodo
+        icone = {
+            "edificio": style.standardIcon(style.StandardPixmap.SP_DirHomeIcon),
+            "piano": style.standardIcon(style.StandardPixmap.SP_DirOpenIcon),
+            "locale": style.standardIcon(style.StandardPixmap.SP_DirIcon),
+            "porta": style.standardIcon(style.StandardPixmap.SP_FileIcon),
+        }
+        self.model = LocationTreeModel(self.db, icone, self.loader, self)
+        self.model.figli_caricati.connect(self.on_figli_caricati)
+        self.model.nodo_rivelato.connect(self.on_nodo_rivelato)
         self.tree_view.setModel(self.model)
+        # Albero cambiato: l'istantanea si aggiorna dopo una pausa
+        self.salvataggio_timer = QTimer(self)
+        self.salvataggio_timer.setSingleShot(True)
+        self.salvataggio_timer.setInterval(SALVATAGGIO_ISTANTANEA_MS)
+        self.salvataggio_timer.timeout.connect(self.salva_istantanea)
+        for segnale in (self.model.modelReset, self.model.rowsInserted, self.model.rowsRemoved,
+                        self.model.rowsMoved, self.model.dataChanged):
+            segnale.connect(self.on_albero_cambiato)
         # Disabilita l'editing col doppio click
         self.tree_view.setEditTriggers(QTreeView.NoEditTriggers)
 
@@ -47,93 +112,219 @@ class LocationManagerWidget(QWidget): # Rinominiamo per chiarezza
 
     def load_location_tree(self):
         """
-        Carica (o ricarica) l'intera gerarchia dal DB e popola il modello.
+        Ricarica la gerarchia dal DB. Viene letto solo il primo livello
+        (Edifici): Piani, Locali e Porte sono caricati dal modello quando
+        l'utente espande il nodo padre.
         """
-        self.model.clear()
+        # Gli edifici vengono espansi appena arrivano (vedi on_figli_caricati)
+        self._espandi_edifici = True
+        with diagnostica.azione("Carica albero"):
+            self.model.reload()
 
-                # Icone (opzionali)
-        style = self.style()
-        icon_building = style.standardIcon(style.StandardPixmap.SP_DirHomeIcon)
-        icon_floor = style.standardIcon(style.StandardPixmap.SP_DirOpenIcon)
-        # --- QUESTA È LA RIGA CORRETTA ---
-        icon_room = style.standardIcon(style.StandardPixmap.SP_DirIcon)
-        icon_porta = style.standardIcon(style.StandardPixmap.SP_FileIcon)
-
-        # Livello 1: Edifici
-        query_edifici = QSqlQuery(self.db)
-        if query_edifici.exec("SELECT edificio_id, nome_edificio FROM Edifici ORDER BY nome_edificio"):
-            while query_edifici.next():
-                edificio_id = query_edifici.value(0)
-                nome_edificio = query_edifici.value(1)
-
-                item_edificio = QStandardItem(nome_edificio)
-                item_edificio.setIcon(icon_building)
-                item_edificio.setData(edificio_id, Qt.UserRole) # Salviamo l'ID
-                item_edificio.setData("edificio", Qt.UserRole + 1) # Salviamo il tipo
-                item_edificio.setEditable(False)
-
-                self.model.appendRow(item_edificio)
-
-                # Livello 2: Piani (per questo edificio)
-                query_piani = QSqlQuery(self.db)
-                query_piani.prepare("SELECT piano_id, nome_piano FROM Piani WHERE edificio_id = ? ORDER BY nome_piano")
-                query_piani.addBindValue(edificio_id)
-                if query_piani.exec():
-                    while query_piani.next():
-                        piano_id = query_piani.value(0)
-                        item_piano = QStandardItem(query_piani.value(1))
-                        item_piano.setIcon(icon_floor); item_piano.setData(piano_id, Qt.UserRole); item_piano.setData("piano", Qt.UserRole + 1); item_piano.setEditable(False)
-                        item_edificio.appendRow(item_piano)
-
-                        query_locali = QSqlQuery(self.db)
-                        query_locali.prepare("SELECT locale_id, nome_locale FROM Locali WHERE piano_id = ? ORDER BY nome_locale")
-                        query_locali.addBindValue(piano_id)
-                        if query_locali.exec():
-                            while query_locali.next():
-                                locale_id = query_locali.value(0)
-                                item_locale = QStandardItem(query_locali.value(1))
-                                item_locale.setIcon(icon_room); item_locale.setData(locale_id, Qt.UserRole); item_locale.setData("locale", Qt.UserRole + 1); item_locale.setEditable(False)
-                                item_piano.appendRow(item_locale) # Aggiungi locale al piano
-
-                                # --- MODIFICA 5: Carica le Porte per questo Locale ---
-                                query_porte = QSqlQuery(self.db)
-                                query_porte.prepare("SELECT porta_id, nome_porta FROM Porte WHERE locale_id = ? ORDER BY nome_porta")
-                                query_porte.addBindValue(locale_id)
-                                if query_porte.exec():
-                                     while query_porte.next():
-                                        porta_id = query_porte.value(0)
-                                        item_porta = QStandardItem(query_porte.value(1))
-                                        item_porta.setIcon(icon_porta) # Usa icona porta
-                                        item_porta.setData(porta_id, Qt.UserRole)
-                                        item_porta.setData("porta", Qt.UserRole + 1) # Imposta tipo "porta"
-                                        item_porta.setEditable(False)
-                                        # Aggiungi la porta come figlio del locale
-                                        item_locale.appendRow(item_porta)
-                                else:
-                                     print(f"Errore query porte: {query_porte.lastError().text()}") # Debug
-                        else:
-                             print(f"Errore query locali: {query_locali.lastError().text()}") # Debug
-                else:
-                    print(f"Errore query piani: {query_piani.lastError().text()}") # Debug
-        else:
-             print(f"Errore query edifici: {query_edifici.lastError().text()}") # Debug
-                # Espandi i primi livelli
-        self.tree_view.expandToDepth(1)
+    def ripristina_istantanea(self) -> bool:
+        """
+        Mostra subito l'albero salvato nella sessione precedente, senza
+        aspettare il DB. Le differenze arrivano poi dal giornale delle
+        modifiche (vedi segui_modifiche). False se non c'è un'istantanea valida.
+        """
+        if self.file_istantanea is None:
+            return False
+        with diagnostica.azione("Ripristina albero"):
+            letta = apri_istantanea(self.file_istantanea)
+            if letta is None:
+                return False
+            archivio, self.cursore_istantanea = letta
+            self._espandi_edifici = True
+            self.model.ripristina(archivio)
+        return True
+
+    def segui_modifiche(self, osservatore: OsservatoreModifiche):
+        """
+        Applica all'albero le modifiche notificate dall'osservatore; se l'albero
+        viene da un'istantanea, anche quelle fatte dopo il suo salvataggio.
+        """
+        self.osservatore = osservatore
+        osservatore.modificate.connect(self.applica_modifiche)
+        osservatore.riallinea.connect(self.refresh_location_tree)
+        if self.cursore_istantanea is not None:
+            osservatore.riparti_da(self.cursore_istantanea)
+
+    def on_albero_cambiato(self, *_):
+        if self.osservatore is not None:
+            self.salvataggio_timer.start()
+
+    def salva_istantanea(self) -> bool:
+        """
+        Salva i nodi caricati con il cursore del giornale a cui corrispondono.
+        Non salva un albero filtrato o con letture in corso (un'istantanea
+        precedente resta valida: ha un cursore più vecchio).
+        """
+        cursore = self.osservatore.cursore() if self.osservatore is not None else None
+        if self.file_istantanea is None or cursore is None or self._filtro is not None:
+            return False
+        if self.loader is not None and self.loader.in_attesa("albero:"):
+            return False
+        try:
+            salva_istantanea(self.model.nodi, self.file_istantanea, cursore)
+        except OSError as e:
+            print(f"Istantanea albero non salvata: {e}") # Debug
+            return False
+        return True
+
+    def on_figli_caricati(self, parent: QModelIndex):
+        """Chiamato dal modello quando le righe di un nodo sono arrivate dal DB."""
+        if not parent.isValid() and self._espandi_edifici:
+            self._espandi_edifici = False
+            # Espandi gli edifici (carica i loro piani)
+            self.tree_view.expandToDepth(0)
+        elif not parent.isValid() and self._espandi_tutto:
+            self._espandi_tutto = False
+            self.tree_view.expandAll()
+
+    def refresh_location_tree(self):
+        """
+        Aggiorna l'albero applicando solo le differenze rispetto al DB,
+        senza chiudere i nodi espansi né perdere la selezione (con il filtro
+        attivo lo rilegge). Anche i percorsi dei locali vengono riletti.
+        """
+        with diagnostica.azione("Aggiorna albero"):
+            if self._filtro is not None:
+                self.interroga_filtro()
+            else:
+                self.model.refresh()
+            if self.percorsi is not None:
+                self.percorsi.invalida()
+
+    def applica_modifiche(self, modificate: dict):
+        """
+        Modifiche arrivate dal giornale (vedi OsservatoreModifiche): rilegge
+        solo i rami che le contengono; i percorsi se cambiano edifici, piani o locali.
+        """
+        with diagnostica.azione("Modifiche esterne albero"):
+            if self._filtro is not None:
+                self.filtro_timer.start()  # Le modifiche possono cambiare i nomi trovati
+            else:
+                self.model.aggiorna_entita(modificate)
+            if self.percorsi is not None and modificate.keys() & {"edificio", "piano", "locale"}:
+                self.percorsi.invalida()
+
+    def expand_all(self):
+        """
+        Carica ed espande l'intera gerarchia (es. per stampa o ricerca completa)
+        con un numero costante di query.
+        """
+        self._espandi_tutto = True
+        with diagnostica.azione("Espandi tutto"):
+            self._togli_filtro()
+            self.model.load_all()
+
+    # --- Filtro per nome ---
+
+    def on_filtro_cambiato(self, testo: str):
+        """
+        Se il testo restringe quello del filtro mostrato (es. "serv" ->
+        "server") il risultato si ricava subito da quello precedente, senza
+        query; altrimenti si interroga il DB dopo una pausa nella digitazione.
+        """
+        self.filtro_timer.stop()
+        if query_fts(testo) is None:
+            if self._filtro is not None:
+                self._togli_filtro()
+                self.load_location_tree()
+            return
+        if self._filtro is not None and self._filtro[1] is not None and restringe(self._filtro[0], testo):
+            with diagnostica.azione("Restringi filtro albero"):
+                self._mostra_filtro(testo, restringi_filtro(self._filtro[1], testo))
+            return
+        self.filtro_timer.start()
 
-def on_item_clicked(self, index: QModelIndex):
+    def interroga_filtro(self):
+        """Legge dal DB il sottoalbero dei nomi che corrispondono al testo del filtro."""
+        testo = self.filtro_edit.text()
+        query_testo = query_fts(testo)
+        if query_testo is None:
+            return
+        with diagnostica.azione("Filtra albero"):
+            carica(self.loader, self.db, "albero:filtro", partial(leggi_filtro, query_testo=query_testo),
+                   partial(self._on_filtro_letto, testo), self.on_errore_filtro)
+
+    def _on_filtro_letto(self, testo: str, risultato):
+        attuale = self.filtro_edit.text()
+        if query_fts(attuale) is None:
+            return  # Filtro tolto mentre la query girava
+        if testo != attuale:
+            # L'utente ha continuato a scrivere: se il testo si è solo allungato basta restringere
+            if risultato is None or not restringe(testo, attuale):
+                return  # Arriverà (o è già arrivato) il risultato del testo attuale
+            testo, risultato = attuale, restringi_filtro(risultato, attuale)
+        self._mostra_filtro(testo, risultato)
+
+    def on_errore_filtro(self, errore):
+        print(f"Errore filtro albero: {errore}") # Debug
+
+    def _mostra_filtro(self, testo: str, risultato):
+        self._filtro = (testo, risultato)
+        if risultato is None:
+            self.filtro_label.setText(f"Più di {MAX_TROVATI_FILTRO} nomi trovati: continua a scrivere")
+        elif not risultato["trovati"]:
+            self.filtro_label.setText("Nessun nome trovato")
+        self.filtro_label.setVisible(not (risultato and risultato["trovati"]))
+        self.model.mostra_filtro(risultato)
+        self._espandi_sottoalbero(QModelIndex())
+
+    def _espandi_sottoalbero(self, parent: QModelIndex):
+        """Espande i nodi con i figli già presenti (non fa caricare i locali trovati)."""
+        for row in range(self.model.rowCount(parent)):
+            index = self.model.index(row, 0, parent)
+            if self.model.rowCount(index):
+                self.tree_view.expand(index)
+                self._espandi_sottoalbero(index)
+
+    def _togli_filtro(self):
+        """Dimentica il filtro (il chiamante ricarica l'albero) e svuota la casella."""
+        self.filtro_timer.stop()
+        if self.loader is not None:
+            self.loader.cancel("albero:filtro")
+        self._filtro = None
+        self.filtro_label.hide()
+        self.filtro_edit.blockSignals(True)
+        self.filtro_edit.clear()
+        self.filtro_edit.blockSignals(False)
+
+    def on_risultato_ricerca(self, tipo: str, item_id: int):
+        """Trova la posizione del risultato nell'albero e carica solo quel ramo."""
+        with diagnostica.azione("Mostra risultato ricerca"):
+            if self._filtro is not None:
+                # Il risultato potrebbe non essere nel sottoalbero filtrato
+                self._togli_filtro()
+                self.load_location_tree()
+            carica(self.loader, self.db, "albero:percorso",
+                   partial(leggi_percorso, tipo=tipo, item_id=item_id),
+                   self.model.rivela, self.on_errore_percorso)
+
+    def on_errore_percorso(self, errore):
+        print(f"Errore ricerca posizione nell'albero: {errore}") # Debug
+
+    def on_nodo_rivelato(self, index: QModelIndex):
+        """Espande gli antenati, seleziona il nodo e ne mostra il dettaglio."""
+        parent = index.parent()
+        while parent.isValid():
+            self.tree_view.expand(parent)
+            parent = parent.parent()
+        self.tree_view.setCurrentIndex(index)
+        self.tree_view.scrollTo(index)
+        self.on_item_clicked(index)
+
+    def on_item_clicked(self, index: QModelIndex):
         """Attivato quando l'utente clicca un item nell'albero."""
         if not index.isValid():
             # Potrebbe emettere un segnale per pulire il dettaglio
             # self.item_selected.emit(None, -1)
             return
 
-        # Ottieni l'item QStandardItem dall'indice
-        item = self.model.itemFromIndex(index)
-        if not item: return
-
-        # Recupera il tipo e l'ID che abbiamo salvato con setData
-        item_type = item.data(Qt.UserRole + 1)
-        item_id = item.data(Qt.UserRole)
+        # Recupera il tipo e l'ID esposti dal modello
+        item_type = index.data(TIPO_ROLE)
+        item_id = index.data(ID_ROLE)
 
         # Emetti il segnale solo se abbiamo dati validi
         if item_type and item_id is not None:
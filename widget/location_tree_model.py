@@ -0,0 +1,398 @@
+# This Python file uses the following encoding: utf-8
+
+from array import array
+from functools import partial
+
+from PySide6.QtCore import Qt, QAbstractItemModel, QModelIndex, Signal
+from PySide6.QtSql import QSqlDatabase
+
+from database.async_loader import AsyncLoader, LetturaInBlocco, carica, inventario
+from database.inventario import COLONNA_PADRE, QUERY_FIGLI, QUERY_LIVELLI
+from widget.archivio_nodi import CARICATO, CODICE_TIPO, IN_CARICAMENTO, RADICE, RIMOSSO, ArchivioNodi
+
+# Ruoli usati dalla vista (gli stessi del vecchio QStandardItemModel)
+ID_ROLE = Qt.UserRole
+TIPO_ROLE = Qt.UserRole + 1
+
+# Oltre questo numero di nodi da rileggere, aggiorna_entita fa un refresh per livelli
+MAX_NODI_MIRATI = 20
+
+TIPO_PADRE = {tipo: tipo_padre for tipo, tipo_padre, _ in QUERY_LIVELLI}
+
+# --- Job di lettura: girano nel thread che possiede 'db' e restituiscono solo dati Python ---
+# (le query sono in database.inventario, usabili anche senza Qt). leggi_livelli
+# gira come LetturaInBlocco: 'db' è allora una connessione sqlite3 del pool.
+
+def leggi_figli(db: QSqlDatabase, tipo: str, item_id) -> list:
+    """Righe (id, nome) dei figli di un nodo di tipo 'tipo'."""
+    return inventario(db).figli(tipo, item_id)
+
+
+def leggi_livelli(db: QSqlDatabase, tipi: set) -> dict:
+    """Per ogni livello in 'tipi', le righe (id, nome, id_padre) in ordine di nome."""
+    return inventario(db).livelli(tipi)
+
+
+def leggi_filtro(db: QSqlDatabase, query_testo: str) -> dict | None:
+    """Sottoalbero dei nomi che corrispondono alla query FTS5 (vedi Inventario.filtra_albero)."""
+    return inventario(db).filtra_albero(query_testo)
+
+
+def leggi_percorso(db: QSqlDatabase, tipo: str, item_id: int) -> list:
+    """Percorso [(tipo, id), ...] dalla radice al nodo dell'entità (vedi Inventario.percorso)."""
+    return inventario(db).percorso(tipo, item_id)
+
+
+
+
+class LocationTreeModel(QAbstractItemModel):
+    """
+    Modello ad albero Edifici > Piani > Locali > Porte con caricamento pigro:
+    i figli di un nodo vengono letti dal DB solo quando il nodo viene espanso
+    (canFetchMore/fetchMore), con una sola query per nodo.
+
+    I nodi stanno in un ArchivioNodi (array paralleli): l'internalId di un
+    QModelIndex è l'indice del nodo, e le icone sono una per tipo.
+
+    Se viene passato un AsyncLoader le query girano in background e le righe
+    arrivano al modello quando sono pronte; senza loader tutto è sincrono.
+    """
+
+    # Emesso quando i figli di un nodo (QModelIndex() = radice) sono stati caricati
+    figli_caricati = Signal(QModelIndex)
+    # Emesso quando il nodo chiesto con rivela() è stato caricato nel modello
+    nodo_rivelato = Signal(QModelIndex)
+
+    def __init__(self, db: QSqlDatabase, icone: dict, loader: AsyncLoader = None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.icone = icone  # Un'icona condivisa per tipo di nodo
+        self.loader = loader
+        self.nodi = ArchivioNodi()
+        self._da_rivelare = None   # Percorso [(tipo, id), ...] in attesa di caricamento
+        self._rivelando = False
+
+    def _nuovo_nodo(self, tipo: str, item_id, nome: str, padre: int) -> int:
+        # Le porte sono foglie: non c'è nulla da caricare sotto di loro
+        return self.nodi.aggiungi(tipo, item_id, nome, padre, stato=0 if tipo in QUERY_FIGLI else CARICATO)
+
+    def _carica(self, canale: str, job, callback, on_error=None):
+        """Esegue 'job(db)' in background (se c'è un loader) e passa il risultato a 'callback'."""
+        carica(self.loader, self.db, canale, job, callback, on_error or self._errore_caricamento)
+
+    @staticmethod
+    def _errore_caricamento(errore):
+        print(f"Errore query albero: {errore}") # Debug
+
+    def reload(self):
+        """Svuota il modello e ricarica solo il primo livello (Edifici)."""
+        self.beginResetModel()
+        self.nodi.svuota()
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def load_all(self):
+        """
+        Carica l'intera gerarchia con una query per livello (4 in totale)
+        e collega i figli ai padri in memoria tramite l'id.
+        """
+        self._carica("albero:completo",
+                     LetturaInBlocco(partial(leggi_livelli, tipi={tipo for tipo, _, _ in QUERY_LIVELLI})),
+                     self._costruisci_albero)
+
+    def ripristina(self, archivio: ArchivioNodi):
+        """Mostra un archivio già pronto (es. da apri_istantanea) al posto dei nodi attuali."""
+        self.beginResetModel()
+        archivio.epoca = self.nodi.epoca + 1  # Le letture chieste finora vengono scartate
+        self.nodi = archivio
+        self.endResetModel()
+        if not archivio.ha(RADICE, CARICATO):
+            self.fetchMore(QModelIndex())
+        self.figli_caricati.emit(QModelIndex())
+
+    def mostra_filtro(self, filtro: dict | None):
+        """
+        Sostituisce l'albero con il sottoalbero di un filtro (vedi
+        Inventario.filtra_albero; None = albero vuoto). I locali trovati senza
+        porte trovate restano da caricare: espandendoli si vedono tutte le porte.
+        """
+        if filtro is None:
+            self._costruisci_albero({tipo: [] for tipo, _, _ in QUERY_LIVELLI})
+            return
+        con_porte = {id_padre for _, _, id_padre in filtro["livelli"]["porta"]}
+        self._costruisci_albero(filtro["livelli"], {("locale", item_id) for tipo, item_id in filtro["trovati"]
+                                                    if tipo == "locale" and item_id not in con_porte})
+
+    def _costruisci_albero(self, livelli: dict, da_caricare=frozenset()):
+        """Albero dalle righe di leggi_livelli; i nodi (tipo, id) in 'da_caricare' restano da espandere."""
+        self.beginResetModel()
+        nodi = self.nodi
+        nodi.svuota()
+        nodi.imposta(RADICE, CARICATO)
+
+        padri = {None: RADICE}
+        ultimo = QUERY_LIVELLI[-1][0]
+        for tipo, _tipo_padre, _sql in QUERY_LIVELLI:
+            nodi_livello = {}
+            figli = {}  # padre -> nodi in ordine di nome (array: niente int Python per nodo)
+            for item_id, nome, id_padre in livelli[tipo]:
+                padre = padri.get(id_padre)
+                if padre is None:
+                    continue  # Es. locale non associato a un piano
+                stato = 0 if (tipo, item_id) in da_caricare else CARICATO
+                figlio = nodi.aggiungi(tipo, item_id, nome, padre, stato=stato)
+                nodi_padre = figli.get(padre)
+                if nodi_padre is None:
+                    nodi_padre = figli[padre] = array("i")
+                nodi_padre.append(figlio)
+                if tipo != ultimo:  # Le porte non fanno da padre
+                    nodi_livello[item_id] = figlio
+            for padre, nodi_padre in figli.items():
+                nodi.accoda(padre, nodi_padre)
+            padri = nodi_livello
+        self.endResetModel()
+        self.figli_caricati.emit(QModelIndex())
+
+    def rivela(self, percorso: list):
+        """
+        Carica solo i nodi lungo 'percorso' (vedi leggi_percorso) ed emette
+        nodo_rivelato con l'indice del nodo finale, senza caricare il resto.
+        """
+        self._da_rivelare = list(percorso) or None
+        self._prosegui_rivela()
+
+    def _prosegui_rivela(self):
+        if self._da_rivelare is None or self._rivelando:
+            return
+        self._rivelando = True
+        try:
+            nodo = RADICE
+            for tipo, item_id in self._da_rivelare:
+                if not self.nodi.ha(nodo, CARICATO):
+                    self.fetchMore(self._indice(nodo))
+                if self.nodi.ha(nodo, IN_CARICAMENTO):
+                    return  # Si riprende da _figli_letti quando arrivano le righe
+                nodo = self.nodi.figlio(nodo, tipo, item_id)
+                if nodo is None:
+                    self._da_rivelare = None  # Non (più) presente nel DB
+                    return
+            self._da_rivelare = None
+            self.nodo_rivelato.emit(self._indice(nodo))
+        finally:
+            self._rivelando = False
+
+    def refresh(self):
+        """
+        Aggiornamento incrementale: rilegge le righe (id, nome, padre) dei soli
+        livelli già caricati e applica al modello solo inserimenti, rimozioni,
+        spostamenti e rinomine. Espansione e selezione della vista restano
+        intatte perché gli indici persistenti vengono aggiornati da Qt.
+        """
+        caricati = self._nodi_caricati()
+        # Nessun nodo espanso a un certo livello: quel livello non viene letto
+        tipi = {tipo for tipo, tipo_padre, _ in QUERY_LIVELLI if caricati[tipo_padre]}
+        if tipi:
+            self._carica("albero:refresh", LetturaInBlocco(partial(leggi_livelli, tipi=tipi)), self._applica_refresh)
+
+    def _nodi_caricati(self) -> dict:
+        """Nodi già espansi (e non in caricamento), per tipo: tipo -> {id: nodo}."""
+        nodi = self.nodi
+        caricati = {tipo: {} for tipo in QUERY_FIGLI}
+        if nodi.ha(RADICE, CARICATO) and not nodi.ha(RADICE, IN_CARICAMENTO):
+            caricati["root"][None] = RADICE
+        da_visitare = [RADICE]
+        while da_visitare:
+            nodo = da_visitare.pop()
+            for figlio in nodi.figli_di(nodo):
+                tipo = nodi.tipo(figlio)
+                if nodi.stati[figlio] & (CARICATO | IN_CARICAMENTO) == CARICATO and tipo in QUERY_FIGLI:
+                    caricati[tipo][nodi.ids[figlio]] = figlio
+                    da_visitare.append(figlio)
+        return caricati
+
+    def _applica_refresh(self, livelli: dict):
+        # Lo stato può essere cambiato mentre la query girava: lo ricalcoliamo
+        caricati = self._nodi_caricati()
+        epoca = self.nodi.epoca
+        for tipo, tipo_padre, _sql in QUERY_LIVELLI:
+            if tipo not in livelli or not caricati[tipo_padre]:
+                continue
+            padri = caricati[tipo_padre]
+            righe_per_padre = {padre: [] for padre in padri.values()}
+            for item_id, nome, id_padre in livelli[tipo]:
+                padre = padri.get(id_padre)
+                if padre is not None:
+                    righe_per_padre[padre].append((item_id, nome))
+
+            for padre, righe in righe_per_padre.items():
+                # Salta i nodi rimossi insieme a un antenato in questo giro
+                if self.nodi.attivo(padre, epoca):
+                    self._applica_differenze(padre, righe)
+
+    def aggiorna_entita(self, modificate: dict):
+        """
+        Aggiornamento mirato dopo modifiche note ({tipo: {id: {colonna: {valori}}}},
+        vedi giornale.riepiloga): rilegge solo i figli dei nodi già caricati che
+        contengono, o contenevano, le entità modificate.
+        """
+        nodi = self.nodi
+        padri = set()      # (tipo, id) dei nodi i cui figli vanno riletti
+        da_cercare = {}    # codice del tipo -> id delle entità: il padre attuale lo dice il modello
+        for tipo, entita in modificate.items():
+            if tipo not in TIPO_PADRE:
+                continue
+            if tipo not in COLONNA_PADRE:
+                padri.add(("root", None))  # Edifici
+            for valori in entita.values():
+                # Padre vecchio e nuovo se è cambiato, quello dell'inserimento/eliminazione
+                padri.update((TIPO_PADRE[tipo], id_padre) for id_padre in valori.get(COLONNA_PADRE.get(tipo), ()))
+            da_cercare[tipo] = set(entita)
+        for tipo, ids in da_cercare.items():
+            codice = CODICE_TIPO[tipo]
+            for nodo, item_id in enumerate(nodi.ids):
+                if item_id in ids and nodi.tipi[nodo] == codice and not nodi.ha(nodo, RIMOSSO):
+                    padre = nodi.padri[nodo]
+                    padri.add((nodi.tipo(padre), nodi.item_id(padre)))
+
+        caricati = self._nodi_caricati()
+        da_rileggere = [caricati[tipo][item_id] for tipo, item_id in padri
+                        if item_id in caricati.get(tipo, {})]
+        if len(da_rileggere) > MAX_NODI_MIRATI:
+            self.refresh()
+            return
+        for nodo in da_rileggere:
+            # Stesso canale di fetchMore: il risultato passa dal diff di _figli_letti
+            self._carica(f"albero:{nodo}",
+                         partial(leggi_figli, tipo=nodi.tipo(nodo), item_id=nodi.item_id(nodo)),
+                         partial(self._figli_letti, nodo, nodi.epoca))
+
+    def _applica_differenze(self, padre: int, righe: list):
+        """Porta i figli di 'padre' a coincidere con 'righe' (già ordinate)."""
+        nodi = self.nodi
+        parent_index = self._indice(padre)
+        tipo_figli = QUERY_FIGLI[nodi.tipo(padre)][0]
+
+        if not nodi.numero_figli(padre):
+            # Caso comune (primo caricamento): un solo inserimento per tutte le righe
+            if righe:
+                self.beginInsertRows(parent_index, 0, len(righe) - 1)
+                nodi.accoda(padre, [self._nuovo_nodo(tipo_figli, item_id, nome, padre)
+                                    for item_id, nome in righe])
+                self.endInsertRows()
+            return
+
+        # 1. Rimozioni (dal fondo, così le righe precedenti non cambiano)
+        ids_attuali = {item_id for item_id, _ in righe}
+        figli = nodi.figli_di(padre)
+        for row in range(len(figli) - 1, -1, -1):
+            if nodi.ids[figli[row]] not in ids_attuali:
+                self.beginRemoveRows(parent_index, row, row)
+                nodi.rimuovi(padre, row)
+                self.endRemoveRows()
+
+        # 2. Inserimenti, spostamenti e rinomine, nell'ordine restituito dal DB
+        esistenti = {nodi.ids[figlio]: figlio for figlio in nodi.figli_di(padre)}
+        for row, (item_id, nome) in enumerate(righe):
+            figlio = esistenti.get(item_id)
+            if figlio is None:
+                self.beginInsertRows(parent_index, row, row)
+                nodi.inserisci(padre, row, self._nuovo_nodo(tipo_figli, item_id, nome, padre))
+                self.endInsertRows()
+                continue
+            if nodi.righe[figlio] != row:
+                # Le righe prima di 'row' sono già a posto, quindi la riga del figlio è > row
+                self.beginMoveRows(parent_index, nodi.righe[figlio], nodi.righe[figlio], parent_index, row)
+                nodi.sposta(padre, nodi.righe[figlio], row)
+                self.endMoveRows()
+            if nodi.nome(figlio) != nome:
+                nodi.rinomina(figlio, nome)
+                indice = self.createIndex(row, 0, figlio)
+                self.dataChanged.emit(indice, indice, [Qt.DisplayRole])
+
+    def _indice(self, nodo: int) -> QModelIndex:
+        if nodo == RADICE:
+            return QModelIndex()
+        return self.createIndex(self.nodi.righe[nodo], 0, nodo)
+
+    def _nodo(self, index: QModelIndex) -> int:
+        return index.internalId() if index.isValid() else RADICE
+
+    # --- Interfaccia QAbstractItemModel ---
+
+    def index(self, row, column, parent=QModelIndex()):
+        if column != 0:
+            return QModelIndex()
+        figli = self.nodi.figli_di(self._nodo(parent))
+        if 0 <= row < len(figli):
+            return self.createIndex(row, 0, figli[row])
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        padre = self.nodi.padri[index.internalId()]
+        if padre < 0:
+            return QModelIndex()
+        return self._indice(padre)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return self.nodi.numero_figli(self._nodo(parent))
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        nodo = self._nodo(parent)
+        if self.nodi.stati[nodo] & (CARICATO | IN_CARICAMENTO) != CARICATO:
+            return True  # Non lo sappiamo finché non viene espanso
+        return self.nodi.numero_figli(nodo) > 0
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        nodo = index.internalId()
+        if role == Qt.DisplayRole:
+            return self.nodi.nome(nodo)
+        if role == Qt.DecorationRole:
+            return self.icone.get(self.nodi.tipo(nodo))
+        if role == ID_ROLE:
+            return self.nodi.ids[nodo]
+        if role == TIPO_ROLE:
+            return self.nodi.tipo(nodo)
+        return None
+
+    def canFetchMore(self, parent):
+        return not self.nodi.ha(self._nodo(parent), CARICATO)
+
+    def fetchMore(self, parent):
+        nodo = self._nodo(parent)
+        nodi = self.nodi
+        if nodi.ha(nodo, CARICATO):
+            return
+        nodi.imposta(nodo, CARICATO | IN_CARICAMENTO)
+        self._carica(f"albero:{nodo}",
+                     partial(leggi_figli, tipo=nodi.tipo(nodo), item_id=nodi.item_id(nodo)),
+                     partial(self._figli_letti, nodo, nodi.epoca),
+                     partial(self._figli_non_letti, nodo, nodi.epoca))
+
+    def _figli_letti(self, nodo: int, epoca: int, righe: list):
+        if not self.nodi.attivo(nodo, epoca):
+            return  # Nodo rimosso o modello ricaricato mentre la query girava
+        self.nodi.imposta(nodo, IN_CARICAMENTO, False)
+        # Un refresh potrebbe aver già popolato il nodo: il diff gestisce entrambi i casi
+        self._applica_differenze(nodo, righe)
+        self.figli_caricati.emit(self._indice(nodo))
+        self._prosegui_rivela()
+
+    def _figli_non_letti(self, nodo: int, epoca: int, errore):
+        self._errore_caricamento(errore)
+        if self.nodi.attivo(nodo, epoca):
+            self.nodi.imposta(nodo, IN_CARICAMENTO, False)
+        self._da_rivelare = None
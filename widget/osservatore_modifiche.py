@@ -0,0 +1,141 @@
+# This Python file uses the following encoding: utf-8
+"""
+Modifiche fatte da altre istanze (o da altre connessioni) sul file condiviso.
+
+Ogni INTERVALLO_MS una connessione sentinella legge PRAGMA data_version:
+pochi microsecondi, senza toccare le tabelle, e il valore cambia solo quando
+un'altra connessione conferma una scrittura. Solo allora un job legge dal
+giornale delle modifiche le voci successive all'ultima vista e le emette
+raggruppate per entità (vedi giornale.riepiloga), così i widget rileggono
+solo le righe toccate. Con troppe voci (es. un'importazione) emette invece
+'riallinea' e i widget fanno il loro aggiornamento completo.
+
+Anche le scritture di questa istanza arrivano qui (sono su connessioni
+diverse dalla sentinella): i widget le trattano allo stesso modo.
+
+Chi mostra dati salvati in una sessione precedente (l'istantanea dell'albero)
+chiede con riparti_da le voci successive al cursore con cui li ha salvati.
+"""
+import sqlite3
+from functools import partial
+
+from PySide6.QtCore import QObject, QTimer, Signal
+from PySide6.QtSql import QSqlDatabase
+
+from database.async_loader import AsyncLoader, carica, inventario
+from database.sqlite_profile import connetti
+
+INTERVALLO_MS = 500   # Le modifiche degli altri arrivano entro un secondo
+MAX_VOCI = 2000       # Oltre, meglio un aggiornamento completo che tante query mirate
+
+
+# --- Job di lettura (vedi AsyncLoader) ---
+
+def leggi_ultima_modifica(db: QSqlDatabase) -> int:
+    return inventario(db).ultima_modifica()
+
+
+def leggi_modifiche(db: QSqlDatabase, dopo: int, limite: int = MAX_VOCI) -> tuple:
+    """(ultimo giornale_id, entità modificate o None se sono troppe)."""
+    return inventario(db).modifiche_dopo(dopo, limite)
+
+
+class OsservatoreModifiche(QObject):
+    """Segue il giornale delle modifiche e notifica le entità cambiate."""
+
+    modificate = Signal(dict)   # {tipo: {entita_id: {colonna: {valori}}}}
+    riallinea = Signal()        # Troppe modifiche: rileggere tutto
+
+    def __init__(self, db: QSqlDatabase, loader: AsyncLoader = None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.loader = loader
+        self._sentinella = connetti(db.databaseName(), sola_lettura=True)
+        self._data_version = self._leggi_data_version()
+        self._cursore = None      # giornale_id dell'ultima voce vista
+        self._riparti = None      # Cursore chiesto con riparti_da, in attesa della lettura in corso
+        self._in_lettura = False
+        self._timer = QTimer(self)
+        self._timer.setInterval(INTERVALLO_MS)
+        self._timer.timeout.connect(self.controlla)
+        self._leggi_cursore()
+
+    def _leggi_cursore(self):
+        # Il cursore parte dalla fine del giornale: conta solo ciò che succede da ora
+        self._in_lettura = True
+        carica(self.loader, self.db, "modifiche:giornale", leggi_ultima_modifica,
+               self._on_cursore, self._on_errore)
+
+    def _leggi_data_version(self) -> int:
+        return self._sentinella.execute("PRAGMA data_version").fetchone()[0]
+
+    def cursore(self) -> int | None:
+        """giornale_id dell'ultima voce già notificata (None finché non è noto)."""
+        return self._cursore
+
+    def riparti_da(self, cursore: int):
+        """
+        Riparte, appena finita la lettura in corso, dalle voci successive a
+        'cursore'. Un cursore oltre la fine del giornale (DB sostituito)
+        produce 'riallinea'.
+        """
+        self._riparti = cursore
+        if not self._in_lettura:
+            self._applica_riparti()
+
+    def _applica_riparti(self):
+        if self._riparti is None:
+            return
+        self._cursore, self._riparti = self._riparti, None
+        self._data_version = None  # Il prossimo controllo legge il giornale
+        if not self._timer.isActive():
+            self._timer.start()
+        self.controlla()
+
+    def _on_cursore(self, ultima: int):
+        self._cursore = ultima
+        self._in_lettura = False
+        self._timer.start()
+        self._applica_riparti()
+
+    def controlla(self):
+        """Legge il giornale solo se qualcuno ha scritto dall'ultimo controllo."""
+        if self._in_lettura or self._sentinella is None:
+            return
+        if self._cursore is None:
+            self._leggi_cursore()  # La prima lettura non è riuscita: si riprova
+            return
+        try:
+            data_version = self._leggi_data_version()
+        except sqlite3.Error as e:
+            print(f"Errore controllo modifiche: {e}") # Debug
+            return
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        self._in_lettura = True
+        carica(self.loader, self.db, "modifiche:giornale", partial(leggi_modifiche, dopo=self._cursore),
+               self._on_modifiche, self._on_errore)
+
+    def _on_modifiche(self, risultato: tuple):
+        self._cursore, modificate = risultato
+        self._in_lettura = False
+        if modificate is None:
+            self.riallinea.emit()
+        elif modificate:
+            self.modificate.emit(modificate)
+        self._applica_riparti()
+
+    def _on_errore(self, errore):
+        print(f"Errore lettura giornale modifiche: {errore}") # Debug
+        self._in_lettura = False
+        self._data_version = None  # Al prossimo controllo si riprova
+        # (anche la lettura del cursore iniziale, se era quella a fallire)
+        self._timer.start()
+        self._applica_riparti()
+
+    def ferma(self):
+        self._timer.stop()
+        if self._sentinella is not None:
+            self._sentinella.close()
+            self._sentinella = None
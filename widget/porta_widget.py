@@ -4,17 +4,34 @@
 #     pass
 # In 'porta_widget.py'
 
+from functools import partial
+
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QFormLayout, QLineEdit, QComboBox,
-    QTextEdit, QListWidget, QPushButton, QMessageBox, QSplitter, QLabel
+    QTextEdit, QListWidget, QPushButton, QMessageBox, QSplitter, QLabel,
+    QTreeWidget, QTreeWidgetItem, QTreeWidgetItemIterator, QCompleter
 )
-from PySide6.QtSql import QSqlDatabase, QSqlQuery, QSqlError
-from PySide6.QtCore import Qt
+from PySide6.QtSql import QSqlDatabase, QSqlError
+from PySide6.QtCore import Qt, QTimer, QModelIndex
+from PySide6.QtGui import QStandardItem, QStandardItemModel
+
+from database import diagnostica
+from database.async_loader import AsyncLoader, ErroreQuery, carica, inventario
+from database.inventario import query_fts
+from widget.cache_percorsi import CachePercorsi
+from widget.locali_model import LocaliModel, cerca_locali
+from widget.sessione_modifiche import SessioneModifiche
+
+# --- Job di lettura: girano nel thread che possiede 'db' (vedi AsyncLoader) ---
+
+def leggi_porta(db: QSqlDatabase, porta_id: int) -> dict | None:
+    """Dati della porta con i suoi dispositivi e interconnessioni (None se non esiste)."""
+    return inventario(db).porta(porta_id)
 
 class PortaDetailWidget(QWidget):
 
-    def __init__(self, db: QSqlDatabase, parent=None):
-        # ... (il costruttore __init__ rimane identico) ...
+    def __init__(self, db: QSqlDatabase, loader: AsyncLoader = None,
+                 percorsi: CachePercorsi = None, sessione: SessioneModifiche = None, parent=None):
         super().__init__(parent)
 
         if not db or not db.isOpen():
@@ -22,9 +39,22 @@ class PortaDetailWidget(QWidget):
             return
 
         self.db = db
+        self.loader = loader # Se presente, le letture girano in background
         self.current_porta_id = None
+        self._originale = None  # Valori della porta letti dal DB (per le modifiche in sospeso)
+        self._mostrati = None   # Valori mostrati nel form (per sapere se l'utente li ha cambiati)
+        # Percorsi dei locali in memoria: cambiare locale nel combo non fa query
+        self.percorsi = percorsi if percorsi is not None else CachePercorsi(db, loader, self)
+        self.percorsi.aggiornata.connect(self.update_posizione_completa)
+        # Locali aggiunti o rinominati: l'elenco del combo va riletto
+        self.percorsi.invalidata.connect(self.populate_combos)
+        # Modifiche in sospeso (modalità modifica multipla), condivise con gli altri dettagli
+        self.sessione = sessione if sessione is not None else SessioneModifiche(db, self)
+        self.sessione.modalita_cambiata.connect(self.on_modalita_sessione)
+        self.sessione.applicate.connect(self.on_modifiche_applicate)
 
         self.setup_ui()
+        self.on_modalita_sessione(self.sessione.multipla())
         self.populate_combos()
         self.clear_form()
 
@@ -39,7 +69,29 @@ class PortaDetailWidget(QWidget):
         self.posizione_completa_edit.setReadOnly(True) # Sola lettura
         self.posizione_completa_edit.setStyleSheet("background-color: #f0f0f0;") # Grigio
 
-        self.locale_combo = QComboBox() # Per *modificare* il locale
+        # Per *modificare* il locale: i locali arrivano a pagine mentre si scorre
+        # l'elenco, e digitando si cercano nel DB (completer)
+        self.locali_model = LocaliModel(self.db, self.loader, self)
+        self.locali_model.errore_caricamento.connect(self.on_load_error)
+        self.locale_combo = QComboBox()
+        self.locale_combo.setModel(self.locali_model)
+        self.locale_combo.setEditable(True)
+        self.locale_combo.setInsertPolicy(QComboBox.NoInsert)
+        # Righe tutte alte uguali: un locale aggiunto non fa rimisurare l'intero elenco
+        self.locale_combo.view().setUniformItemSizes(True)
+
+        self.locali_trovati = QStandardItemModel(self)
+        self.completer = QCompleter(self.locali_trovati, self)
+        # Il filtro lo fa la query: il completer mostra tutte le righe trovate
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.activated[QModelIndex].connect(self.on_locale_suggerito)
+        self.locale_combo.setCompleter(self.completer)
+
+        self.timer_locali = QTimer(self)
+        self.timer_locali.setSingleShot(True)
+        self.timer_locali.setInterval(150)
+        self.timer_locali.timeout.connect(self.cerca_locale)
+        self.locale_combo.lineEdit().textEdited.connect(self.timer_locali.start)
 
         self.note_edit = QTextEdit()
         self.note_edit.setMaximumHeight(100)
@@ -55,12 +107,14 @@ class PortaDetailWidget(QWidget):
         # ... (Il resto di setup_ui con QSplitter e QListWidget rimane identico) ...
         list_splitter = QSplitter(Qt.Vertical)
 
-        self.dispositivi_list = QListWidget()
+        # Albero della topologia: i dispositivi della porta con quelli collegati a valle
+        self.dispositivi_list = QTreeWidget()
+        self.dispositivi_list.setHeaderLabels(["Dispositivo", "Matricola", "Stato", "Posizione"])
         self.connessioni_list = QListWidget()
 
         dispositivi_widget = QWidget()
         dis_layout = QVBoxLayout(dispositivi_widget); dis_layout.setContentsMargins(0,0,0,0)
-        dis_layout.addWidget(QLabel("Dispositivi installati sulla porta:"))
+        dis_layout.addWidget(QLabel("Dispositivi installati sulla porta (e collegati a valle):"))
         dis_layout.addWidget(self.dispositivi_list)
 
         connessioni_widget = QWidget()
@@ -80,21 +134,59 @@ class PortaDetailWidget(QWidget):
         self.locale_combo.currentIndexChanged.connect(self.update_posizione_completa)
 
 
-    def populate_combos(self):
-        # ... (Questa funzione rimane identica) ...
-        self.locale_combo.clear()
-        self.locale_combo.addItem("Nessuno", None)
+    def _carica(self, canale: str, job, callback):
+        carica(self.loader, self.db, canale, job, callback, self.on_load_error)
 
-        query = QSqlQuery(self.db)
-        if query.exec("SELECT locale_id, nome_locale FROM Locali ORDER BY nome_locale"):
-            while query.next():
-                self.locale_combo.addItem(query.value(1), query.value(0))
+    def populate_combos(self):
+        """
+        Ricarica l'elenco dei locali: arriva solo la prima pagina, le altre
+        quando l'utente scorre il combo. Il locale selezionato resta selezionato.
+        """
+        locale_id = self.locale_combo.currentData()
+        nome = self.locale_combo.itemText(self.locale_combo.currentIndex())
+        with diagnostica.azione("Elenco locali"):
+            self.locali_model.reload()
+        self._seleziona_locale(locale_id, nome)
+
+    def _seleziona_locale(self, locale_id, nome_locale: str | None):
+        # Riga per id senza scorrere l'elenco: se il locale non è ancora arrivato
+        # viene aggiunto al modello (questo triggera l'aggiornamento della posizione)
+        if locale_id is None or nome_locale is None:
+            self.locale_combo.setCurrentIndex(0) # "Nessuno"
         else:
-            self.show_db_error(query.lastError())
+            self.locale_combo.setCurrentIndex(self.locali_model.assicura(locale_id, nome_locale))
+
+    def cerca_locale(self):
+        """Cerca (in background) i locali che corrispondono al testo digitato nel combo."""
+        query_testo = query_fts(self.locale_combo.currentText())
+        if query_testo is None:
+            if self.loader is not None:
+                self.loader.cancel("porta:cerca_locali")
+            self.locali_trovati.clear()
+            return
+        self._carica("porta:cerca_locali", partial(cerca_locali, query_testo=query_testo),
+                     self._mostra_locali_trovati)
+
+    def _mostra_locali_trovati(self, righe: list):
+        self.locali_trovati.clear()
+        for locale_id, nome_locale in righe:
+            item = QStandardItem(nome_locale)
+            item.setData(locale_id, Qt.UserRole)
+            self.locali_trovati.appendRow(item)
+        if righe:
+            self.completer.complete()
+
+    def on_locale_suggerito(self, index: QModelIndex):
+        """Il locale scelto tra i suggerimenti diventa quello del combo."""
+        self._seleziona_locale(index.data(Qt.UserRole), index.data(Qt.DisplayRole))
 
     def clear_form(self):
         # ... (Dobbiamo aggiungere il nuovo campo) ...
+        if self.loader is not None:
+            self.loader.cancel("porta:dettaglio") # Un caricamento in corso non serve più
         self.current_porta_id = None
+        self._originale = None
+        self._mostrati = None
         self.nome_edit.clear()
         self.note_edit.clear()
         self.locale_combo.setCurrentIndex(0)
@@ -104,99 +196,172 @@ class PortaDetailWidget(QWidget):
         self.setEnabled(False)
 
     def load_porta_data(self, porta_id: int):
+        """
+        Carica la porta in background: il form resta disabilitato finché i
+        dati non arrivano. Un click su un'altra porta annulla questa richiesta.
+        """
         self.clear_form()
         self.current_porta_id = porta_id
+        with diagnostica.azione("Dettaglio porta"):
+            self._carica("porta:dettaglio", partial(leggi_porta, porta_id=porta_id), self._mostra_porta)
 
-        query_porta = QSqlQuery(self.db)
-        query_porta.prepare("SELECT nome_porta, locale_id, note FROM Porte WHERE porta_id = ?")
-        query_porta.addBindValue(porta_id)
+    def _mostra_porta(self, porta: dict | None):
+        if porta is None:
+            print(f"Porta {self.current_porta_id} non trovata.") # Debug
+            return
 
-        if query_porta.exec() and query_porta.next():
-            self.nome_edit.setText(query_porta.value(0))
-            locale_id = query_porta.value(1)
-            self.note_edit.setPlainText(query_porta.value(2))
+        self._originale = {"nome_porta": porta["nome"], "locale_id": porta["locale_id"], "note": porta["note"]}
+        # Le modifiche in sospeso su questa porta prevalgono su quanto letto dal DB
+        in_sospeso = self.sessione.valori("porta", self.current_porta_id)
+        nome_locale = porta["nome_locale"]
+        if "locale_id" in in_sospeso:
+            nome_locale = in_sospeso["locale_id"][1]
+        valori = dict(self._originale, **{colonna: valore for colonna, (valore, _) in in_sospeso.items()})
 
-            # Imposta il valore nel ComboBox (questo triggera l'aggiornamento della posizione)
-            idx = self.locale_combo.findData(locale_id)
-            if idx != -1:
-                self.locale_combo.setCurrentIndex(idx)
-            else:
-                self.locale_combo.setCurrentIndex(0) # "Nessuno"
-        else:
-            self.show_db_error(query_porta.lastError()); return
-
-        # ... (Le query per Dispositivi e Interconnessioni rimangono identiche) ...
-        # Query 2: Dispositivi sulla porta
-        query_dev = QSqlQuery(self.db)
-        query_dev.prepare("""...""") # Identica
-        query_dev.addBindValue(porta_id)
-        if query_dev.exec():
-             while query_dev.next():
-                testo = f"[{query_dev.value(1)}] {query_dev.value(0)} (SN: {query_dev.value(2)})"
-                self.dispositivi_list.addItem(testo)
-
-        # Query 3: Interconnessioni
-        query_conn = QSqlQuery(self.db)
-        query_conn.prepare("""...""") # Identica
-        query_conn.addBindValue(porta_id)
-        if query_conn.exec():
-            while query_conn.next():
-                testo = f"{query_conn.value(0)} <- {query_conn.value(1)} (su {query_conn.value(2)})"
-                self.connessioni_list.addItem(testo)
+        self.nome_edit.setText(valori["nome_porta"])
+        self.note_edit.setPlainText(valori["note"])
+        self._seleziona_locale(valori["locale_id"], nome_locale)
+        self._mostrati = valori
 
+        self._mostra_elenchi(porta)
         self.setEnabled(True)
 
+    def _mostra_elenchi(self, porta: dict):
+        self.dispositivi_list.clear()
+        self.connessioni_list.clear()
+        self._mostra_dispositivi(porta["dispositivi"])
+        self.connessioni_list.addItems(porta["connessioni"])
+
+    def _valori_form(self) -> dict:
+        return {"nome_porta": self.nome_edit.text(), "locale_id": self.locale_combo.currentData(),
+                "note": self.note_edit.toPlainText()}
+
+    def applica_modifiche(self, modificate: dict):
+        """
+        Modifiche arrivate dal giornale (vedi OsservatoreModifiche): rilegge la
+        porta solo se riguardano lei, i suoi dispositivi o le loro interconnessioni.
+        """
+        if self.current_porta_id is None or self._mostrati is None:
+            return
+        mostrati = set()
+        iteratore = QTreeWidgetItemIterator(self.dispositivi_list)
+        while iteratore.value():
+            mostrati.add(iteratore.value().data(0, Qt.UserRole))
+            iteratore += 1
+        toccata = self.current_porta_id in modificate.get("porta", {})
+        for dispositivo_id, valori in modificate.get("dispositivo", {}).items():
+            toccata = toccata or (dispositivo_id in mostrati
+                                  or self.current_porta_id in valori.get("porta_id", ())
+                                  or bool(valori.get("parent_dispositivo_id", set()) & mostrati))
+        for valori in modificate.get("interconnessione", {}).values():
+            # Senza dispositivo_id (non cambiato) non si sa a chi appartiene: si rilegge
+            toccata = toccata or not valori.get("dispositivo_id") or bool(valori["dispositivo_id"] & mostrati)
+        if toccata:
+            with diagnostica.azione("Modifiche esterne porta"):
+                self._carica("porta:dettaglio", partial(leggi_porta, porta_id=self.current_porta_id),
+                             self._aggiorna_porta)
+
+    def _aggiorna_porta(self, porta: dict | None):
+        """Riletta dopo una modifica esterna: i campi che l'utente sta cambiando restano i suoi."""
+        if porta is None:
+            self.clear_form()  # Eliminata
+        elif self._mostrati is not None and self._valori_form() != self._mostrati:
+            self._mostra_elenchi(porta)
+        else:
+            self._mostra_porta(porta)
+
+    def _mostra_dispositivi(self, righe: list):
+        """Costruisce l'albero dei dispositivi dalle righe in ordine di albero."""
+        voci = {}
+        for (dispositivo_id, parent_id, profondita, modello,
+             tipo, matricola, stato, posizione) in righe:
+            colonne = [f"[{tipo}] {modello}", matricola or "", stato or "",
+                       (posizione or "") if profondita > 0 else ""]
+            genitore = voci.get(parent_id) if profondita > 0 else None
+            if genitore is not None:
+                voce = QTreeWidgetItem(genitore, colonne)
+            else:
+                voce = QTreeWidgetItem(self.dispositivi_list, colonne)
+            voce.setData(0, Qt.UserRole, dispositivo_id)
+            voci[dispositivo_id] = voce
+        self.dispositivi_list.expandAll()
+        self.dispositivi_list.resizeColumnToContents(0)
+
     # --- MODIFICA 2: Nuova funzione per aggiornare la posizione ---
     def update_posizione_completa(self):
         """
         Chiamato quando il combo box 'locale_combo' cambia.
-        Esegue una query JOIN per trovare il percorso completo.
+        Il percorso arriva dalla cache dei percorsi: nessuna query, salvo la
+        prima lettura della cache (al termine questo metodo viene richiamato).
         """
         self.posizione_completa_edit.clear()
         current_locale_id = self.locale_combo.currentData() # Prende l'ID
-
         if current_locale_id is None:
             return
 
-        query = QSqlQuery(self.db)
-        query.prepare("""
-            SELECT e.nome_edificio, p.nome_piano, l.nome_locale
-            FROM Locali l
-            JOIN Piani p ON l.piano_id = p.piano_id
-            JOIN Edifici e ON p.edificio_id = e.edificio_id
-            WHERE l.locale_id = ?
-        """)
-        query.addBindValue(current_locale_id)
-
-        if query.exec() and query.next():
-            percorso = f"{query.value(0)}  >  {query.value(1)}  >  {query.value(2)}"
+        percorso = self.percorsi.percorso(current_locale_id)
+        if percorso is not None:
             self.posizione_completa_edit.setText(percorso)
-        elif query.lastError().isValid():
-            self.show_db_error(query.lastError())
-        else:
-            # Potrebbe essere un locale non associato a un piano
+        elif self.percorsi.pronta():
+            # Un locale non associato a un piano
             self.posizione_completa_edit.setText(self.locale_combo.currentText())
 
 
     def save_data(self):
-        # ... (Questa funzione rimane identica) ...
         if self.current_porta_id is None: return
+        if self.sessione.multipla():
+            self._metti_in_sospeso()
+            return
 
-        query = QSqlQuery(self.db)
-        query.prepare("""
-            UPDATE Porte SET nome_porta = ?, locale_id = ?, note = ?
-            WHERE porta_id = ?
-        """)
-        query.addBindValue(self.nome_edit.text())
-        query.addBindValue(self.locale_combo.currentData()) # Salva l'ID del locale
-        query.addBindValue(self.note_edit.toPlainText())
-        query.addBindValue(self.current_porta_id)
-
-        if query.exec():
-            QMessageBox.information(self, "Successo", "Dati porta salvati.")
-        else:
-            self.show_db_error(query.lastError())
+        # Autore e modifica nella stessa transazione: il giornale registra chi ha salvato
+        if not self.db.transaction():
+            self.show_db_error(self.db.lastError())
+            return
+        try:
+            with diagnostica.azione("Salva porta"):
+                inventario(self.db).salva_porta(self.current_porta_id, self.nome_edit.text(),
+                                                self.locale_combo.currentData(), # Salva l'ID del locale
+                                                self.note_edit.toPlainText())
+        except ErroreQuery as e:
+            self.db.rollback()
+            self.show_db_error(e.errore)
+            return
+        if not self.db.commit():
+            self.show_db_error(self.db.lastError())
+            self.db.rollback()
+            return
+        # Ora il DB ha i valori del form
+        self._originale = self._mostrati = self._valori_form()
+        QMessageBox.information(self, "Successo", "Dati porta salvati.")
+
+    def _metti_in_sospeso(self):
+        """Registra nella sessione i campi diversi da quelli letti dal DB."""
+        if self._originale is None:
+            return
+        valori = self._valori_form()
+        locale_id = valori["locale_id"]
+        # Il nome del locale scelto, non il testo digitato nella combo editabile
+        etichetta = self.locale_combo.itemText(self.locale_combo.currentIndex()) if locale_id is not None else None
+        for colonna, valore in valori.items():
+            self.sessione.modifica("porta", self.current_porta_id, colonna, valore, self._originale[colonna],
+                                   etichetta if colonna == "locale_id" else None)
+        self._mostrati = valori  # Ora il form mostra le modifiche in sospeso
+
+    def on_modalita_sessione(self, multipla: bool):
+        self.save_button.setText("Metti in sospeso" if multipla else "Salva Modifiche")
+
+    def on_modifiche_applicate(self, righe: int):
+        # Rilegge la porta mostrata: ora i suoi valori sono quelli del DB
+        if self.current_porta_id is not None:
+            self.load_porta_data(self.current_porta_id)
 
     def show_db_error(self, err: QSqlError):
         # ... (Questa funzione rimane identica) ...
         QMessageBox.critical(self, "Errore Query", f"Errore database: {err.text()}")
+
+    def on_load_error(self, errore: Exception):
+        """Errore di un caricamento (eseguito in background o meno)."""
+        if isinstance(errore, ErroreQuery):
+            self.show_db_error(errore.errore)
+        else:
+            QMessageBox.critical(self, "Errore", f"Errore caricamento dati: {errore}")
@@ -0,0 +1,98 @@
+# This Python file uses the following encoding: utf-8
+
+from functools import partial
+
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QListWidget, QListWidgetItem
+from PySide6.QtCore import Qt, Signal, QTimer
+from PySide6.QtSql import QSqlDatabase
+
+from database import diagnostica
+from database.async_loader import AsyncLoader, carica, inventario
+from database.inventario import MAX_RISULTATI, query_fts
+from widget.cache_percorsi import CachePercorsi
+
+ETICHETTE_TIPO = {
+    "porta": "Porta",
+    "locale": "Locale",
+    "dispositivo": "Dispositivo",
+    "sistema": "Sistema esterno",
+}
+
+# --- Job di lettura (vedi AsyncLoader) ---
+
+def cerca(db: QSqlDatabase, query_testo: str, limite: int = MAX_RISULTATI) -> list:
+    """Righe (tipo, id, nome) che corrispondono alla query FTS5."""
+    return inventario(db).cerca(query_testo, limite)
+
+
+class RicercaWidget(QWidget):
+    """Casella di ricerca globale con l'elenco dei risultati sotto."""
+
+    # Emesso con (tipo, id) quando l'utente sceglie un risultato
+    risultato_scelto = Signal(str, int)
+
+    def __init__(self, db: QSqlDatabase, loader: AsyncLoader = None,
+                 percorsi: CachePercorsi = None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.loader = loader
+        self.percorsi = percorsi # Se presente, i locali trovati mostrano il percorso
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Cerca porte, locali, dispositivi, matricole...")
+        self.search_edit.setClearButtonEnabled(True)
+        layout.addWidget(self.search_edit)
+
+        self.risultati_list = QListWidget()
+        self.risultati_list.setMaximumHeight(200)
+        self.risultati_list.hide()
+        layout.addWidget(self.risultati_list)
+
+        # Aspetta una breve pausa nella digitazione prima di interrogare il DB
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(150)
+        self.timer.timeout.connect(self.avvia_ricerca)
+
+        self.search_edit.textChanged.connect(self.timer.start)
+        self.search_edit.returnPressed.connect(self.scegli_primo)
+        self.risultati_list.itemActivated.connect(self.on_risultato_attivato)
+        self.risultati_list.itemClicked.connect(self.on_risultato_attivato)
+
+    def avvia_ricerca(self):
+        query_testo = query_fts(self.search_edit.text())
+        if query_testo is None:
+            if self.loader is not None:
+                self.loader.cancel("ricerca")
+            self.risultati_list.clear()
+            self.risultati_list.hide()
+            return
+        with diagnostica.azione("Ricerca globale"):
+            carica(self.loader, self.db, "ricerca", partial(cerca, query_testo=query_testo),
+                   self._mostra_risultati, self._errore_ricerca)
+
+    def _mostra_risultati(self, righe: list):
+        self.risultati_list.clear()
+        for tipo, item_id, nome in righe:
+            item = QListWidgetItem(f"{nome}  ({ETICHETTE_TIPO.get(tipo, tipo)})")
+            item.setData(Qt.UserRole, (tipo, item_id))
+            if tipo == "locale" and self.percorsi is not None:
+                item.setToolTip(self.percorsi.percorso(item_id))
+            self.risultati_list.addItem(item)
+        self.risultati_list.setVisible(bool(righe))
+
+    def _errore_ricerca(self, errore):
+        print(f"Errore ricerca: {errore}") # Debug
+
+    def scegli_primo(self):
+        if self.risultati_list.count() > 0:
+            self.on_risultato_attivato(self.risultati_list.item(0))
+
+    def on_risultato_attivato(self, item: QListWidgetItem):
+        tipo, item_id = item.data(Qt.UserRole)
+        self.risultato_scelto.emit(tipo, item_id)
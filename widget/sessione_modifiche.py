@@ -0,0 +1,237 @@
+# This Python file uses the following encoding: utf-8
+"""
+Sessione di modifica multipla.
+
+In modalità "modifica multipla" i salvataggi dei widget di dettaglio non
+scrivono subito: i campi cambiati (con il valore letto dal DB) restano in
+sospeso nella sessione, anche passando da una porta o da un locale all'altro.
+applica() li scrive tutti in una sola transazione, con UPDATE preparati, su
+una connessione di scrittura in background; scarta() li dimentica.
+
+Ogni UPDATE controlla che i campi abbiano ancora il valore letto: se nel
+frattempo qualcun altro li ha cambiati l'intera transazione viene annullata
+(ConflittoModifica) e le modifiche restano in sospeso.
+"""
+from functools import partial
+
+from PySide6.QtWidgets import QWidget, QHBoxLayout, QCheckBox, QLabel, QPushButton, QProgressBar, QMessageBox
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtSql import QSqlDatabase
+
+from database import diagnostica
+from database.async_loader import AsyncLoader, ErroreQuery, esegui_scrittura
+from database.giornale import SQL_IMPOSTA_AUTORE, autore_predefinito
+
+# tipo -> (tabella, chiave, colonne modificabili)
+CAMPI_MODIFICABILI = {
+    "porta": ("Porte", "porta_id", ("nome_porta", "locale_id", "note")),
+    "locale": ("Locali", "locale_id", ("nome_locale", "descrizione", "piano_id")),
+}
+
+PASSO_PROGRESSO = 25  # Righe scritte tra una notifica di avanzamento e la successiva
+
+
+class ConflittoModifica(Exception):
+    """Una riga modificata nella sessione è stata cambiata (o eliminata) da altri."""
+
+
+def sql_aggiorna(tipo: str, colonne: tuple) -> str:
+    """
+    UPDATE delle colonne indicate, solo se hanno ancora il valore originale.
+    NULL e '' valgono uguale: i form mostrano un NULL come testo vuoto.
+    """
+    tabella, chiave, _ = CAMPI_MODIFICABILI[tipo]
+    assegnazioni = ", ".join(f"{colonna} = ?" for colonna in colonne)
+    controlli = "".join(f" AND IFNULL({colonna}, '') = IFNULL(?, '')" for colonna in colonne)
+    return f"UPDATE {tabella} SET {assegnazioni} WHERE {chiave} = ?{controlli}"
+
+
+# --- Job di scrittura (vedi AsyncLoader con sola_lettura=False) ---
+
+def applica_modifiche(db: QSqlDatabase, modifiche: list, progresso=None) -> int:
+    """
+    Scrive le modifiche [(tipo, id, {colonna: (valore, originale)})] in una
+    transazione: o tutte o nessuna. Restituisce il numero di righe aggiornate.
+    """
+    if not db.transaction():
+        raise ErroreQuery(db.lastError())
+    try:
+        esegui_scrittura(db, SQL_IMPOSTA_AUTORE, autore_predefinito())  # Per il giornale delle modifiche
+        for fatte, (tipo, item_id, campi) in enumerate(modifiche, 1):
+            colonne = tuple(sorted(campi))
+            parametri = ([campi[colonna][0] for colonna in colonne] + [item_id]
+                         + [campi[colonna][1] for colonna in colonne])
+            if esegui_scrittura(db, sql_aggiorna(tipo, colonne), *parametri) != 1:
+                raise ConflittoModifica(
+                    f"{tipo} {item_id}: modificato o eliminato da un altro utente dopo la lettura")
+            if progresso is not None and (fatte % PASSO_PROGRESSO == 0 or fatte == len(modifiche)):
+                progresso(fatte, len(modifiche))
+    except Exception:
+        db.rollback()
+        raise
+    if not db.commit():
+        errore = ErroreQuery(db.lastError())
+        db.rollback()
+        raise errore
+    return len(modifiche)
+
+
+class SessioneModifiche(QObject):
+    """Campi modificati in sospeso, per entità, con il valore originale."""
+
+    modalita_cambiata = Signal(bool)  # True = modifica multipla
+    cambiata = Signal(int)          # Numero di entità con modifiche in sospeso
+    progresso = Signal(int, int)    # Righe scritte, totale (durante applica)
+    applicate = Signal(int)         # Transazione confermata: righe aggiornate
+    fallita = Signal(object)        # Transazione annullata: eccezione
+
+    def __init__(self, db: QSqlDatabase, parent=None):
+        super().__init__(parent)
+        self.db = db
+        # Un solo thread: le transazioni di scrittura non si sovrappongono
+        self.scrittore = AsyncLoader(db, max_thread=1, sola_lettura=False, parent=self)
+        self._modifiche = {}   # (tipo, id) -> {colonna: (valore, originale)}
+        self._etichette = {}   # (tipo, id, colonna) -> testo da mostrare (es. nome del locale)
+        self._in_corso = False
+        self._multipla = False
+
+    def __len__(self):
+        return len(self._modifiche)
+
+    def in_corso(self) -> bool:
+        return self._in_corso
+
+    def multipla(self) -> bool:
+        """True se i salvataggi dei dettagli vanno messi in sospeso."""
+        return self._multipla
+
+    def imposta_multipla(self, multipla: bool):
+        if multipla != self._multipla:
+            self._multipla = multipla
+            self.modalita_cambiata.emit(multipla)
+
+    def modifica(self, tipo: str, item_id: int, colonna: str, valore, originale, etichetta: str = None):
+        """Mette in sospeso il nuovo valore; se torna uguale all'originale la modifica sparisce."""
+        if colonna not in CAMPI_MODIFICABILI[tipo][2]:
+            raise ValueError(f"Campo '{colonna}' non modificabile per '{tipo}'")
+        chiave = (tipo, item_id)
+        campi = self._modifiche.get(chiave, {})
+        # L'originale resta quello letto la prima volta
+        originale = campi[colonna][1] if colonna in campi else originale
+        if valore == originale:
+            campi.pop(colonna, None)
+            self._etichette.pop((tipo, item_id, colonna), None)
+        else:
+            campi[colonna] = (valore, originale)
+            if etichetta is not None:
+                self._etichette[(tipo, item_id, colonna)] = etichetta
+        if campi:
+            self._modifiche[chiave] = campi
+        else:
+            self._modifiche.pop(chiave, None)
+        self.cambiata.emit(len(self._modifiche))
+
+    def valori(self, tipo: str, item_id: int) -> dict:
+        """{colonna: (valore in sospeso, etichetta o None)} dell'entità."""
+        return {colonna: (valore, self._etichette.get((tipo, item_id, colonna)))
+                for colonna, (valore, _) in self._modifiche.get((tipo, item_id), {}).items()}
+
+    def applica(self):
+        """Scrive in background tutte le modifiche in una transazione."""
+        if self._in_corso or not self._modifiche:
+            return
+        self._in_corso = True
+        modifiche = [(tipo, item_id, dict(campi)) for (tipo, item_id), campi in self._modifiche.items()]
+        self.progresso.emit(0, len(modifiche))
+        with diagnostica.azione("Applica modifiche"):
+            # Il segnale 'progresso' emesso dal worker arriva alla GUI in coda
+            self.scrittore.submit("modifiche:applica",
+                                  partial(applica_modifiche, modifiche=modifiche, progresso=self.progresso.emit),
+                                  self._on_applicate, self._on_fallita)
+
+    def scarta(self):
+        if self._in_corso:
+            return
+        self._modifiche.clear()
+        self._etichette.clear()
+        self.cambiata.emit(0)
+
+    def shutdown(self):
+        self.scrittore.shutdown()
+
+    def _on_applicate(self, righe: int):
+        self._in_corso = False
+        self._modifiche.clear()
+        self._etichette.clear()
+        self.cambiata.emit(0)
+        self.applicate.emit(righe)
+
+    def _on_fallita(self, errore: Exception):
+        self._in_corso = False  # Le modifiche restano in sospeso
+        self.fallita.emit(errore)
+
+
+class SessioneBar(QWidget):
+    """
+    Controlli della sessione per la barra di stato: modalità, numero di
+    modifiche in sospeso, Applica / Scarta e avanzamento della transazione.
+    """
+
+    def __init__(self, sessione: SessioneModifiche, parent=None):
+        super().__init__(parent)
+        self.sessione = sessione
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.multipla_check = QCheckBox("Modifica multipla")
+        self.multipla_check.setToolTip("I salvataggi restano in sospeso e si applicano tutti insieme")
+        self.multipla_check.toggled.connect(sessione.imposta_multipla)
+        self.stato_label = QLabel()
+        self.progresso_bar = QProgressBar()
+        self.progresso_bar.setMaximumWidth(150)
+        self.progresso_bar.hide()
+        self.applica_button = QPushButton("Applica")
+        self.applica_button.clicked.connect(sessione.applica)
+        self.scarta_button = QPushButton("Scarta")
+        self.scarta_button.clicked.connect(sessione.scarta)
+        for widget in (self.multipla_check, self.stato_label, self.progresso_bar,
+                       self.applica_button, self.scarta_button):
+            layout.addWidget(widget)
+
+        sessione.cambiata.connect(self.aggiorna)
+        sessione.modalita_cambiata.connect(self.aggiorna)
+        sessione.progresso.connect(self.on_progresso)
+        sessione.applicate.connect(self.on_applicate)
+        sessione.fallita.connect(self.on_fallita)
+        self.aggiorna()
+
+    def aggiorna(self):
+        numero = len(self.sessione)
+        in_corso = self.sessione.in_corso()
+        if numero or in_corso:
+            self.stato_label.setText(f"{numero} in sospeso")
+        self.stato_label.setVisible(bool(numero or in_corso))
+        self.applica_button.setVisible(self.sessione.multipla() or numero > 0)
+        self.scarta_button.setVisible(self.sessione.multipla() or numero > 0)
+        self.applica_button.setEnabled(numero > 0 and not in_corso)
+        self.scarta_button.setEnabled(numero > 0 and not in_corso)
+        # Con modifiche in sospeso non si torna al salvataggio immediato
+        self.multipla_check.setEnabled(numero == 0 and not in_corso)
+
+    def on_progresso(self, fatte: int, totale: int):
+        self.progresso_bar.setRange(0, totale)
+        self.progresso_bar.setValue(fatte)
+        self.progresso_bar.show()
+        self.aggiorna()
+
+    def on_applicate(self, righe: int):
+        self.progresso_bar.hide()
+        self.aggiorna()
+        self.stato_label.setText(f"{righe} modifiche applicate")
+        self.stato_label.show()
+
+    def on_fallita(self, errore: Exception):
+        self.progresso_bar.hide()
+        self.aggiorna()
+        QMessageBox.warning(self, "Modifiche non applicate",
+                            f"Nessuna modifica è stata salvata, restano in sospeso:\n{errore}")
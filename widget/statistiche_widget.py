@@ -0,0 +1,148 @@
+# This Python file uses the following encoding: utf-8
+"""
+Pagina delle statistiche: dispositivi per edificio (o per piano di un
+edificio) e stato, porte senza dispositivi, interconnessioni per sistema.
+
+Le cifre arrivano dalle tabelle Statistiche_*, tenute aggiornate dai trigger
+(vedi database.statistiche): la lettura costa poche ricerche sulla chiave,
+così la pagina si rilegge per intero a ogni modifica notificata dal giornale.
+Se non è visibile si rilegge solo quando torna a esserlo.
+"""
+from functools import partial
+
+from PySide6.QtCore import Qt
+from PySide6.QtSql import QSqlDatabase
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView
+)
+
+from database import diagnostica
+from database.async_loader import AsyncLoader, carica, inventario
+
+SENZA_STATO = "(senza stato)"
+
+
+# --- Job di lettura (vedi AsyncLoader) ---
+
+def leggi_statistiche(db: QSqlDatabase, edificio_id: int = None) -> dict:
+    return inventario(db).statistiche(edificio_id)
+
+
+class StatisticheWidget(QWidget):
+    """Statistiche di tutto l'inventario, o di un edificio con i suoi piani."""
+
+    def __init__(self, db: QSqlDatabase, loader: AsyncLoader = None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.loader = loader
+        self.edificio_id = None     # None: tutti gli edifici
+        self._da_aggiornare = True  # Dati cambiati mentre la pagina era nascosta
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        intestazione = QHBoxLayout()
+        self.titolo_label = QLabel()
+        self.titolo_label.setStyleSheet("font-weight: bold;")
+        self.tutti_button = QPushButton("Tutti gli edifici")
+        self.tutti_button.clicked.connect(lambda: self.mostra(None))
+        intestazione.addWidget(self.titolo_label, stretch=1)
+        intestazione.addWidget(self.tutti_button)
+        layout.addLayout(intestazione)
+
+        self.riepilogo_label = QLabel()
+        layout.addWidget(self.riepilogo_label)
+        self.dispositivi_table = self._tabella()
+        layout.addWidget(self.dispositivi_table, stretch=2)
+        layout.addWidget(QLabel("Interconnessioni per sistema esterno:"))
+        self.sistemi_table = self._tabella()
+        self.sistemi_table.setColumnCount(2)
+        self.sistemi_table.setHorizontalHeaderLabels(["Sistema", "Interconnessioni"])
+        layout.addWidget(self.sistemi_table, stretch=1)
+        self._mostra_titolo()
+
+    @staticmethod
+    def _tabella() -> QTableWidget:
+        tabella = QTableWidget()
+        tabella.setEditTriggers(QTableWidget.NoEditTriggers)
+        tabella.verticalHeader().setVisible(False)
+        tabella.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        return tabella
+
+    @staticmethod
+    def _cella(valore, grassetto: bool = False) -> QTableWidgetItem:
+        item = QTableWidgetItem()
+        item.setData(Qt.DisplayRole, valore)
+        if isinstance(valore, int):
+            item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        if grassetto:
+            font = item.font()
+            font.setBold(True)
+            item.setFont(font)
+        return item
+
+    def _mostra_titolo(self, nome_edificio: str = None):
+        if self.edificio_id is None:
+            self.titolo_label.setText("Statistiche dell'inventario")
+        else:
+            self.titolo_label.setText(f"Statistiche dell'edificio {nome_edificio or ''}")
+        self.tutti_button.setVisible(self.edificio_id is not None)
+
+    def mostra(self, edificio_id: int = None):
+        """Mostra tutto l'inventario (None) o l'edificio 'edificio_id' per piano."""
+        self.edificio_id = edificio_id
+        self._mostra_titolo()
+        self.aggiorna()
+
+    def aggiorna(self):
+        self._da_aggiornare = False
+        with diagnostica.azione("Statistiche"):
+            carica(self.loader, self.db, "statistiche", partial(leggi_statistiche, edificio_id=self.edificio_id),
+                   self._mostra_statistiche, self.on_load_error)
+
+    def _mostra_statistiche(self, dati: dict):
+        if self.edificio_id is not None and dati["edificio"] is None:
+            self.mostra(None)  # Edificio eliminato
+            return
+        self._mostra_titolo(dati["edificio"])
+        stati = sorted(set(dati["stati"]).union(*(conteggi for _, _, conteggi in dati["righe"])))
+        colonne = ["Edificio" if self.edificio_id is None else "Piano"]
+        colonne += [stato or SENZA_STATO for stato in stati] + ["Totale"]
+        tabella = self.dispositivi_table
+        tabella.clear()
+        tabella.setColumnCount(len(colonne))
+        tabella.setHorizontalHeaderLabels(colonne)
+        righe = [(nome, conteggi, False) for _, nome, conteggi in dati["righe"]]
+        righe.append(("Totale", dati["stati"], True))
+        tabella.setRowCount(len(righe))
+        for r, (nome, conteggi, grassetto) in enumerate(righe):
+            valori = [nome] + [conteggi.get(stato, 0) for stato in stati] + [sum(conteggi.values())]
+            for c, valore in enumerate(valori):
+                tabella.setItem(r, c, self._cella(valore, grassetto))
+
+        self.sistemi_table.setRowCount(len(dati["sistemi"]))
+        for r, (_, nome, interconnessioni) in enumerate(dati["sistemi"]):
+            self.sistemi_table.setItem(r, 0, self._cella(nome))
+            self.sistemi_table.setItem(r, 1, self._cella(interconnessioni))
+
+        # Le porte si contano solo per tutto l'inventario
+        self.riepilogo_label.setText(
+            f"Dispositivi: {sum(dati['stati'].values())}    Porte dell'inventario: {dati['porte']}, "
+            f"di cui senza dispositivi: {dati['porte_senza_dispositivi']}")
+
+    def applica_modifiche(self, modificate: dict = None):
+        """Modifiche arrivate dal giornale (o 'riallinea'): rilegge ora o quando la pagina torna visibile."""
+        if self.isVisible():
+            self.aggiorna()
+        else:
+            self._da_aggiornare = True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._da_aggiornare:
+            self.aggiorna()
+
+    def on_load_error(self, errore: Exception):
+        # Niente finestre di errore: la pagina può essere quella mostrata all'avvio
+        print(f"Errore lettura statistiche: {errore}") # Debug
+        self.riepilogo_label.setText(f"Statistiche non disponibili: {errore}")